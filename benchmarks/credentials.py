@@ -0,0 +1,61 @@
+"""Benchmarks for loading users: already-hashed credential files, and hashing plaintext ones serially or in a pool.
+
+Run from the project root with:
+
+    python -m benchmarks.credentials [number_of_hashed_users] [number_of_plaintext_users]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from werkzeug.security import generate_password_hash
+
+from covid.adapters import credentials, memory_repository
+from covid.adapters.memory_repository import MemoryRepository
+
+
+HASHED_USERS = 100_000
+PLAINTEXT_USERS = 200
+
+
+def write_users(data_path: str, passwords):
+    with open(os.path.join(data_path, 'users.csv'), 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(('id', 'username', 'password'))
+        for id, password in enumerate(passwords, start=1):
+            writer.writerow((id, f'user{id}', password))
+
+
+def bench_load_users(data_path: str):
+    start = time.perf_counter()
+    memory_repository.load_users(data_path, MemoryRepository())
+    return time.perf_counter() - start
+
+
+def bench_hash_passwords(passwords, **kwargs):
+    start = time.perf_counter()
+    credentials.hash_passwords(passwords, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(hashed_users: int, plaintext_users: int):
+    with tempfile.TemporaryDirectory() as data_path:
+        # Every user shares one hash; only the cost of reading the file and building Users matters here.
+        write_users(data_path, [generate_password_hash('cLQ^C#oFXloS')] * hashed_users)
+        seconds = bench_load_users(data_path)
+    print(f'load_users, {hashed_users:,} pre-hashed users: {seconds:8.3f} s')
+
+    passwords = [f'password{index}' for index in range(plaintext_users)]
+    serial = bench_hash_passwords(passwords, pool_threshold=plaintext_users + 1)
+    pooled = bench_hash_passwords(passwords, pool_threshold=1)
+    print(f'hash_passwords, {plaintext_users:,} plaintext passwords')
+    print(f'  serial:                 {serial:8.3f} s')
+    print(f'  pool of {os.cpu_count():>3} processes: {pooled:8.3f} s')
+
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    main(*(arguments + [HASHED_USERS, PLAINTEXT_USERS][len(arguments):]))
@@ -0,0 +1,52 @@
+"""Throughput and peak memory of database_repository.populate for a range of batch sizes.
+
+Run from the project root with:
+
+    python -m benchmarks.database_ingest [number_of_articles]
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from sqlalchemy import create_engine
+
+from benchmarks.startup import write_synthetic_data
+from covid.adapters import database_repository
+from covid.adapters.orm import metadata
+
+
+ARTICLES = 200_000
+BATCH_SIZES = (1_000, 10_000, 100_000)
+
+
+def bench_populate(data_path: str, batch_size: int):
+    engine = create_engine(f'sqlite:///{os.path.join(data_path, f"covid-{batch_size}.db")}')
+    metadata.create_all(engine)
+
+    reports = list()
+    tracemalloc.start()
+    database_repository.populate(engine, data_path, batch_size=batch_size, progress=reports.append)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    engine.dispose()
+
+    # The last report for the articles table covers the whole article load.
+    articles = [report for report in reports if report.table == 'articles'][-1]
+    return articles, peak
+
+
+def main(number_of_articles: int):
+    with tempfile.TemporaryDirectory() as data_path:
+        write_synthetic_data(data_path, number_of_articles)
+
+        print(f'database_repository.populate ({number_of_articles:,} articles)')
+        print(f'  {"batch size":>10}{"rows/s":>12}{"peak MiB":>10}')
+        for batch_size in BATCH_SIZES:
+            articles, peak = bench_populate(data_path, batch_size)
+            print(f'  {batch_size:>10,}{articles.rows_per_second:>12,.0f}{peak / 2**20:>10.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ARTICLES)
@@ -0,0 +1,118 @@
+"""Memory footprint report for the domain model and a populated MemoryRepository.
+
+Reports the bytes allocated per User, Comment, Article and Tag for both the dict-backed classes (as mapped by orm.py)
+and their slotted Compact counterparts, then the total footprint of a MemoryRepository populated from a synthetic feed,
+before (dict-backed entities) and after (compact entities), and of a ColumnarMemoryRepository without and with the
+search index that its first search builds.
+
+Run from the project root with:
+
+    python -m benchmarks.memory_footprint [number_of_articles]
+"""
+
+import gc
+import sys
+import tempfile
+import tracemalloc
+from datetime import date, datetime
+from unittest import mock
+
+from benchmarks.startup import write_synthetic_data
+from covid.adapters import memory_repository
+from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.columnar_repository import ColumnarMemoryRepository
+from covid.domain.model import (
+    User, Comment, Article, Tag, CompactUser, CompactComment, CompactArticle, CompactTag
+)
+
+
+INSTANCES = 10_000
+ARTICLES = 100_000
+
+
+def allocated_bytes(build):
+    # Bytes still allocated once build() has returned, while its result is kept alive.
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def entity_builders(user_class, comment_class, article_class, tag_class):
+    # Field values are shared between instances so that only per-instance overhead is measured.
+    user = user_class('username', 'password')
+    article = article_class(date(2020, 3, 1), 'title', 'first paragraph', 'hyperlink', 'image hyperlink', 1)
+    timestamp = datetime(2020, 3, 1)
+
+    return {
+        'User': lambda: [user_class('username', 'password') for _ in range(INSTANCES)],
+        'Comment': lambda: [comment_class(user, article, 'comment', timestamp) for _ in range(INSTANCES)],
+        'Article': lambda: [
+            article_class(date(2020, 3, 1), 'title', 'first paragraph', 'hyperlink', 'image hyperlink', id)
+            for id in range(INSTANCES)
+        ],
+        'Tag': lambda: [tag_class('tag') for _ in range(INSTANCES)],
+    }
+
+
+def report_entities():
+    dict_backed = entity_builders(User, Comment, Article, Tag)
+    compact = entity_builders(CompactUser, CompactComment, CompactArticle, CompactTag)
+
+    print(f'Bytes per entity ({INSTANCES:,} instances each)')
+    print(f'  {"entity":<10}{"dict-backed":>14}{"compact":>14}')
+    for name in dict_backed:
+        before = allocated_bytes(dict_backed[name]) / INSTANCES
+        after = allocated_bytes(compact[name]) / INSTANCES
+        print(f'  {name:<10}{before:>14.1f}{after:>14.1f}')
+
+
+def populate(data_path: str):
+    repo = MemoryRepository()
+    memory_repository.populate(data_path, repo)
+    return repo
+
+
+def populate_columnar(data_path: str):
+    repo = ColumnarMemoryRepository()
+    memory_repository.populate(data_path, repo)
+    return repo
+
+
+def populate_columnar_and_search(data_path: str):
+    repo = populate_columnar(data_path)
+    repo.search_articles('synthetic', 1)
+    return repo
+
+
+def report_repository(number_of_articles: int):
+    with tempfile.TemporaryDirectory() as data_path:
+        write_synthetic_data(data_path, number_of_articles)
+
+        # Load the feed with the dict-backed classes substituted for the compact ones used by the loaders.
+        with mock.patch.multiple(
+                memory_repository,
+                CompactUser=User, CompactComment=Comment, CompactArticle=Article, CompactTag=Tag
+        ):
+            before = allocated_bytes(lambda: populate(data_path))
+        after = allocated_bytes(lambda: populate(data_path))
+        columnar = allocated_bytes(lambda: populate_columnar(data_path))
+        searched = allocated_bytes(lambda: populate_columnar_and_search(data_path))
+
+    print(f'MemoryRepository footprint ({number_of_articles:,} articles)')
+    print(f'  dict-backed: {before / 2**20:10.1f} MiB ({before / number_of_articles:8.1f} bytes/article)')
+    print(f'  compact:     {after / 2**20:10.1f} MiB ({after / number_of_articles:8.1f} bytes/article)')
+    print(f'  columnar:    {columnar / 2**20:10.1f} MiB ({columnar / number_of_articles:8.1f} bytes/article)')
+    print(f'  + search:    {searched / 2**20:10.1f} MiB ({searched / number_of_articles:8.1f} bytes/article)')
+
+
+def main(number_of_articles: int):
+    report_entities()
+    report_repository(number_of_articles)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ARTICLES)
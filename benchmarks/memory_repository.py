@@ -0,0 +1,94 @@
+"""Micro-benchmarks for MemoryRepository lookups.
+
+Run from the project root with:
+
+    python -m benchmarks.memory_repository
+"""
+
+import timeit
+from datetime import date, timedelta
+
+from covid.adapters.memory_repository import MemoryRepository
+from covid.domain.model import User, Article, Tag, make_tag_association
+
+
+SIZES = (1_000, 10_000, 100_000)
+LOOKUPS = 10_000
+TAG_COUNT = 1_000
+
+
+def make_users(repo: MemoryRepository, count: int):
+    for index in range(count):
+        repo.add_user(User(f'user{index}', 'pbkdf2:sha256:150000$salt$hash'))
+
+
+def make_articles(count: int):
+    first_date = date(2020, 1, 1)
+    return [
+        Article(first_date + timedelta(days=index // 10), f'Title {index}', 'First paragraph', 'link', 'image', index)
+        for index in range(1, count + 1)
+    ]
+
+
+def make_tagged_articles(repo: MemoryRepository, count: int):
+    articles = make_articles(count)
+    tags = [Tag(f'tag{index}') for index in range(TAG_COUNT)]
+    for article in articles:
+        repo.add_article(article)
+        make_tag_association(article, tags[article.id % TAG_COUNT])
+    for tag in tags:
+        repo.add_tag(tag)
+
+
+def bench_get_user(count: int):
+    repo = MemoryRepository()
+    make_users(repo, count)
+
+    # Look up the most recently registered user, the worst case for a linear scan.
+    username = f'user{count - 1}'
+    seconds = timeit.timeit(lambda: repo.get_user(username), number=LOOKUPS)
+    return seconds / LOOKUPS
+
+
+def bench_get_article_ids_for_tag(count: int):
+    repo = MemoryRepository()
+    make_tagged_articles(repo, count)
+
+    # The last Tag added is the worst case for a linear scan over the repository's Tags.
+    tag_name = f'tag{TAG_COUNT - 1}'
+    seconds = timeit.timeit(lambda: repo.get_article_ids_for_tag(tag_name)[0:3], number=LOOKUPS)
+    return seconds / LOOKUPS
+
+
+def bench_articles_by_date_page(count: int):
+    repo = MemoryRepository()
+    for article in make_articles(count):
+        repo.add_article(article)
+
+    # Resolve a page from the middle of the timeline: its articles plus the previous and next dates.
+    target_date = repo.get_article(count // 2).date
+
+    def page():
+        articles = repo.get_articles_by_date(target_date)
+        return articles, repo.get_date_of_previous_article(articles[0]), repo.get_date_of_next_article(articles[0])
+
+    seconds = timeit.timeit(page, number=LOOKUPS)
+    return seconds / LOOKUPS
+
+
+def main():
+    print('get_user')
+    for count in SIZES:
+        print(f'  {count:>9,} users: {bench_get_user(count) * 1e6:8.3f} us/lookup')
+
+    print(f'get_article_ids_for_tag ({TAG_COUNT:,} tags)')
+    for count in SIZES:
+        print(f'  {count:>9,} articles: {bench_get_article_ids_for_tag(count) * 1e6:8.3f} us/page')
+
+    print('articles_by_date page (articles, previous and next dates)')
+    for count in SIZES:
+        print(f'  {count:>9,} articles: {bench_articles_by_date_page(count) * 1e6:8.3f} us/page')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Query latency of search_articles, for the memory repository's inverted index and the database's FTS5 index.
+
+Run from the project root with:
+
+    python -m benchmarks.search [number_of_articles]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from benchmarks.startup import write_synthetic_data
+from covid.adapters import database_repository, memory_repository
+from covid.adapters.database_repository import SqlAlchemyRepository
+from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.orm import metadata, map_model_to_tables
+
+
+ARTICLES = 1_000_000
+REPEATS = 20
+
+# A query matching a handful of articles, one matching a single tag's worth, and one matching every article.
+QUERIES = ('article 123456', 'synthetic article 42', 'synthetic paragraph')
+
+
+def bench_search(repo, query: str):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        page = repo.search_articles(query, 10)
+    return (time.perf_counter() - start) / REPEATS, page.total
+
+
+def main(number_of_articles: int):
+    with tempfile.TemporaryDirectory() as data_path:
+        write_synthetic_data(data_path, number_of_articles)
+
+        memory_repo = MemoryRepository()
+        memory_repository.populate(data_path, memory_repo)
+
+        # The first search builds the memory repository's index, so make it before timing any.
+        memory_repo.search_articles(QUERIES[0], 10)
+
+        clear_mappers()
+        engine = create_engine(f'sqlite:///{os.path.join(data_path, "covid.db")}')
+        metadata.create_all(engine)
+        database_repository.populate(engine, data_path)
+        map_model_to_tables()
+        database_repo = SqlAlchemyRepository(sessionmaker(bind=engine)())
+
+        print(f'search_articles ({number_of_articles:,} articles), first page of 10')
+        print(f'  {"query":<24}{"matches":>10}{"memory ms":>11}{"FTS5 ms":>11}')
+        for query in QUERIES:
+            memory_seconds, total = bench_search(memory_repo, query)
+            database_seconds, _ = bench_search(database_repo, query)
+            print(f'  {query:<24}{total:>10,}{memory_seconds * 1000:>11.2f}{database_seconds * 1000:>11.2f}')
+
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ARTICLES)
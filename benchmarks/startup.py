@@ -0,0 +1,93 @@
+"""Startup benchmarks: time to populate a MemoryRepository from synthetic CSV files, and from a snapshot of them.
+
+Run from the project root with:
+
+    python -m benchmarks.startup [number_of_articles ...]
+
+By default the benchmark covers 10k, 100k and 1M articles.
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from covid.adapters import memory_repository
+from covid.adapters.memory_repository import MemoryRepository
+
+
+SIZES = (10_000, 100_000, 1_000_000)
+ARTICLES_PER_DAY = 20
+TAG_NAMES = ('New Zealand', 'World', 'Health', 'Politics', 'Business', 'Sport', 'Technology', 'Travel')
+
+
+def write_synthetic_data(data_path: str, number_of_articles: int):
+    first_date = date(2020, 1, 1)
+    ids = list(range(1, number_of_articles + 1))
+
+    # Shuffle the rows so that the repository can't rely on the feed already being in date order.
+    random.Random(235).shuffle(ids)
+
+    with open(os.path.join(data_path, 'news_articles.csv'), 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(('id', 'date', 'title', 'first-para', 'url', 'image-url'))
+        for id in ids:
+            tags = (TAG_NAMES[id % len(TAG_NAMES)], TAG_NAMES[(id // 3) % len(TAG_NAMES)])
+            writer.writerow((
+                id,
+                (first_date + timedelta(days=id // ARTICLES_PER_DAY)).isoformat(),
+                f'Synthetic article {id}',
+                'A synthetic first paragraph, long enough to resemble the real news feed.',
+                f'https://example.com/articles/{id}',
+                f'https://example.com/images/{id}.jpg',
+                *sorted(set(tags))
+            ))
+
+    with open(os.path.join(data_path, 'users.csv'), 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(('id', 'username', 'password'))
+        writer.writerow((1, 'thorke', 'cLQ^C#oFXloS'))
+        writer.writerow((2, 'fmercury', 'mvNNbc1eLA$i'))
+
+    with open(os.path.join(data_path, 'comments.csv'), 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(('id', 'author-id', 'article-id', 'comment-text', 'timestamp'))
+        writer.writerow((1, 2, 1, 'Oh no, COVID-19 has hit New Zealand', '2020-02-28 14:31:26'))
+        writer.writerow((2, 1, 1, 'Yeah Freddie, bad news', '2020-02-28 14:39:51'))
+
+
+def bench_populate(data_path: str):
+    start = time.perf_counter()
+    memory_repository.populate(data_path, MemoryRepository())
+    return time.perf_counter() - start
+
+
+def bench_load_snapshot(snapshot: str):
+    start = time.perf_counter()
+    memory_repository.load_snapshot(snapshot, MemoryRepository())
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print('MemoryRepository startup')
+    print(f'  {"articles":>9}{"CSV":>11}{"snapshot":>11}')
+    for number_of_articles in sizes:
+        with tempfile.TemporaryDirectory() as data_path:
+            write_synthetic_data(data_path, number_of_articles)
+            csv_seconds = bench_populate(data_path)
+
+            snapshot = os.path.join(data_path, 'repository.snapshot')
+            repo = MemoryRepository()
+            memory_repository.populate(data_path, repo)
+            memory_repository.save_snapshot(snapshot, repo)
+            del repo
+            snapshot_seconds = bench_load_snapshot(snapshot)
+
+        print(f'  {number_of_articles:>9,}{csv_seconds:>10.3f}s{snapshot_seconds:>10.3f}s')
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or SIZES)
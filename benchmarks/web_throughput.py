@@ -0,0 +1,91 @@
+"""Throughput of /articles_by_date under concurrent load, for a range of connection pool and SQLite settings.
+
+Run from the project root with:
+
+    python -m benchmarks.web_throughput [number_of_articles] [number_of_threads]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy.orm import clear_mappers
+
+from benchmarks.startup import write_synthetic_data, ARTICLES_PER_DAY
+from covid import create_app
+
+
+ARTICLES = 100_000
+THREADS = 8
+REQUESTS_PER_THREAD = 250
+
+# SQLite's own defaults, for settings that leave a pragma unset.
+DEFAULT_PRAGMAS = {
+    'SQLITE_JOURNAL_MODE': None,
+    'SQLITE_SYNCHRONOUS': None,
+    'SQLITE_CACHE_SIZE': None,
+    'SQLITE_MMAP_SIZE': None,
+    'SQLITE_BUSY_TIMEOUT': None,
+}
+
+# Each setting overrides config.Config; the last is the configuration shipped in .env.
+SETTINGS = {
+    'null pool, defaults': dict(DATABASE_POOL='null', **DEFAULT_PRAGMAS),
+    'queue pool, defaults': dict(DATABASE_POOL='queue', **DEFAULT_PRAGMAS),
+    'queue pool, tuned': dict(DATABASE_POOL='queue'),
+}
+
+
+def bench_throughput(app, urls, threads: int):
+    # Each thread plays a client making requests one after another, served as a threaded WSGI server would serve them.
+    def run_client(client_urls):
+        client = app.test_client()
+        for url in client_urls:
+            assert client.get(url).status_code == 200
+
+    clients = [threading.Thread(target=run_client, args=(urls[index::threads],)) for index in range(threads)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main(number_of_articles: int, threads: int):
+    first_date = date(2020, 1, 1)
+    number_of_days = number_of_articles // ARTICLES_PER_DAY
+    rng = random.Random(235)
+    urls = [
+        f'/articles_by_date?date={first_date + timedelta(days=rng.randrange(1, number_of_days))}'
+        for _ in range(threads * REQUESTS_PER_THREAD)
+    ]
+
+    with tempfile.TemporaryDirectory() as data_path:
+        write_synthetic_data(data_path, number_of_articles)
+
+        print(f'/articles_by_date ({number_of_articles:,} articles), {threads} concurrent clients')
+        print(f'  {"setting":<24}{"requests/s":>12}')
+        for name, setting in SETTINGS.items():
+            # A database of its own for each setting, since journal_mode is kept in the database file.
+            clear_mappers()
+            app = create_app(dict(
+                setting,
+                REPOSITORY='database',
+                SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.join(data_path, name.replace(" ", "-") + ".db")}',
+                TEST_DATA_PATH=data_path,
+                RESULT_CACHE_SIZE=0
+            ))
+
+            # Warm up the pool and SQLite's page cache before measuring.
+            bench_throughput(app, urls[:threads * 10], threads)
+            print(f'  {name:<24}{bench_throughput(app, urls, threads):>12,.0f}')
+
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    main(*(arguments + [ARTICLES, THREADS][len(arguments):]))
@@ -17,7 +17,24 @@ class Config:
 
     # Database configuration
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
+    SQLALCHEMY_READ_ONLY_DATABASE_URI = environ.get('SQLALCHEMY_READ_ONLY_DATABASE_URI')
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    INGEST_BATCH_SIZE = int(environ.get('INGEST_BATCH_SIZE', 10000))
+    INGEST_MODE = environ.get('INGEST_MODE', 'reload')
+    RESULT_CACHE_SIZE = int(environ.get('RESULT_CACHE_SIZE', 0))
+    RESULT_CACHE_TTL = float(environ.get('RESULT_CACHE_TTL', 300))
+    DATABASE_POOL = environ.get('DATABASE_POOL', 'queue')
+    DATABASE_POOL_SIZE = int(environ.get('DATABASE_POOL_SIZE', 5))
+    DATABASE_MAX_OVERFLOW = int(environ.get('DATABASE_MAX_OVERFLOW', 10))
+
+    # PRAGMAs set on each connection to a file-based SQLite database; None leaves SQLite's default.
+    SQLITE_JOURNAL_MODE = environ.get('SQLITE_JOURNAL_MODE', 'wal')
+    SQLITE_SYNCHRONOUS = environ.get('SQLITE_SYNCHRONOUS', 'normal')
+    SQLITE_CACHE_SIZE = int(environ.get('SQLITE_CACHE_SIZE', -65536))
+    SQLITE_MMAP_SIZE = int(environ.get('SQLITE_MMAP_SIZE', 268435456))
+    SQLITE_BUSY_TIMEOUT = int(environ.get('SQLITE_BUSY_TIMEOUT', 5000))
 
     REPOSITORY = environ.get('REPOSITORY')
+    MEMORY_STORAGE = environ.get('MEMORY_STORAGE', 'objects')
+    MEMORY_SNAPSHOT = environ.get('MEMORY_SNAPSHOT')
@@ -1,13 +1,12 @@
 """Initialize Flask app."""
 
-from flask import Flask
+from flask import Flask, g
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, clear_mappers
-from sqlalchemy.pool import NullPool, StaticPool
 
-from covid.adapters import memory_repository, database_repository
-from covid.adapters.orm import metadata, map_model_to_tables
+from covid.adapters import memory_repository, columnar_repository, database_repository
+from covid.adapters.caching_repository import ResultCache
+from covid.adapters.orm import metadata, map_model_to_tables, upgrade_schema
 from covid.adapters.unit_of_work import SqlAlchemyUnitOfWork, InMemoryUnitOfWork
 
 import covid.adapters.unit_of_work as uow
@@ -31,36 +30,84 @@ def create_app(test_config=None):
         app.config.from_mapping(test_config)
         data_path = app.config['TEST_DATA_PATH']
 
+    results = None
+    if app.config['RESULT_CACHE_SIZE'] > 0:
+        # Share a bounded cache of frequently read results between the units of work; see CachingRepository.
+        results = ResultCache(app.config['RESULT_CACHE_SIZE'], app.config['RESULT_CACHE_TTL'])
+
     if app.config['REPOSITORY'] == 'memory':
         # Create the InMemoryUnitOfWork and MemoryRepository implementations for a memory-based repository.
-        repo = memory_repository.MemoryRepository()
-        uow.uow_instance = InMemoryUnitOfWork(repo)
-        memory_repository.populate(data_path, repo)
-
-    elif app.config['REPOSITORY'] == 'database':
-        # Configure database.
-        database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+        if app.config['MEMORY_STORAGE'] == 'columnar':
+            # Hold articles in contiguous arrays, materializing Article objects on demand.
+            repo = columnar_repository.ColumnarMemoryRepository()
+        else:
+            repo = memory_repository.MemoryRepository()
 
-        if database_uri == 'sqlite://':
-            # In-memory database.
-            pool = StaticPool
+        snapshot = app.config['MEMORY_SNAPSHOT']
+        if snapshot is not None and memory_repository.snapshot_is_current(snapshot, data_path):
+            # Load the repository from a snapshot that is newer than the CSV files.
+            memory_repository.load_snapshot(snapshot, repo)
         else:
-            # File-based database.
-            pool = NullPool
+            memory_repository.populate(data_path, repo)
+            if snapshot is not None:
+                memory_repository.save_snapshot(snapshot, repo)
+        uow.uow_instance = InMemoryUnitOfWork(repo, results)
 
-        engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=pool)
+    elif app.config['REPOSITORY'] == 'database':
+        # Configure database. A file-based database's connections are pooled, and tuned as they're opened.
+        pragmas = {
+            'journal_mode': app.config['SQLITE_JOURNAL_MODE'],
+            'synchronous': app.config['SQLITE_SYNCHRONOUS'],
+            'cache_size': app.config['SQLITE_CACHE_SIZE'],
+            'mmap_size': app.config['SQLITE_MMAP_SIZE'],
+            'busy_timeout': app.config['SQLITE_BUSY_TIMEOUT'],
+        }
+        pragmas = {name: value for name, value in pragmas.items() if value is not None}
+        engine = database_repository.create_database_engine(
+            app.config['SQLALCHEMY_DATABASE_URI'],
+            pool=app.config['DATABASE_POOL'],
+            pool_size=app.config['DATABASE_POOL_SIZE'],
+            max_overflow=app.config['DATABASE_MAX_OVERFLOW'],
+            pragmas=pragmas
+        )
+
+        if app.config['INGEST_MODE'] == 'incremental' and not app.config['TESTING']:
+            # Apply whatever has been appended to the CSV files since they were last ingested, keeping existing data.
+            clear_mappers()
+            upgrade_schema(engine)
+            database_repository.populate(
+                engine, data_path, batch_size=app.config['INGEST_BATCH_SIZE'], incremental=True
+            )
 
-        if app.config['TESTING'] or len(engine.table_names()) == 0:
+        elif app.config['TESTING'] or len(engine.table_names()) == 0:
             # For testing, or first-time use of the web application, reinitialise the database.
             clear_mappers()
             metadata.create_all(engine)                        # Conditionally create database tables.
             for table in reversed(metadata.sorted_tables):     # Remove any data from the tables.
                 engine.execute(table.delete())
-            database_repository.populate(engine, data_path)    # Populate the database with fresh data.
+            # Populate the database with fresh data, streaming the CSV files in batches.
+            database_repository.populate(engine, data_path, batch_size=app.config['INGEST_BATCH_SIZE'])
+
+        else:
+            # Add any tables or indexes that a database created by an earlier version of the application lacks.
+            upgrade_schema(engine)
 
         # Create the database session factory and unit of work objects.
         session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        uow.uow_instance = SqlAlchemyUnitOfWork(session_factory)
+
+        read_session_factory = None
+        if app.config['SQLALCHEMY_READ_ONLY_DATABASE_URI'] is not None:
+            # Route reads to a database of their own, whose connections refuse to write.
+            read_engine = database_repository.create_database_engine(
+                app.config['SQLALCHEMY_READ_ONLY_DATABASE_URI'],
+                pool=app.config['DATABASE_POOL'],
+                pool_size=app.config['DATABASE_POOL_SIZE'],
+                max_overflow=app.config['DATABASE_MAX_OVERFLOW'],
+                pragmas=dict(pragmas, query_only=1)
+            )
+            read_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+        uow.uow_instance = SqlAlchemyUnitOfWork(session_factory, results, read_session_factory)
 
         # Generate mappings that map domain model classes to the database tables.
         map_model_to_tables()
@@ -80,10 +127,17 @@ def create_app(test_config=None):
         from .utilities import utilities
         app.register_blueprint(utilities.utilities_blueprint)
 
+        # Give each request a unit of work of its own, which every service call made while handling it shares.
+        @app.before_request
+        def begin_request_unit_of_work():
+            g.uow = uow.uow_instance.for_request()
+
         # Register a tear-down method that will be called after each request has been processed.
         @app.teardown_appcontext
         def shutdown_session(exception=None):
-            if isinstance(uow.uow_instance, SqlAlchemyUnitOfWork):
-                uow.uow_instance.close_current_session()
+            request_uow = g.pop('uow', None)
+            for unit_of_work in (request_uow, uow.uow_instance):
+                if isinstance(unit_of_work, SqlAlchemyUnitOfWork):
+                    unit_of_work.close_current_session()
 
     return app
@@ -0,0 +1,357 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Iterable, List, NamedTuple
+
+from covid.adapters.repository import (
+    AbstractRepository, ArticlePage, DatePage, PageVersion, SearchPage, TimelineBounds, ARTICLE_FIELDS
+)
+from covid.domain.model import User, Article, Tag, Comment
+
+
+# Kinds of cached result; each key is a tuple starting with its kind.
+ARTICLE = 'article'                     # (ARTICLE, id, profile)
+ARTICLES_BY_DATE = 'articles by date'   # (ARTICLES_BY_DATE, date, profile)
+ARTICLE_IDS_FOR_TAG = 'article ids'     # (ARTICLE_IDS_FOR_TAG, tag_name)
+TAG_LIST = 'tags'                       # (TAG_LIST,)
+PREVIOUS_DATE = 'previous date'         # (PREVIOUS_DATE, date)
+NEXT_DATE = 'next date'                 # (NEXT_DATE, date)
+DATE_PAGE = 'date page'                 # (DATE_PAGE, date, profile)
+DATE_VERSION = 'date version'           # (DATE_VERSION, date)
+TAG_PAGE = 'tag page'                   # (TAG_PAGE, tag_name, page_size, after, before, profile)
+TAG_VERSION = 'tag version'             # (TAG_VERSION, tag_name)
+TIMELINE_BOUNDS = 'timeline bounds'     # (TIMELINE_BOUNDS,)
+SAMPLE = 'sample'                       # (SAMPLE, k, profile)
+
+# Returned by ResultCache.get for a key with no (live) entry, since None is a result like any other.
+MISSING = object()
+
+
+class CacheStatistics(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int          # Entries dropped to make room for newer ones.
+    expirations: int        # Entries dropped for outliving their time to live.
+    invalidations: int      # Entries dropped because a write changed them.
+    entries: int
+
+
+class ResultCache:
+    """ A bounded map from keys to repository results, shared by every unit of work.
+
+    Holding more than max_entries entries evicts the least recently used one, and an entry is dropped when it's read
+    more than ttl seconds after it was put. The cache is safe to use from several threads at once.
+
+    The cache's entries are current at its generation: the repository's generation (see
+    AbstractRepository.get_generation) when the cache was last synchronized with it, advanced past the writes made
+    through the cache. Writes it didn't see, such as those made by other processes, change the repository's generation
+    without advancing the cache's, and synchronizing then drops every entry.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self.generation = None
+
+        # key -> (expiry time, value), least recently used first.
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key):
+        """ Returns the value cached under key, or MISSING. """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+
+            if entry is None:
+                self._misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key, value, generation: int = None):
+        """ Caches value under key, unless it was read at a generation other than the cache's. """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, stale):
+        """ Drops every entry for which stale(key, value) is true. """
+        with self._lock:
+            stale_keys = [key for key, (_, value) in self._entries.items() if stale(key, value)]
+            for key in stale_keys:
+                del self._entries[key]
+            self._invalidations += len(stale_keys)
+
+    def synchronize(self, generation: int):
+        """ Drops every entry unless the repository is still at the cache's generation, then records generation. """
+        with self._lock:
+            if generation != self.generation:
+                self._invalidations += len(self._entries)
+                self._entries.clear()
+                self.generation = generation
+
+    def advance(self, from_generation: int, to_generation: int):
+        """ Records that writes whose stale entries have been dropped took the repository from from_generation to
+        to_generation, provided the cache was current at from_generation.
+        """
+        with self._lock:
+            if self.generation == from_generation:
+                self.generation = to_generation
+
+    def statistics(self) -> CacheStatistics:
+        with self._lock:
+            return CacheStatistics(
+                self._hits, self._misses, self._evictions, self._expirations, self._invalidations, len(self._entries)
+            )
+
+
+class Change(NamedTuple):
+    articles: List[Article]     # Articles added, or whose Comments or Tags changed.
+    tags: List[Tag]             # Tags added.
+
+
+class CachingRepository(AbstractRepository):
+    """ Wraps a repository, answering reads of single Articles, the Articles on a date and their page, the Tags and the
+    Articles they tag (and their pages), neighbouring dates, the timeline's bounds, samples of Articles, and the
+    versions of date and tag pages from a ResultCache.
+
+    Writes made through the repository drop just the cached results they change. A repository whose changes aren't
+    visible to other units of work until committed (such as a SqlAlchemyRepository) caches nothing once written to, and
+    its changes are dropped from the cache again when committed, in case another unit of work cached the old results
+    in the meantime.
+
+    Before answering its first read, the repository synchronizes the ResultCache (and the wrapped repository its
+    RepositoryCache) with the wrapped repository's generation, so that writes made elsewhere (by another process
+    sharing a database, say) drop every cached result. A unit of work that has already synchronized them, such as one
+    made for a request, can pass the generation as generation.
+    """
+
+    def __init__(self, repo: AbstractRepository, results: ResultCache, generation: int = None):
+        self._repo = repo
+        self.results = results
+        self.cache = repo.cache
+        self._generation = generation
+        self._uncommitted = list()
+
+        # The generations the repository was at just before, and just after, the uncommitted writes.
+        self._generation_before_writes = None
+        self._generation_after_writes = None
+
+    def synchronize(self) -> int:
+        """ Synchronizes the caches with the repository, unless already done, and returns the generation. """
+        if self._generation is None:
+            self._generation = self._repo.synchronize()
+            self.results.synchronize(self._generation)
+        return self._generation
+
+    def _cached(self, key, read, detach: bool = True, page: bool = False):
+        # detach is False for results, such as dates, that needn't be detached from the unit of work to be kept. page
+        # is True for DatePages, whose Articles alone are detached, so that _invalidate can read their neighbouring
+        # dates.
+        generation = self.synchronize()
+        value = self.results.get(key)
+        if value is not MISSING:
+            if page:
+                return value._replace(articles=self._repo.attach(value.articles))
+            return self._repo.attach(value) if detach else value
+
+        result = read()
+        if len(self._uncommitted) == 0:
+            if page:
+                kept = result._replace(articles=self._repo.detach(result.articles))
+            else:
+                kept = self._repo.detach(result) if detach else result
+            self.results.put(key, kept, generation)
+        return result
+
+    def _change(self, articles: Iterable[Article] = (), tags: Iterable[Tag] = ()):
+        change = Change(list(articles), list(tags))
+        self._invalidate(change)
+        self._uncommitted.append(change)
+
+        # Each write advances the repository's generation by one, and none can come between the writes of a unit of
+        # work once the first has been made.
+        self._generation_after_writes = self._repo.get_generation()
+        if self._generation_before_writes is None:
+            self._generation_before_writes = self._generation_after_writes - 1
+
+    def _invalidate(self, change: Change):
+        stale_keys = set()
+        dates = set()
+        for article in change.articles:
+            stale_keys.add((ARTICLE, article.id))
+            stale_keys.add((ARTICLES_BY_DATE, article.date))
+            stale_keys.update((ARTICLE_IDS_FOR_TAG, tag.tag_name) for tag in article.tags)
+            dates.add(article.date)
+            stale_keys.add((DATE_PAGE, article.date))
+            stale_keys.add((DATE_VERSION, article.date))
+            stale_keys.update((TAG_PAGE, tag.tag_name) for tag in article.tags)
+            stale_keys.update((TAG_VERSION, tag.tag_name) for tag in article.tags)
+        for tag in change.tags:
+            stale_keys.add((TAG_LIST,))
+            stale_keys.add((ARTICLE_IDS_FOR_TAG, tag.tag_name))
+            stale_keys.add((TAG_PAGE, tag.tag_name))
+            stale_keys.add((TAG_VERSION, tag.tag_name))
+
+        def stale(key, value):
+            if key[:2] in stale_keys:
+                return True
+
+            # A neighbouring date is stale if an Article now falls between it and the date it neighbours.
+            if key[0] == PREVIOUS_DATE:
+                return any(key[1] > new_date and (value is None or value < new_date) for new_date in dates)
+            if key[0] == NEXT_DATE:
+                return any(key[1] < new_date and (value is None or value > new_date) for new_date in dates)
+            if key[0] in (DATE_PAGE, DATE_VERSION):
+                return any(
+                    (value.previous_date is None or value.previous_date < new_date) and
+                    (value.next_date is None or new_date < value.next_date)
+                    for new_date in dates
+                )
+
+            # The timeline's bounds are stale if an Article falls outside them, and any sample once Articles change.
+            if key[0] == TIMELINE_BOUNDS:
+                return any(
+                    value.first_date is None or new_date < value.first_date or new_date > value.last_date
+                    for new_date in dates
+                )
+            return key[0] == SAMPLE and len(dates) > 0
+
+        self.results.invalidate(stale)
+
+    def changes_committed(self):
+        self._repo.changes_committed()
+        for change in self._uncommitted:
+            self._invalidate(change)
+        self._uncommitted.clear()
+
+        if self._generation_before_writes is not None:
+            self.results.advance(self._generation_before_writes, self._generation_after_writes)
+            self._generation_before_writes = self._generation_after_writes = None
+
+    def get_generation(self) -> int:
+        return self._repo.get_generation()
+
+    def get_article_generation(self, id: int) -> int:
+        return self._repo.get_article_generation(id)
+
+    def get_tag_generation(self, tag_name: str) -> int:
+        return self._repo.get_tag_generation(tag_name)
+
+    def get_date_version(self, target_date: date) -> PageVersion:
+        return self._cached(
+            (DATE_VERSION, target_date), lambda: self._repo.get_date_version(target_date), detach=False
+        )
+
+    def get_tag_version(self, tag_name: str) -> PageVersion:
+        return self._cached((TAG_VERSION, tag_name), lambda: self._repo.get_tag_version(tag_name), detach=False)
+
+    def add_user(self, user: User):
+        self._repo.add_user(user)
+        self._change()
+
+    def get_user(self, username) -> User:
+        return self._repo.get_user(username)
+
+    def add_article(self, article: Article):
+        self._repo.add_article(article)
+        self._change(articles=[article])
+
+    def add_articles(self, articles: Iterable[Article]):
+        articles = list(articles)
+        self._repo.add_articles(articles)
+        self._change(articles=articles)
+
+    def get_article(self, id: int, profile: str = ARTICLE_FIELDS) -> Article:
+        return self._cached((ARTICLE, id, profile), lambda: self._repo.get_article(id, profile))
+
+    def get_articles_by_date(self, target_date: date, profile: str = ARTICLE_FIELDS) -> List[Article]:
+        return self._cached(
+            (ARTICLES_BY_DATE, target_date, profile), lambda: self._repo.get_articles_by_date(target_date, profile)
+        )
+
+    def get_date_page(self, target_date: date, profile: str = ARTICLE_FIELDS) -> DatePage:
+        return self._cached(
+            (DATE_PAGE, target_date, profile), lambda: self._repo.get_date_page(target_date, profile), page=True
+        )
+
+    def get_number_of_articles(self):
+        return self._repo.get_number_of_articles()
+
+    def get_first_article(self, profile: str = ARTICLE_FIELDS) -> Article:
+        return self._repo.get_first_article(profile)
+
+    def get_last_article(self, profile: str = ARTICLE_FIELDS) -> Article:
+        return self._repo.get_last_article(profile)
+
+    def get_timeline_bounds(self) -> TimelineBounds:
+        return self._cached((TIMELINE_BOUNDS,), self._repo.get_timeline_bounds, detach=False)
+
+    def get_articles_by_id(self, id_list, profile: str = ARTICLE_FIELDS):
+        return self._repo.get_articles_by_id(id_list, profile)
+
+    def sample_articles(self, k: int, profile: str = ARTICLE_FIELDS) -> List[Article]:
+        # The same sample is returned until Articles change, or it expires.
+        return self._cached((SAMPLE, k, profile), lambda: self._repo.sample_articles(k, profile))
+
+    def get_article_ids_for_tag(self, tag_name: str):
+        # The cached list is shared, so each caller gets a copy of it.
+        return list(self._cached(
+            (ARTICLE_IDS_FOR_TAG, tag_name), lambda: list(self._repo.get_article_ids_for_tag(tag_name)), detach=False
+        ))
+
+    def get_articles_for_tag(
+            self, tag_name: str, page_size: int, after: int = None, before: int = None, profile: str = ARTICLE_FIELDS
+    ) -> ArticlePage:
+        return self._cached(
+            (TAG_PAGE, tag_name, page_size, after, before, profile),
+            lambda: self._repo.get_articles_for_tag(tag_name, page_size, after, before, profile)
+        )
+
+    def search_articles(self, query: str, limit: int, cursor: int = None, profile: str = ARTICLE_FIELDS) -> SearchPage:
+        return self._repo.search_articles(query, limit, cursor, profile)
+
+    def get_date_of_previous_article(self, article: Article):
+        return self._cached(
+            (PREVIOUS_DATE, article.date), lambda: self._repo.get_date_of_previous_article(article), detach=False
+        )
+
+    def get_date_of_next_article(self, article: Article):
+        return self._cached(
+            (NEXT_DATE, article.date), lambda: self._repo.get_date_of_next_article(article), detach=False
+        )
+
+    def add_tag(self, tag: Tag):
+        self._repo.add_tag(tag)
+        self._change(articles=tag.tagged_articles, tags=[tag])
+
+    def get_tags(self) -> List[Tag]:
+        return self._cached((TAG_LIST,), self._repo.get_tags)
+
+    def add_comment(self, comment: Comment):
+        self._repo.add_comment(comment)
+        self._change(articles=[comment.article])
+
+    def get_comments(self):
+        return self._repo.get_comments()
@@ -0,0 +1,249 @@
+import random
+import weakref
+from array import array
+from bisect import bisect_left
+from datetime import date
+from typing import Iterable, List
+
+from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.repository import DatePage, TimelineBounds, ARTICLE_FIELDS, ARTICLES, TAGS
+from covid.domain.model import Article, Tag, CompactArticle, CompactTag
+
+
+# Number of text fields (title, first_para, hyperlink, image_hyperlink) stored per article.
+TEXT_FIELDS = 4
+
+# Articles are ordered by a single integer key combining the date's ordinal (high bits) with the id (low bits).
+ID_BITS = 32
+
+
+def order_key(ordinal: int, id: int) -> int:
+    return (ordinal << ID_BITS) | id
+
+
+def insert_id(article_ids: array, id: int):
+    # Inserts id into the sorted array of ids, unless it's already there.
+    index = bisect_left(article_ids, id)
+    if index == len(article_ids) or article_ids[index] != id:
+        article_ids.insert(index, id)
+
+
+class ColumnarMemoryRepository(MemoryRepository):
+    # Articles are held column-wise in contiguous arrays rather than as Article objects. Rows are appended in the
+    # order Articles arrive; separate arrays order the rows by (date, id) and by id for bisecting. Article objects are
+    # only materialized when a query returns them, and are kept only for as long as something else refers to them.
+    #
+    # Tag membership is recorded as a sorted array of article ids per Tag. Tags returned by get_tags don't list their
+    # tagged Articles; use get_article_ids_for_tag instead.
+    #
+    # An Article added under a known id gets a new row, and the old row, though left in the columns, drops out of the
+    # orderings.
+
+    def __init__(self):
+        super().__init__()
+        self._ids = array('q')
+        self._ordinals = array('l')
+        self._text = bytearray()
+        self._text_offsets = array('q', [0])
+
+        self._order_keys = array('q')
+        self._order_rows = array('q')
+        self._sorted_ids = array('q')
+        self._sorted_id_rows = array('q')
+
+        self._materialized = weakref.WeakValueDictionary()
+
+        # Number of each Tag's tagged_articles whose ids are in its sorted array; see _sorted_article_ids.
+        self._merged_tag_articles = dict()
+
+    def add_article(self, article: Article):
+        self.cache.invalidate(ARTICLES)
+        replaced_row = self._row_for_id(article.id)
+        if replaced_row is not None:
+            # The replaced Article's text stays in the search index, so the index is built again by the next search.
+            self._search_index = None
+            key = order_key(self._ordinals[replaced_row], article.id)
+            index = bisect_left(self._order_keys, key)
+            del self._order_keys[index]
+            del self._order_rows[index]
+
+        row = self._append_row(
+            article.id, article.date, article.title, article.first_para, article.hyperlink, article.image_hyperlink
+        )
+        self._materialized[article.id] = article
+
+        # Ordered inserts into the contiguous index arrays.
+        key = order_key(self._ordinals[row], article.id)
+        index = bisect_left(self._order_keys, key)
+        self._order_keys.insert(index, key)
+        self._order_rows.insert(index, row)
+
+        index = bisect_left(self._sorted_ids, article.id)
+        if replaced_row is not None:
+            self._sorted_id_rows[index] = row
+        else:
+            self._sorted_ids.insert(index, article.id)
+            self._sorted_id_rows.insert(index, row)
+
+        # Record the Article against any of its Tags that the repository already holds.
+        for tag in article.tags:
+            if tag.tag_name in self._tag_article_ids:
+                insert_id(self._tag_article_ids[tag.tag_name], article.id)
+
+        self._next_generation([article], [tag.tag_name for tag in article.tags])
+
+    def add_articles(self, articles: Iterable[Article]):
+        self.add_article_rows(
+            (article.id, article.date, article.title, article.first_para, article.hyperlink, article.image_hyperlink)
+            for article in articles
+        )
+
+    def add_article_rows(self, rows: Iterable[tuple]):
+        # Append the rows straight into the columns, without creating Article objects, then reorder the indexes once.
+        self.cache.invalidate(ARTICLES)
+        number_of_articles = len(self._sorted_ids)
+        first_row = len(self._ids)
+        for row in rows:
+            self._append_row(*row)
+            self._materialized.pop(row[0], None)
+
+        # Each id's last row is its Article's; rows it replaced drop out of the orderings.
+        rows_by_id = dict(zip(self._ids, range(len(self._ids))))
+        if len(rows_by_id) - number_of_articles < len(self._ids) - first_row:
+            self._search_index = None
+
+        order = sorted(rows_by_id.values(), key=lambda row: order_key(self._ordinals[row], self._ids[row]))
+        self._order_keys = array('q', (order_key(self._ordinals[row], self._ids[row]) for row in order))
+        self._order_rows = array('q', order)
+
+        order = sorted(rows_by_id.values(), key=self._ids.__getitem__)
+        self._sorted_ids = array('q', (self._ids[row] for row in order))
+        self._sorted_id_rows = array('q', order)
+        self._next_generation(all_articles=True, all_tags=True)
+
+    def article_rows(self) -> Iterable[tuple]:
+        for row in self._order_rows:
+            yield (self._ids[row], date.fromordinal(self._ordinals[row])) + tuple(self._text_fields(row))
+
+    def get_article(self, id: int, profile: str = ARTICLE_FIELDS) -> Article:
+        row = self._row_for_id(id)
+        return self._materialize(row) if row is not None else None
+
+    def get_articles_by_date(self, target_date: date, profile: str = ARTICLE_FIELDS) -> List[Article]:
+        start, stop = self._date_range(target_date.toordinal())
+        return [self._materialize(row) for row in self._order_rows[start:stop]]
+
+    def get_date_page(self, target_date: date, profile: str = ARTICLE_FIELDS) -> DatePage:
+        start, stop = self._date_range(target_date.toordinal())
+        if start == stop:
+            return DatePage([], None, None)
+
+        return DatePage(
+            [self._materialize(row) for row in self._order_rows[start:stop]],
+            date.fromordinal(self._order_keys[start - 1] >> ID_BITS) if start > 0 else None,
+            date.fromordinal(self._order_keys[stop] >> ID_BITS) if stop < len(self._order_keys) else None
+        )
+
+    def get_number_of_articles(self):
+        return len(self._sorted_ids)
+
+    def get_first_article(self, profile: str = ARTICLE_FIELDS):
+        return self._materialize(self._order_rows[0]) if len(self._order_rows) > 0 else None
+
+    def get_last_article(self, profile: str = ARTICLE_FIELDS):
+        return self._materialize(self._order_rows[-1]) if len(self._order_rows) > 0 else None
+
+    def get_timeline_bounds(self) -> TimelineBounds:
+        if len(self._order_keys) == 0:
+            return TimelineBounds(None, None)
+        return TimelineBounds(
+            date.fromordinal(self._order_keys[0] >> ID_BITS), date.fromordinal(self._order_keys[-1] >> ID_BITS)
+        )
+
+    def get_articles_by_id(self, id_list, profile: str = ARTICLE_FIELDS):
+        rows = (self._row_for_id(id) for id in id_list)
+        return [self._materialize(row) for row in rows if row is not None]
+
+    def sample_articles(self, k: int, profile: str = ARTICLE_FIELDS) -> List[Article]:
+        indexes = random.sample(range(len(self._sorted_id_rows)), min(k, len(self._sorted_id_rows)))
+        return [self._materialize(self._sorted_id_rows[index]) for index in indexes]
+
+    def _sorted_article_ids(self, tag_name: str):
+        # Returns the Tag's sorted array of article ids, or an empty array if there's no Tag named tag_name.
+        tag = self._tags_index.get(tag_name)
+        if tag is None:
+            return array('q')
+
+        # Tag associations are append-only, so any made since the Tag was added are at the end of tagged_articles.
+        article_ids = self._tag_article_ids[tag_name]
+        merged = self._merged_tag_articles[tag_name]
+        for article in tag.tagged_articles[merged:]:
+            insert_id(article_ids, article.id)
+        self._merged_tag_articles[tag_name] = len(tag.tagged_articles)
+        return article_ids
+
+    def get_date_of_previous_article(self, article: Article):
+        start, _ = self._date_range(article.date.toordinal())
+        return date.fromordinal(self._order_keys[start - 1] >> ID_BITS) if start > 0 else None
+
+    def get_date_of_next_article(self, article: Article):
+        _, stop = self._date_range(article.date.toordinal())
+        return date.fromordinal(self._order_keys[stop] >> ID_BITS) if stop < len(self._order_keys) else None
+
+    def add_tag(self, tag: Tag):
+        self.cache.invalidate(TAGS)
+        self._tags.append(tag)
+        self._tags_index[tag.tag_name] = tag
+        self._tag_article_ids[tag.tag_name] = array('q', sorted(article.id for article in tag.tagged_articles))
+        self._merged_tag_articles[tag.tag_name] = len(tag.tagged_articles)
+        self._next_generation(tag_names=[tag.tag_name], all_articles=True)
+
+    def add_tag_for_article_ids(self, tag_name: str, article_ids: Iterable[int]):
+        # Record the Tag's article ids without materializing those Articles.
+        self.add_tag(CompactTag(tag_name))
+        self._tag_article_ids[tag_name] = array('q', sorted(article_ids))
+
+    def _append_row(self, id, article_date, title, first_para, hyperlink, image_hyperlink) -> int:
+        if self._search_index is not None:
+            self._search_index.add(id, title, first_para)
+        self._ids.append(id)
+        self._ordinals.append(article_date.toordinal())
+        for field in (title, first_para, hyperlink, image_hyperlink):
+            self._text += field.encode()
+            self._text_offsets.append(len(self._text))
+        return len(self._ids) - 1
+
+    def _row_for_id(self, id):
+        index = bisect_left(self._sorted_ids, id)
+        if index < len(self._sorted_ids) and self._sorted_ids[index] == id:
+            return self._sorted_id_rows[index]
+        return None
+
+    def _date_range(self, ordinal: int):
+        # The slice of the (date, id) ordering holding the rows dated ordinal.
+        start = bisect_left(self._order_keys, order_key(ordinal, 0))
+        stop = bisect_left(self._order_keys, order_key(ordinal + 1, 0), start)
+        return start, stop
+
+    def _text_fields(self, row: int) -> List[str]:
+        offsets = self._text_offsets[row * TEXT_FIELDS:(row + 1) * TEXT_FIELDS + 1]
+        return [self._text[offsets[index]:offsets[index + 1]].decode() for index in range(TEXT_FIELDS)]
+
+    def _materialize(self, row: int) -> Article:
+        id = self._ids[row]
+        article = self._materialized.get(id)
+
+        if article is None:
+            article = CompactArticle(date.fromordinal(self._ordinals[row]), *self._text_fields(row), id=id)
+
+            # Attach the Tags whose sorted id arrays contain the Article.
+            for tag in self._tags:
+                article_ids = self._sorted_article_ids(tag.tag_name)
+                index = bisect_left(article_ids, id)
+                if index < len(article_ids) and article_ids[index] == id:
+                    article.add_tag(tag)
+
+            self._materialized[id] = article
+
+        return article
+
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import csv
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from werkzeug.security import generate_password_hash
+
+
+# Below this many plaintext passwords, hashing in-process is quicker than starting a pool of worker processes.
+POOL_THRESHOLD = 64
+
+
+# Werkzeug password hashes are method$salt$hash, where method is pbkdf2:<digest>[:<iterations>] or
+# scrypt[:<n>:<r>:<p>], and hash is hexadecimal.
+PASSWORD_HASH = re.compile(r'(pbkdf2:[a-z0-9_]+(:[0-9]+)?|scrypt(:[0-9]+){0,3})\$[^$]+\$[0-9a-f]+')
+
+# Users CSV files (id, username, password) may have a fourth column, flagging with HASHED that the password is hashed.
+HASHED = '1'
+
+
+def is_password_hash(password: str) -> bool:
+    """ Returns True if password has the form of a Werkzeug password hash. """
+    return PASSWORD_HASH.fullmatch(password) is not None
+
+
+def is_hashed(user_row: List[str]) -> Optional[bool]:
+    """ Returns whether a users CSV row flags its password as hashed, or None if the row has no flag. """
+    if len(user_row) < 4 or user_row[3].strip() == '':
+        return None
+    return user_row[3].strip() == HASHED
+
+
+class PasswordHasher:
+    """ Hashes batches of passwords, keeping plaintext passwords' hashes and already-hashed passwords as they are.
+
+    Hashing is deliberately slow, so when a batch holds at least pool_threshold plaintext passwords they are hashed
+    across a pool of worker processes (by default, one per CPU). The pool is started by the first batch that needs
+    it and reused by later batches until the hasher is closed.
+    """
+
+    def __init__(self, processes: int = None, pool_threshold: int = POOL_THRESHOLD):
+        self.processes = processes or os.cpu_count() or 1
+        self.pool_threshold = pool_threshold
+        self._pool = None
+
+    def __enter__(self) -> PasswordHasher:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def hash(self, passwords: List[str], hashed: List[Optional[bool]] = None) -> List[str]:
+        """ Returns passwords with every plaintext password replaced by its hash.
+
+        hashed, if given, flags each password as hashed (True), plaintext (False) or unknown (None). A password of
+        unknown kind is taken to be hashed if it has the form of a Werkzeug hash. A password flagged as hashed that
+        hasn't that form raises ValueError.
+        """
+        hashed = hashed if hashed is not None else [None] * len(passwords)
+        plaintext_indexes = list()
+        for index, (password, flag) in enumerate(zip(passwords, hashed)):
+            if flag is None:
+                flag = is_password_hash(password)
+            elif flag and not is_password_hash(password):
+                raise ValueError(f'Password {index} is flagged as hashed, but is not a password hash')
+            if not flag:
+                plaintext_indexes.append(index)
+
+        result = list(passwords)
+        plaintext = [result[index] for index in plaintext_indexes]
+        if len(plaintext) < self.pool_threshold or not pool_available():
+            password_hashes = map(generate_password_hash, plaintext)
+        else:
+            chunksize = max(1, len(plaintext) // (self.processes * 4))
+            password_hashes = self._get_pool().map(generate_password_hash, plaintext, chunksize=chunksize)
+
+        for index, password_hash in zip(plaintext_indexes, password_hashes):
+            result[index] = password_hash
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('fork'))
+        return self._pool
+
+
+def hash_passwords(
+        passwords: List[str], processes: int = None, pool_threshold: int = POOL_THRESHOLD,
+        hashed: List[Optional[bool]] = None
+) -> List[str]:
+    """ Returns passwords with every plaintext password replaced by its hash; see PasswordHasher.hash. """
+    with PasswordHasher(processes, pool_threshold) as hasher:
+        return hasher.hash(passwords, hashed)
+
+
+def pool_available() -> bool:
+    # Worker processes are forked, so that they don't re-import (and re-run) the application's entry point module.
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def hash_credentials_file(source_filename: str, destination_filename: str, processes: int = None):
+    """ Copies a users CSV file (id, username, password), hashing any plaintext passwords on the way.
+
+    Populating a repository from the copy then costs no password hashing at startup.
+    """
+    with open(source_filename, newline='') as infile:
+        rows = list(csv.reader(infile))
+
+    header, user_rows = rows[0], rows[1:]
+    passwords = [user_row[2].strip() for user_row in user_rows]
+    passwords = hash_passwords(passwords, processes, hashed=[is_hashed(user_row) for user_row in user_rows])
+
+    # Flag every password as hashed, so that loading the copy needn't guess.
+    with open(destination_filename, 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(header[:3] + ['hashed'] + header[4:])
+        for user_row, password in zip(user_rows, passwords):
+            writer.writerow(user_row[:2] + [password, HASHED] + user_row[4:])
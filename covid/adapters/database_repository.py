@@ -1,28 +1,210 @@
 import csv
+import hashlib
+import io
+import logging
+import math
 import os
+import pickle
+import random
+import time
 
 from datetime import date
-from typing import List
+from itertools import count, islice
+from typing import Iterable, List, NamedTuple
 
-from sqlalchemy import desc, asc
+from sqlalchemy import create_engine, desc, asc, and_, event, func, inspect, or_, select
 from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, load_only, selectinload
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
-from werkzeug.security import generate_password_hash
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool, StaticPool
 
 from covid.domain.model import User, Article, Comment, Tag
-from covid.adapters.repository import AbstractRepository
+from covid.adapters.credentials import PasswordHasher, is_hashed
+from covid.adapters import orm
+from covid.adapters.repository import (
+    AbstractRepository, ArticlePage, DatePage, PageVersion, RepositoryCache, SearchPage, TimelineBounds,
+    ARTICLE_FIELDS, ARTICLE_DETAIL, ARTICLE_SUMMARY, ARTICLES, TAGS
+)
+from covid.adapters.search import query_tokens, FIRST_PARA_WEIGHT, TITLE_WEIGHT
 
 
-tags = None
+logger = logging.getLogger(__name__)
+
+# Number of CSV rows inserted, and committed, at a time by populate.
+DEFAULT_BATCH_SIZE = 10000
+
+# Number of bytes, leading up to where ingestion of a CSV file stopped, that are checked for changes before resuming.
+CHECKSUM_BYTES = 4096
+
+# Connection pools for a file-based database, by name. 'null' opens a connection per session, 'queue' keeps up to
+# pool_size connections open for reuse, and 'singleton' keeps one per thread.
+POOL_CLASSES = {'null': NullPool, 'queue': QueuePool, 'singleton': SingletonThreadPool}
+
+# Scopes of the rows in the generations table. Rows that aren't for a particular article or tag have id 0.
+REPOSITORY_GENERATION = 'repository'
+ARTICLE_GENERATION = 'article'
+TAG_GENERATION = 'tag'
+ALL_ARTICLES_GENERATION = 'all articles'
+ALL_TAGS_GENERATION = 'all tags'
+
+next_generation = """
+    INSERT INTO generations (scope, id, generation)
+    VALUES ('repository', 0, 1)
+    ON CONFLICT (scope, id) DO UPDATE SET generation = generation + 1"""
+
+select_generation = """
+    SELECT generation FROM generations WHERE scope = 'repository' AND id = 0"""
+
+set_generation = """
+    INSERT INTO generations (scope, id, generation)
+    VALUES (:scope, :id, :generation)
+    ON CONFLICT (scope, id) DO UPDATE SET generation = excluded.generation"""
+
+# Most ids looked up by a single IN (...) clause.
+IN_CHUNK_SIZE = 500
+
+# Rounds of random id draws sample_articles makes (plus one for every IN_CHUNK_SIZE Articles sampled), each looking up at
+# most IN_CHUNK_SIZE ids, before picking the rest of its sample from the list of every id.
+SAMPLE_ROUNDS = 4
+
+# Keys of results cached in a SqlAlchemyRepository's RepositoryCache.
+TIMELINE_BOUNDS = 'timeline bounds'
+ARTICLE_ID_RANGE = 'article id range'
+
+
+def loader_options(profile: str):
+    # Options that load just what a loading profile will touch: each relationship costs one SELECT for all the Articles
+    # queried rather than one per Article (or per Comment), and columns that won't be read aren't selected.
+    if profile == ARTICLE_DETAIL:
+        return [
+            selectinload(Article._comments).joinedload(Comment._user).load_only('_username'),
+            selectinload(Article._tags)
+        ]
+    if profile == ARTICLE_SUMMARY:
+        return [load_only('_date', '_title', '_image_hyperlink')]
+    return []
+
+
+# The attributes of an Article that each loading profile loads.
+PROFILE_ATTRIBUTES = {
+    ARTICLE_FIELDS: {'_id', '_date', '_title', '_first_para', '_hyperlink', '_image_hyperlink'},
+    ARTICLE_DETAIL: {'_id', '_date', '_title', '_first_para', '_hyperlink', '_image_hyperlink', '_comments', '_tags'},
+    ARTICLE_SUMMARY: {'_id', '_date', '_title', '_image_hyperlink'},
+}
 
 
 class SqlAlchemyRepository(AbstractRepository):
 
-    def __init__(self, session):
+    def __init__(self, session, cache: RepositoryCache = None):
         self._session = session
 
+        # Results that outlive the session, shared by the repositories of successive sessions (see
+        # SqlAlchemyUnitOfWork), and the dependencies this session has changed but not yet committed.
+        self.cache = cache if cache is not None else RepositoryCache()
+        self._changed = set()
+
+        # The generations the database was at just before, and just after, the session's uncommitted writes.
+        self._generation_before_writes = None
+        self._generation_after_writes = None
+
+    def _query_articles(self, profile: str):
+        return self._session.query(Article).options(*loader_options(profile))
+
+    def _next_generation(
+            self, articles: Iterable[Article] = (), tag_names: Iterable[str] = (), all_articles: bool = False,
+            all_tags: bool = False
+    ):
+        # Flush first, so that new Articles and Tags have ids. The generation rows are written in the session's
+        # transaction, and so are seen by other sessions (and processes) only once it commits.
+        self._session.flush()
+        self._session.execute(next_generation)
+        generation = self._session.execute(select_generation).scalar()
+
+        # Once the first write has been made, the transaction holds SQLite's write lock, so no other write can come
+        # between the session's.
+        if self._generation_before_writes is None:
+            self._generation_before_writes = generation - 1
+        self._generation_after_writes = generation
+
+        records = [{'scope': ARTICLE_GENERATION, 'id': article.id, 'generation': generation} for article in articles]
+        records.extend(
+            {'scope': TAG_GENERATION, 'id': tag_id, 'generation': generation}
+            for tag_id, in self._session.query(Tag.id).filter(Tag._tag_name.in_(list(tag_names)))
+        )
+        if all_articles:
+            records.append({'scope': ALL_ARTICLES_GENERATION, 'id': 0, 'generation': generation})
+        if all_tags:
+            records.append({'scope': ALL_TAGS_GENERATION, 'id': 0, 'generation': generation})
+        if len(records) > 0:
+            self._session.execute(set_generation, records)
+
+    def get_generation(self) -> int:
+        return self._session.execute(select_generation).scalar() or 0
+
+    def synchronize(self) -> int:
+        # Writes made by other processes, or around the repository, don't drop the cached results they change.
+        generation = self.get_generation()
+        self.cache.synchronize(generation)
+        return generation
+
+    def get_article_generation(self, id: int) -> int:
+        return self._session.execute(
+            'SELECT MAX(generation) FROM generations '
+            'WHERE (scope = :article AND id = :id) OR (scope = :all_articles AND id = 0)',
+            {'article': ARTICLE_GENERATION, 'all_articles': ALL_ARTICLES_GENERATION, 'id': id}
+        ).scalar() or 0
+
+    def get_tag_generation(self, tag_name: str) -> int:
+        return self._session.execute(
+            'SELECT MAX(generation) FROM generations '
+            'WHERE (scope = :tag AND id IN (SELECT id FROM tags WHERE name = :tag_name)) '
+            'OR (scope = :all_tags AND id = 0)',
+            {'tag': TAG_GENERATION, 'all_tags': ALL_TAGS_GENERATION, 'tag_name': tag_name}
+        ).scalar() or 0
+
+    def get_date_version(self, target_date: date) -> PageVersion:
+        articles = orm.articles
+        article_ids = select([articles.c.id]).where(articles.c.date == target_date)
+
+        # Each part is a scalar subquery answered from an index, so no Article is loaded.
+        generation, last_comment_time, previous_date, next_date = self._session.query(
+            self._newest_generation(article_ids),
+            self._newest_comment_time(article_ids),
+            select([func.max(articles.c.date)]).where(articles.c.date < target_date).as_scalar(),
+            select([func.min(articles.c.date)]).where(articles.c.date > target_date).as_scalar()
+        ).one()
+        return PageVersion(generation or 0, last_comment_time, previous_date, next_date)
+
+    def get_tag_version(self, tag_name: str) -> PageVersion:
+        generations = orm.generations
+        tag_ids = select([orm.tags.c.id]).where(orm.tags.c.name == tag_name)
+        article_ids = select([orm.article_tags.c.article_id]).where(orm.article_tags.c.tag_id.in_(tag_ids))
+
+        tag_generation = select([func.max(generations.c.generation)]).where(or_(
+            and_(generations.c.scope == TAG_GENERATION, generations.c.id.in_(tag_ids)),
+            and_(generations.c.scope == ALL_TAGS_GENERATION, generations.c.id == 0)
+        )).as_scalar()
+
+        generation, tag_generation, last_comment_time = self._session.query(
+            self._newest_generation(article_ids), tag_generation, self._newest_comment_time(article_ids)
+        ).one()
+        return PageVersion(max(generation or 0, tag_generation or 0), last_comment_time)
+
+    def _newest_generation(self, article_ids):
+        generations = orm.generations
+        return select([func.max(generations.c.generation)]).where(or_(
+            and_(generations.c.scope == ARTICLE_GENERATION, generations.c.id.in_(article_ids)),
+            and_(generations.c.scope == ALL_ARTICLES_GENERATION, generations.c.id == 0)
+        )).as_scalar()
+
+    def _newest_comment_time(self, article_ids):
+        comments = orm.comments
+        return select([func.max(comments.c.timestamp)]).where(comments.c.article_id.in_(article_ids)).as_scalar()
+
     def add_user(self, user: User):
         self._session.add(user)
+        self._next_generation()
 
     def get_user(self, username) -> User:
         user = None
@@ -36,35 +218,185 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_article(self, article: Article):
         self._session.add(article)
+        self._change(ARTICLES)
+        self._next_generation([article], [tag.tag_name for tag in article.tags])
+
+    def add_articles(self, articles: Iterable[Article]):
+        self._session.add_all(articles)
+        self._change(ARTICLES)
+        self._next_generation(all_articles=True, all_tags=True)
+
+    def _change(self, dependency: str):
+        self.cache.invalidate(dependency)
+        self._changed.add(dependency)
+
+    def changes_committed(self):
+        # Other sessions may have cached results while this session's changes were uncommitted.
+        for dependency in self._changed:
+            self.cache.invalidate(dependency)
+        self._changed.clear()
+
+        if self._generation_before_writes is not None:
+            self.cache.advance(self._generation_before_writes, self._generation_after_writes)
+            self._generation_before_writes = self._generation_after_writes = None
+
+    def detach(self, result):
+        # Instances are expired when their session rolls back or commits, so a result is kept as a pickle of its
+        # loaded state instead.
+        return pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def attach(self, detached):
+        # Merge the unpickled instances into the session without querying; whatever they hadn't loaded then loads on
+        # demand, as usual.
+        result = pickle.loads(detached)
+        if isinstance(result, list):
+            return [self._merge(item) for item in result]
+        if isinstance(result, (ArticlePage, DatePage, SearchPage)):
+            return result._replace(articles=[self._merge(article) for article in result.articles])
+        return self._merge(result)
+
+    def _merge(self, value):
+        if isinstance(value, (User, Article, Comment, Tag)):
+            return self._session.merge(value, load=False)
+        return value
+
+    def _loaded_article(self, id: int, profile: str) -> Article:
+        # Returns the Article if the session has already loaded it, with everything profile would load, and None if not.
+        article = self._session.identity_map.get(identity_key(Article, id))
+        if article is None or not inspect(article).unloaded.isdisjoint(PROFILE_ATTRIBUTES[profile]):
+            return None
+        if profile == ARTICLE_DETAIL and any('_user' in inspect(comment).unloaded for comment in article.comments):
+            return None
+        return article
+
+    def get_article(self, id: int, profile: str = ARTICLE_FIELDS) -> Article:
+        # Within a session, repeated lookups of an Article are answered from the session's identity map.
+        article = self._loaded_article(id, profile)
+        if article is not None:
+            return article
 
-    def get_article(self, id: int) -> Article:
-        article = None
         try:
-            article = self._session.query(Article).filter(Article._id == id).one()
+            article = self._query_articles(profile).filter(Article._id == id).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
 
         return article
 
-    def get_articles_by_date(self, target_date: date) -> List[Article]:
+    def get_articles_by_date(self, target_date: date, profile: str = ARTICLE_FIELDS) -> List[Article]:
         if target_date is None:
-            return self._session.query(Article).all()
+            return self._query_articles(profile).all()
         else:
             # Return articles matching target_date; return an empty list if there are no matches.
-            return self._session.query(Article).filter(Article._date == target_date).all()
+            return self._query_articles(profile).filter(Article._date == target_date).all()
 
-    def get_number_of_articles(self):
-        return self._session.query(Article).count()
+    def get_date_page(self, target_date: date, profile: str = ARTICLE_FIELDS) -> DatePage:
+        # Select the neighbouring dates alongside each of the day's Articles, so that a single query answers all three.
+        previous_date = select([orm.articles.c.date]).where(orm.articles.c.date < target_date) \
+            .order_by(desc(orm.articles.c.date)).limit(1).as_scalar()
+        next_date = select([orm.articles.c.date]).where(orm.articles.c.date > target_date) \
+            .order_by(asc(orm.articles.c.date)).limit(1).as_scalar()
+
+        rows = self._query_articles(profile) \
+            .add_columns(previous_date.label('previous_date'), next_date.label('next_date')) \
+            .filter(Article._date == target_date) \
+            .order_by(asc(Article._id)) \
+            .all()
 
-    def get_first_article(self):
-        return self._session.query(Article).first()
+        if len(rows) == 0:
+            return DatePage([], None, None)
+        return DatePage([row[0] for row in rows], rows[0].previous_date, rows[0].next_date)
 
-    def get_last_article(self):
-        return self._session.query(Article).order_by(desc(Article._id)).first()
+    def get_number_of_articles(self):
+        return self._session.query(Article).count()
 
-    def get_articles_by_id(self, id_list):
-        return self._session.query(Article).filter(Article._id.in_(id_list)).all()
+    def get_first_article(self, profile: str = ARTICLE_FIELDS):
+        return self._query_articles(profile).order_by(asc(Article._date), asc(Article._id)).first()
+
+    def get_last_article(self, profile: str = ARTICLE_FIELDS):
+        return self._query_articles(profile).order_by(desc(Article._date), desc(Article._id)).first()
+
+    def get_timeline_bounds(self) -> TimelineBounds:
+        bounds = self.cache.get(ARTICLES, TIMELINE_BOUNDS)
+
+        if bounds is None:
+            # Separate MIN and MAX subqueries are each answered from one end of the date index.
+            bounds = TimelineBounds(*self._session.query(
+                select([func.min(orm.articles.c.date)]).as_scalar(),
+                select([func.max(orm.articles.c.date)]).as_scalar()
+            ).one())
+
+            if ARTICLES not in self._changed:
+                # Don't share bounds that reflect Articles other sessions can't see yet.
+                self.cache.put(ARTICLES, TIMELINE_BOUNDS, bounds)
+
+        return bounds
+
+    def get_articles_by_id(self, id_list, profile: str = ARTICLE_FIELDS):
+        # Look the ids up a chunk at a time, keeping each statement well within SQLite's limit on bound parameters.
+        id_list = list(id_list)
+        articles = list()
+        for start in range(0, len(id_list), IN_CHUNK_SIZE):
+            chunk = id_list[start:start + IN_CHUNK_SIZE]
+            articles.extend(self._query_articles(profile).filter(Article._id.in_(chunk)).all())
+        return articles
+
+    def sample_articles(self, k: int, profile: str = ARTICLE_FIELDS) -> List[Article]:
+        number_of_articles, first_id, last_id = self._get_article_id_range()
+        k = min(k, number_of_articles)
+        if k <= 0:
+            return list()
+
+        # Draw random ids from the id range and keep those that are Articles' ids (rejection sampling), rather than
+        # sorting the table with ORDER BY RANDOM(). Every draw is as likely to hit one Article as another, however the
+        # ids are spread, and each lookup is a primary key (rowid) search. Draws are made only while the ids are dense
+        # enough for a bounded number of rounds to be expected to find the sample.
+        density = number_of_articles / (last_id - first_id + 1)
+        rounds = SAMPLE_ROUNDS + k // IN_CHUNK_SIZE
+        sampled = list()
+        if k / density <= rounds * IN_CHUNK_SIZE:
+            for _ in range(rounds):
+                if len(sampled) == k:
+                    break
+                picked = set(sampled)
+                draws = min(IN_CHUNK_SIZE, math.ceil(2 * (k - len(sampled)) / density))
+                candidates = [
+                    id for id in dict.fromkeys(random.randint(first_id, last_id) for _ in range(draws))
+                    if id not in picked
+                ]
+                if len(candidates) == 0:
+                    continue
+                found = {id for id, in self._session.query(Article._id).filter(Article._id.in_(candidates))}
+
+                # Keep the hits in the order they were drawn, so that taking the first of them keeps the sample uniform.
+                sampled.extend([id for id in candidates if id in found][:k - len(sampled)])
+
+        if len(sampled) < k:
+            # The ids are too sparse (or too few) for random draws to find the rest in a few rounds, so pick them from
+            # the list of every id instead.
+            picked = set(sampled)
+            remaining = [id for id, in self._session.query(Article._id) if id not in picked]
+            sampled.extend(random.sample(remaining, k - len(sampled)))
+
+        articles = self.get_articles_by_id(list(sampled), profile)
+        random.shuffle(articles)
+        return articles
+
+    def _get_article_id_range(self):
+        # The number of Articles, and their lowest and highest ids. Counting costs a scan, so the result is cached.
+        id_range = self.cache.get(ARTICLES, ARTICLE_ID_RANGE)
+
+        if id_range is None:
+            id_range = tuple(self._session.query(
+                select([func.count()]).select_from(orm.articles).as_scalar(),
+                select([func.min(orm.articles.c.id)]).as_scalar(),
+                select([func.max(orm.articles.c.id)]).as_scalar()
+            ).one())
+
+            if ARTICLES not in self._changed:
+                self.cache.put(ARTICLES, ARTICLE_ID_RANGE, id_range)
+
+        return id_range
 
     def get_article_ids_for_tag(self, tag_name: str):
         # Use native SQL to retrieve article ids, since there is no mapped class for the article_tags table.
@@ -85,6 +417,66 @@ class SqlAlchemyRepository(AbstractRepository):
 
         return article_ids
 
+    def get_articles_for_tag(
+            self, tag_name: str, page_size: int, after: int = None, before: int = None, profile: str = ARTICLE_FIELDS
+    ) -> ArticlePage:
+        query = self._query_articles(profile).join(Article._tags).filter(Tag._tag_name == tag_name)
+
+        # Seek to the page through the (tag_id, article_id) index, rather than skipping the preceding rows.
+        if before is not None:
+            articles = query.filter(Article._id < before).order_by(desc(Article._id)).limit(page_size).all()
+            articles.reverse()
+        else:
+            if after is not None:
+                query = query.filter(Article._id > after)
+            articles = query.order_by(asc(Article._id)).limit(page_size).all()
+
+        total, first_id, last_id = self._session.execute(
+            'SELECT COUNT(*), MIN(article_id), MAX(article_id) FROM article_tags '
+            'WHERE tag_id = (SELECT id FROM tags WHERE name = :tag_name)',
+            {'tag_name': tag_name}
+        ).fetchone()
+        last_cursor = self._session.execute(
+            'SELECT article_id FROM article_tags WHERE tag_id = (SELECT id FROM tags WHERE name = :tag_name) '
+            'ORDER BY article_id DESC LIMIT 1 OFFSET :page_size',
+            {'tag_name': tag_name, 'page_size': page_size}
+        ).scalar()
+
+        return ArticlePage(
+            articles=articles,
+            total=total,
+            previous_cursor=articles[0].id if len(articles) > 0 and articles[0].id > first_id else None,
+            next_cursor=articles[-1].id if len(articles) > 0 and articles[-1].id < last_id else None,
+            last_cursor=last_cursor
+        )
+
+    def search_articles(self, query: str, limit: int, cursor: int = None, profile: str = ARTICLE_FIELDS) -> SearchPage:
+        tokens = query_tokens(query)
+        if len(tokens) == 0:
+            return SearchPage([], 0, None)
+
+        # Quote each token, so that words FTS5 would read as query syntax (AND, NEAR, ...) are matched literally.
+        parameters = {'match': ' '.join(f'"{token}"' for token in tokens), 'limit': limit, 'offset': cursor or 0}
+
+        ranked_ids = [row[0] for row in self._session.execute(
+            f'SELECT rowid FROM articles_search WHERE articles_search MATCH :match '
+            f'ORDER BY bm25(articles_search, {TITLE_WEIGHT}, {FIRST_PARA_WEIGHT}), rowid LIMIT :limit OFFSET :offset',
+            parameters
+        ).fetchall()]
+        total = self._session.execute(
+            'SELECT COUNT(*) FROM articles_search WHERE articles_search MATCH :match', parameters
+        ).scalar()
+
+        # Fetch the page's Articles by primary key, then restore their ranking.
+        articles = {article.id: article for article in self.get_articles_by_id(ranked_ids, profile)}
+        next_cursor = parameters['offset'] + len(ranked_ids)
+
+        return SearchPage(
+            articles=[articles[id] for id in ranked_ids if id in articles],
+            total=total,
+            next_cursor=next_cursor if next_cursor < total else None
+        )
+
     def get_date_of_previous_article(self, article: Article):
         result = None
         prev = self._session.query(Article).filter(Article._date < article.date).order_by(desc(Article._date)).first()
@@ -106,6 +498,8 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_tag(self, tag: Tag):
         self._session.add(tag)
+        self._change(TAGS)
+        self._next_generation(tag_names=[tag.tag_name], all_articles=True)
 
     def get_comments(self):
         return self._session.query(Comment).all()
@@ -113,116 +507,278 @@ class SqlAlchemyRepository(AbstractRepository):
     def add_comment(self, comment: Comment):
         super().add_comment(comment)
         self._session.add(comment)
+        self._next_generation([comment.article])
+
+
+def create_database_engine(
+        database_uri: str, pool: str = 'queue', pool_size: int = 5, max_overflow: int = 10, pragmas: dict = None
+) -> Engine:
+    """ Returns an Engine for a SQLite database, drawing connections from the named pool (see POOL_CLASSES).
+
+    pool_size is how many connections a 'queue' pool keeps open, and max_overflow how many more it opens under load.
+    Each new connection to a file-based database has the given PRAGMAs set on it, such as journal_mode or cache_size.
+    """
+    if database_uri == 'sqlite://':
+        # An in-memory database lasts only as long as its connection, so every session has to share one.
+        return create_engine(database_uri, connect_args={'check_same_thread': False}, poolclass=StaticPool)
+
+    pool_class = POOL_CLASSES[pool]
+    pool_arguments = dict()
+    if pool_class is QueuePool:
+        pool_arguments = dict(pool_size=pool_size, max_overflow=max_overflow)
+    elif pool_class is SingletonThreadPool:
+        pool_arguments = dict(pool_size=pool_size)
+
+    engine = create_engine(
+        database_uri, connect_args={'check_same_thread': False}, poolclass=pool_class, **pool_arguments
+    )
+    if pragmas:
+        set_pragmas_on_connect(engine, pragmas)
+    return engine
+
+
+def set_pragmas_on_connect(engine: Engine, pragmas: dict):
+    """ Sets each PRAGMA in pragmas, a map from name to value, on every connection engine opens from now on. """
+    statements = [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+
+def article_record_generator(rows: Iterable[List[str]]):
+    # Yields an (article record, tag names) pair for each article.
+    for article_data in rows:
+        yield article_data[:6], article_data[6:]
+
+
+class CsvSource:
+    """ The rows of a CSV file, read from a byte position onwards.
+
+    Once every row has been read, position is the end of the file and high_water_mark is the largest id (first column)
+    read so far.
+    """
+
+    def __init__(self, filename: str, position: int = 0, high_water_mark: int = None):
+        self.filename = filename
+        self.position = position
+        self.high_water_mark = high_water_mark
+
+    def __iter__(self):
+        with open(self.filename, 'rb') as infile:
+            infile.seek(self.position)
+            reader = csv.reader(io.TextIOWrapper(infile, newline=''))
+
+            if self.position == 0:
+                # Skip the header line.
+                next(reader, None)
+
+            for row in reader:
+                if len(row) == 0:
+                    # A blank line, such as one left where the rows appended since began.
+                    continue
+
+                # Strip any leading/trailing white space from data read.
+                row = [item.strip() for item in row]
+                self.high_water_mark = max(int(row[0]), self.high_water_mark or 0)
+                yield row
+
+            self.position = infile.tell()
+
+    def checksum(self) -> str:
+        # Digest of the bytes leading up to position, used to tell whether the file has since been rewritten rather
+        # than appended to.
+        with open(self.filename, 'rb') as infile:
+            start = max(0, self.position - CHECKSUM_BYTES)
+            infile.seek(start)
+            return hashlib.sha1(infile.read(self.position - start)).hexdigest()
+
+
+def open_source(cursor, data_path: str, filename: str, incremental: bool) -> CsvSource:
+    source = CsvSource(os.path.join(data_path, filename))
+    if not incremental:
+        return source
+
+    row = cursor.execute(
+        'SELECT position, checksum, high_water_mark FROM ingest_state WHERE source = ?', (filename,)
+    ).fetchone()
+    if row is not None:
+        position, checksum, high_water_mark = row
+        resumed = CsvSource(source.filename, position, high_water_mark)
+        if position <= os.path.getsize(source.filename) and resumed.checksum() == checksum:
+            # The file has only been appended to since it was last ingested: read just the new rows.
+            return resumed
+
+        logger.info('%s has been rewritten since it was last ingested; reading it in full', filename)
+
+    return source
+
+
+def record_source(conn, cursor, filename: str, source: CsvSource):
+    cursor.execute(
+        """
+        INSERT INTO ingest_state (source, position, checksum, high_water_mark)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (source) DO UPDATE SET
+        position = excluded.position, checksum = excluded.checksum, high_water_mark = excluded.high_water_mark""",
+        (filename, source.position, source.checksum(), source.high_water_mark)
+    )
+    conn.commit()
 
 
-def article_record_generator(filename: str):
-    with open(filename) as infile:
-        reader = csv.reader(infile)
-
-        # Read first line of the the CSV file.
-        headers = next(reader)
-
-        # Read remaining rows from the CSV file.
-        for row in reader:
-            article_data = row
-            article_key = article_data[0]
-
-            # Strip any leading/trailing white space from data read.
-            article_data = [item.strip() for item in article_data]
-
-            number_of_tags = len(article_data) - 6
-            article_tags = article_data[-number_of_tags:]
-
-            # Add and new tags; associate the current article with tags.
-            for tag in article_tags:
-                if tag not in tags.keys():
-                    tags[tag] = list()
-                tags[tag].append(article_key)
-
-            del article_data[-number_of_tags:]
-
-            yield article_data
-
-
-def get_tag_records():
-    tag_records = list()
-    tag_key = 0
-
-    for tag in tags.keys():
-        tag_key = tag_key + 1
-        tag_records.append((tag_key, tag))
-    return tag_records
+def batches(records: Iterable, batch_size: int):
+    records = iter(records)
+    batch = list(islice(records, batch_size))
+    while len(batch) > 0:
+        yield batch
+        batch = list(islice(records, batch_size))
 
 
-def article_tags_generator():
-    article_tags_key = 0
-    tag_key = 0
+class IngestProgress(NamedTuple):
+    table: str
+    rows: int
+    seconds: float
 
-    for tag in tags.keys():
-        tag_key = tag_key + 1
-        for article_key in tags[tag]:
-            article_tags_key = article_tags_key + 1
-            yield article_tags_key, article_key, tag_key
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
 
 
-def generic_generator(filename, post_process=None):
-    with open(filename) as infile:
-        reader = csv.reader(infile)
+def ingest(conn, table: str, records: Iterable, insert_batch, batch_size: int, progress=None):
+    # Insert records a batch at a time, committing each batch, so that only one batch is held in memory.
+    start = time.perf_counter()
+    rows = 0
 
-        # Read first line of the CSV file.
-        next(reader)
+    for batch in batches(records, batch_size):
+        insert_batch(batch)
+        conn.commit()
 
-        # Read remaining rows from the CSV file.
-        for row in reader:
-            # Strip any leading/trailing white space from data read.
-            row = [item.strip() for item in row]
+        rows += len(batch)
+        if progress is not None:
+            progress(IngestProgress(table, rows, time.perf_counter() - start))
 
-            if post_process is not None:
-                row = post_process(row)
-            yield row
+    report = IngestProgress(table, rows, time.perf_counter() - start)
+    logger.info('Ingested %d %s in %.3f s (%.0f rows/s)', report.rows, table, report.seconds, report.rows_per_second)
 
 
-def process_user(user_row):
-    user_row[2] = generate_password_hash(user_row[2])
-    return user_row
+def populate(
+        engine: Engine, data_path: str, batch_size: int = DEFAULT_BATCH_SIZE, progress=None, incremental: bool = False
+):
+    """ Streams the CSV files in data_path into the database's tables, batch_size rows at a time.
 
+    By default the tables are expected to be empty. With incremental set, only the rows appended to each file since
+    it was last ingested are read, and they are upserted by id: new rows are inserted, rows with a known id replace
+    the stored ones, and only new tag associations are added. Either way, how far each file has been read (its
+    high-water mark) is recorded in the ingest_state table.
 
-def populate(engine: Engine, data_path: str):
+    If given, progress is called with an IngestProgress after each batch is committed.
+    """
     conn = engine.raw_connection()
     cursor = conn.cursor()
 
-    global tags
-    tags = dict()
+    # The only state kept across batches: the id assigned to each distinct tag name.
+    tag_ids = dict(cursor.execute('SELECT name, id FROM tags').fetchall()) if incremental else dict()
+    next_tag_ids = count(max(tag_ids.values(), default=0) + 1)
 
     insert_articles = """
         INSERT INTO articles (
         id, date, title, first_para, hyperlink, image_hyperlink)
         VALUES (?, ?, ?, ?, ?, ?)"""
-    cursor.executemany(insert_articles, article_record_generator(os.path.join(data_path, 'news_articles.csv')))
 
     insert_tags = """
         INSERT INTO tags (
         id, name)
         VALUES (?, ?)"""
-    cursor.executemany(insert_tags, get_tag_records())
 
     insert_article_tags = """
         INSERT INTO article_tags (
-        id, article_id, tag_id)
-        VALUES (?, ?, ?)"""
-    cursor.executemany(insert_article_tags, article_tags_generator())
+        article_id, tag_id)
+        VALUES (:article_id, :tag_id)"""
+
+    if incremental:
+        insert_articles += """
+        ON CONFLICT (id) DO UPDATE SET
+        date = excluded.date, title = excluded.title, first_para = excluded.first_para,
+        hyperlink = excluded.hyperlink, image_hyperlink = excluded.image_hyperlink"""
+        insert_article_tags = """
+        INSERT INTO article_tags (
+        article_id, tag_id)
+        SELECT :article_id, :tag_id
+        WHERE NOT EXISTS (SELECT 1 FROM article_tags WHERE article_id = :article_id AND tag_id = :tag_id)"""
+
+    def insert_articles_and_tags(batch):
+        tag_records = list()
+        article_tag_records = list()
+
+        for article_record, tag_names in batch:
+            for tag_name in tag_names:
+                tag_id = tag_ids.get(tag_name)
+                if tag_id is None:
+                    # First sighting of the tag.
+                    tag_id = tag_ids[tag_name] = next(next_tag_ids)
+                    tag_records.append((tag_id, tag_name))
+                article_tag_records.append({'article_id': article_record[0], 'tag_id': tag_id})
+
+        cursor.executemany(insert_articles, [article_record for article_record, _ in batch])
+        cursor.executemany(insert_tags, tag_records)
+        cursor.executemany(insert_article_tags, article_tag_records)
+
+    source = open_source(cursor, data_path, 'news_articles.csv', incremental)
+    ingest(conn, 'articles', article_record_generator(source), insert_articles_and_tags, batch_size, progress)
+    record_source(conn, cursor, 'news_articles.csv', source)
 
     insert_users = """
         INSERT INTO users (
         id, username, password)
         VALUES (?, ?, ?)"""
-    cursor.executemany(insert_users, generic_generator(os.path.join(data_path, 'users.csv'), process_user))
+
+    if incremental:
+        insert_users += """
+        ON CONFLICT (id) DO UPDATE SET
+        username = excluded.username, password = excluded.password"""
+
+    def insert_user_batch(batch):
+        # Credential files may hold plaintext passwords or already-hashed ones; only the plaintext ones are hashed.
+        passwords = hasher.hash(
+            [user_record[2] for user_record in batch], [is_hashed(user_record) for user_record in batch]
+        )
+        cursor.executemany(
+            insert_users, [user_record[:2] + [password] for user_record, password in zip(batch, passwords)]
+        )
+
+    # Every batch hashes its passwords in the same pool of worker processes.
+    source = open_source(cursor, data_path, 'users.csv', incremental)
+    with PasswordHasher() as hasher:
+        ingest(conn, 'users', source, insert_user_batch, batch_size, progress)
+    record_source(conn, cursor, 'users.csv', source)
 
     insert_comments = """
         INSERT INTO comments (
         id, user_id, article_id, comment, timestamp)
         VALUES (?, ?, ?, ?, ?)"""
-    cursor.executemany(insert_comments, generic_generator(os.path.join(data_path, 'comments.csv')))
 
+    if incremental:
+        insert_comments += """
+        ON CONFLICT (id) DO UPDATE SET
+        user_id = excluded.user_id, article_id = excluded.article_id, comment = excluded.comment,
+        timestamp = excluded.timestamp"""
+
+    source = open_source(cursor, data_path, 'comments.csv', incremental)
+    ingest(
+        conn, 'comments', source, lambda batch: cursor.executemany(insert_comments, batch), batch_size, progress
+    )
+    record_source(conn, cursor, 'comments.csv', source)
+
+    # Whatever was ingested may have changed any article or tag.
+    cursor.execute(next_generation)
+    generation = cursor.execute(select_generation).fetchone()[0]
+    cursor.executemany(set_generation, [
+        {'scope': ALL_ARTICLES_GENERATION, 'id': 0, 'generation': generation},
+        {'scope': ALL_TAGS_GENERATION, 'id': 0, 'generation': generation}
+    ])
     conn.commit()
+
     conn.close()
@@ -1,37 +1,195 @@
 import csv
+import gc
 import os
+import pickle
+import random
+import struct
 from datetime import date, datetime
-from typing import List
+from typing import Iterable, List
 
-from bisect import bisect, bisect_left, insort_left
+from bisect import bisect_left, bisect_right, insort_left
+from operator import attrgetter
 
-from werkzeug.security import generate_password_hash
+from covid.adapters.credentials import hash_passwords, is_hashed
+from covid.adapters.repository import (
+    AbstractRepository, ArticlePage, DatePage, PageVersion, RepositoryCache, RepositoryException, SearchPage,
+    TimelineBounds, ARTICLE_FIELDS, ARTICLES, TAGS
+)
+from covid.adapters.search import SearchIndex
+from covid.domain.model import (
+    Article, Tag, User, Comment, CompactArticle, CompactTag, CompactUser, CompactComment, make_tag_association
+)
 
-from covid.adapters.repository import AbstractRepository, RepositoryException
-from covid.domain.model import Article, Tag, User, Comment, make_tag_association, make_comment
+
+# Snapshot files start with SNAPSHOT_MAGIC, followed by SNAPSHOT_VERSION packed as an unsigned 32-bit integer. Bump the
+# version whenever the layout of the pickled records changes, so that older snapshots are rebuilt from the CSV files.
+SNAPSHOT_MAGIC = b'COVID-19 repository snapshot\n'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<I')
+
+
+class SnapshotException(Exception):
+    pass
 
 
 class MemoryRepository(AbstractRepository):
-    # Articles ordered by date, not id. id is assumed unique.
+    # Articles ordered by date, then id. id is assumed unique.
+    # Articles are held with their Comments and Tags in place, so loading profiles make no difference.
 
     def __init__(self):
-        self._articles = list()
+        # Results derived from the repository's contents, such as the sidebar; see InMemoryUnitOfWork.
+        self.cache = RepositoryCache()
+
         self._articles_index = dict()
+        self._article_ids = list()
+        self._articles_by_date = dict()
+        self._dates = list()
         self._tags = list()
-        self._users = list()
+        self._tags_index = dict()
+        self._tag_article_ids = dict()
+        self._users = dict()
         self._comments = list()
 
+        # Built by the first search, so that repositories that are never searched don't hold an index.
+        self._search_index = None
+
+        # The repository's generation, and the generation of the write that last changed each Article and Tag. Writes
+        # that change every Article (or Tag) record their generation once, rather than against each of them.
+        self._generation = 0
+        self._article_generations = dict()
+        self._tag_generations = dict()
+        self._all_articles_generation = 0
+        self._all_tags_generation = 0
+
+        # Timestamp of the newest Comment on each commented Article.
+        self._last_comment_times = dict()
+
+    def _next_generation(
+            self, articles: Iterable[Article] = (), tag_names: Iterable[str] = (), all_articles: bool = False,
+            all_tags: bool = False
+    ):
+        self._generation += 1
+        for article in articles:
+            self._article_generations[article.id] = self._generation
+        for tag_name in tag_names:
+            self._tag_generations[tag_name] = self._generation
+        if all_articles:
+            self._all_articles_generation = self._generation
+        if all_tags:
+            self._all_tags_generation = self._generation
+
+    def get_generation(self) -> int:
+        return self._generation
+
+    def get_article_generation(self, id: int) -> int:
+        return max(self._article_generations.get(id, 0), self._all_articles_generation)
+
+    def get_tag_generation(self, tag_name: str) -> int:
+        return max(self._tag_generations.get(tag_name, 0), self._all_tags_generation)
+
+    def get_date_version(self, target_date: date) -> PageVersion:
+        page = self.get_date_page(target_date)
+        article_ids = [article.id for article in page.articles]
+        return self._version(article_ids, self._all_articles_generation, page.previous_date, page.next_date)
+
+    def get_tag_version(self, tag_name: str) -> PageVersion:
+        return self._version(self._sorted_article_ids(tag_name), self.get_tag_generation(tag_name))
+
+    def _version(self, article_ids, generation: int, previous_date: date = None, next_date: date = None):
+        comment_times = [self._last_comment_times[id] for id in article_ids if id in self._last_comment_times]
+        return PageVersion(
+            max([generation] + [self.get_article_generation(id) for id in article_ids]),
+            max(comment_times, default=None),
+            previous_date,
+            next_date
+        )
+
     def add_user(self, user: User):
-        self._users.append(user)
+        # Users are keyed by username, so lookups don't have to scan every registered User.
+        self._users[user.username] = user
+        self._next_generation()
 
     def get_user(self, username) -> User:
-        return next((user for user in self._users if user.username == username), None)
+        return self._users.get(username)
+
+    def _remove_from_date_bucket(self, article: Article):
+        # Takes an Article that's being replaced out of its date bucket, dropping the bucket if that empties it.
+        articles_for_date = self._articles_by_date[article.date]
+        articles_for_date[:] = [other for other in articles_for_date if other is not article]
+        if len(articles_for_date) == 0:
+            del self._articles_by_date[article.date]
+            index = bisect_left(self._dates, article.date)
+            if index < len(self._dates) and self._dates[index] == article.date:
+                del self._dates[index]
 
     def add_article(self, article: Article):
-        insort_left(self._articles, article)
+        self.cache.invalidate(ARTICLES)
+        stored = self._articles_index.get(article.id)
+        if stored is None:
+            self._article_ids.append(article.id)
+            if self._search_index is not None:
+                self._search_index.add(article.id, article.title, article.first_para)
+        else:
+            # An Article with a known id replaces the stored one. The stored one's text stays in the search index, so the
+            # index is built again by the next search.
+            self._remove_from_date_bucket(stored)
+            self._search_index = None
         self._articles_index[article.id] = article
 
-    def get_article(self, id: int) -> Article:
+        # Bucket the Article by date, maintaining the sorted list of distinct dates used for navigation.
+        articles_for_date = self._articles_by_date.get(article.date)
+        if articles_for_date is None:
+            articles_for_date = self._articles_by_date[article.date] = list()
+            insort_left(self._dates, article.date)
+        articles_for_date.append(article)
+
+        # Keep the date's Articles ordered by id; Articles normally arrive in id order, so this rarely sorts.
+        if len(articles_for_date) > 1 and articles_for_date[-2].id > article.id:
+            articles_for_date.sort(key=attrgetter('id'))
+
+        self._next_generation([article], [tag.tag_name for tag in article.tags])
+
+    def add_articles(self, articles: Iterable[Article]):
+        # Append every Article to its date bucket, then sort each bucket and the distinct dates once, rather than
+        # paying for an ordered insert per Article.
+        self.cache.invalidate(ARTICLES)
+        for article in articles:
+            stored = self._articles_index.get(article.id)
+            if stored is None:
+                self._article_ids.append(article.id)
+                if self._search_index is not None:
+                    self._search_index.add(article.id, article.title, article.first_para)
+            else:
+                self._remove_from_date_bucket(stored)
+                self._search_index = None
+            self._articles_index[article.id] = article
+            articles_for_date = self._articles_by_date.get(article.date)
+            if articles_for_date is None:
+                articles_for_date = self._articles_by_date[article.date] = list()
+            articles_for_date.append(article)
+
+        for articles_for_date in self._articles_by_date.values():
+            articles_for_date.sort(key=attrgetter('id'))
+        self._dates = sorted(self._articles_by_date.keys())
+        self._next_generation(all_articles=True, all_tags=True)
+
+    def add_article_rows(self, rows: Iterable[tuple]):
+        """ Adds Articles in bulk from (id, date, title, first_para, hyperlink, image_hyperlink) rows. """
+        self.add_articles(
+            CompactArticle(article_date, title, first_para, hyperlink, image_hyperlink, id)
+            for id, article_date, title, first_para, hyperlink, image_hyperlink in rows
+        )
+
+    def article_rows(self) -> Iterable[tuple]:
+        """ Yields an (id, date, title, first_para, hyperlink, image_hyperlink) row per Article, by date then id. """
+        for articles_for_date in (self._articles_by_date[article_date] for article_date in self._dates):
+            for article in articles_for_date:
+                yield (
+                    article.id, article.date, article.title, article.first_para, article.hyperlink,
+                    article.image_hyperlink
+                )
+
+    def get_article(self, id: int, profile: str = ARTICLE_FIELDS) -> Article:
         article = None
 
         try:
@@ -41,47 +199,46 @@ class MemoryRepository(AbstractRepository):
 
         return article
 
-    def get_articles_by_date(self, target_date: date) -> List[Article]:
-        target_article = Article(
-            date=target_date,
-            title=None,
-            first_para=None,
-            hyperlink=None,
-            image_hyperlink=None
+    def get_articles_by_date(self, target_date: date, profile: str = ARTICLE_FIELDS) -> List[Article]:
+        # Return a copy of the date's bucket; if there are no Articles for the date, simply return an empty list.
+        return list(self._articles_by_date.get(target_date, ()))
+
+    def get_date_page(self, target_date: date, profile: str = ARTICLE_FIELDS) -> DatePage:
+        articles = self.get_articles_by_date(target_date)
+        if len(articles) == 0:
+            return DatePage(articles, None, None)
+
+        # target_date is one of the sorted distinct dates, so its neighbours are either side of it.
+        index = bisect_left(self._dates, target_date)
+        return DatePage(
+            articles,
+            self._dates[index - 1] if index > 0 else None,
+            self._dates[index + 1] if index + 1 < len(self._dates) else None
         )
-        matching_articles = list()
-
-        try:
-            index = self.article_index(target_article)
-            for article in self._articles[index:None]:
-                if article.date == target_date:
-                    matching_articles.append(article)
-                else:
-                    break
-        except ValueError:
-            # No articles for specified date. Simply return an empty list.
-            pass
-
-        return matching_articles
 
     def get_number_of_articles(self):
-        return len(self._articles)
+        return len(self._articles_index)
 
-    def get_first_article(self):
+    def get_first_article(self, profile: str = ARTICLE_FIELDS):
         article = None
 
-        if len(self._articles) > 0:
-            article = self._articles[0]
+        if len(self._dates) > 0:
+            article = self._articles_by_date[self._dates[0]][0]
         return article
 
-    def get_last_article(self):
+    def get_last_article(self, profile: str = ARTICLE_FIELDS):
         article = None
 
-        if len(self._articles) > 0:
-            article = self._articles[-1]
+        if len(self._dates) > 0:
+            article = self._articles_by_date[self._dates[-1]][-1]
         return article
 
-    def get_articles_by_id(self, id_list):
+    def get_timeline_bounds(self) -> TimelineBounds:
+        if len(self._dates) == 0:
+            return TimelineBounds(None, None)
+        return TimelineBounds(self._dates[0], self._dates[-1])
+
+    def get_articles_by_id(self, id_list, profile: str = ARTICLE_FIELDS):
         # Strip out any ids in id_list that don't represent Article ids in the repository.
         existing_ids = [id for id in id_list if id in self._articles_index]
 
@@ -89,69 +246,119 @@ class MemoryRepository(AbstractRepository):
         articles = [self._articles_index[id] for id in existing_ids]
         return articles
 
+    def sample_articles(self, k: int, profile: str = ARTICLE_FIELDS) -> List[Article]:
+        # Sample positions in the array of ids, so the cost depends on k rather than on the number of Articles.
+        return [self._articles_index[id] for id in random.sample(self._article_ids, min(k, len(self._article_ids)))]
+
     def get_article_ids_for_tag(self, tag_name: str):
-        # Linear search, to find the first occurrence of a Tag with the name tag_name.
-        tag = next((tag for tag in self._tags if tag.tag_name == tag_name), None)
+        # Return a copy, so that callers can't disturb the Tag's sorted ids.
+        return list(self._sorted_article_ids(tag_name))
 
-        # Retrieve the ids of articles associated with the Tag.
-        if tag is not None:
-            article_ids = [article.id for article in tag.tagged_articles]
-        else:
+    def _sorted_article_ids(self, tag_name: str):
+        # Returns the presorted ids of articles associated with the Tag, as held by the repository.
+        tag = self._tags_index.get(tag_name)
+
+        if tag is None:
             # No Tag with name tag_name, so return an empty list.
-            article_ids = list()
+            return list()
+
+        # Tag associations are append-only, so any articles tagged since the ids were last cached are at the end of
+        # tagged_articles.
+        article_ids = self._tag_article_ids[tag_name]
+        for article in tag.tagged_articles[len(article_ids):]:
+            insort_left(article_ids, article.id)
 
         return article_ids
 
+    def get_articles_for_tag(
+            self, tag_name: str, page_size: int, after: int = None, before: int = None, profile: str = ARTICLE_FIELDS
+    ) -> ArticlePage:
+        article_ids = self._sorted_article_ids(tag_name)
+
+        # Locate the page within the Tag's sorted article ids.
+        if before is not None:
+            stop = bisect_left(article_ids, before)
+            start = max(0, stop - page_size)
+        else:
+            start = bisect_right(article_ids, after) if after is not None else 0
+            stop = start + page_size
+        page_ids = article_ids[start:stop]
+
+        return ArticlePage(
+            articles=self.get_articles_by_id(page_ids),
+            total=len(article_ids),
+            previous_cursor=page_ids[0] if start > 0 and len(page_ids) > 0 else None,
+            next_cursor=page_ids[-1] if stop < len(article_ids) and len(page_ids) > 0 else None,
+            last_cursor=article_ids[-page_size - 1] if len(article_ids) > page_size else None
+        )
+
+    def search_articles(self, query: str, limit: int, cursor: int = None, profile: str = ARTICLE_FIELDS) -> SearchPage:
+        start = cursor or 0
+        ranked_ids, total = self._get_search_index().search(query, start + limit)
+        page_ids = ranked_ids[start:]
+
+        return SearchPage(
+            articles=self.get_articles_by_id(page_ids),
+            total=total,
+            next_cursor=start + len(page_ids) if start + len(page_ids) < total else None
+        )
+
+    def _get_search_index(self) -> SearchIndex:
+        if self._search_index is None:
+            search_index = SearchIndex()
+            for id, _, title, first_para, _, _ in self.article_rows():
+                search_index.add(id, title, first_para)
+            self._search_index = search_index
+        return self._search_index
+
     def get_date_of_previous_article(self, article: Article):
         previous_date = None
 
-        try:
-            index = self.article_index(article)
-            for stored_article in reversed(self._articles[0:index]):
-                if stored_article.date < article.date:
-                    previous_date = stored_article.date
-                    break
-        except ValueError:
-            # No earlier articles, so return None.
-            pass
+        # The date immediately preceding article's date in the sorted list of distinct dates, if any.
+        index = bisect_left(self._dates, article.date)
+        if index > 0:
+            previous_date = self._dates[index - 1]
 
         return previous_date
 
     def get_date_of_next_article(self, article: Article):
         next_date = None
 
-        try:
-            index = self.article_index(article)
-            for stored_article in self._articles[index + 1:len(self._articles)]:
-                if stored_article.date > article.date:
-                    next_date = stored_article.date
-                    break
-        except ValueError:
-            # No subsequent articles, so return None.
-            pass
+        # The date immediately following article's date in the sorted list of distinct dates, if any.
+        index = bisect_right(self._dates, article.date)
+        if index < len(self._dates):
+            next_date = self._dates[index]
 
         return next_date
 
     def add_tag(self, tag: Tag):
+        self.cache.invalidate(TAGS)
         self._tags.append(tag)
+        self._tags_index[tag.tag_name] = tag
+        self._tag_article_ids[tag.tag_name] = sorted(article.id for article in tag.tagged_articles)
+        self._next_generation(tag_names=[tag.tag_name], all_articles=True)
+
+    def add_tag_for_article_ids(self, tag_name: str, article_ids: Iterable[int]):
+        """ Adds a new Tag, applied to the Articles whose ids are given. """
+        tag = CompactTag(tag_name)
+        for article in self.get_articles_by_id(article_ids):
+            make_tag_association(article, tag)
+        self.add_tag(tag)
 
     def get_tags(self) -> List[Tag]:
-        print('In memory repo, getting tags!')
-        return self._tags
+        return list(self._tags)
 
     def add_comment(self, comment: Comment):
         super().add_comment(comment)
         self._comments.append(comment)
+        self._next_generation([comment.article])
 
-    def get_comments(self):
-        return self._comments
+        last_comment_time = self._last_comment_times.get(comment.article.id)
+        if last_comment_time is None or comment.timestamp > last_comment_time:
+            self._last_comment_times[comment.article.id] = comment.timestamp
 
-    # Helper method to return article index.
-    def article_index(self, article: Article):
-        index = bisect_left(self._articles, article)
-        if index != len(self._articles) and self._articles[index].date == article.date:
-            return index
-        raise ValueError
+    def get_comments(self):
+        return list(self._comments)
 
 
 def read_csv_file(filename: str):
@@ -168,9 +375,7 @@ def read_csv_file(filename: str):
             yield row
 
 
-def load_articles_and_tags(data_path: str, repo: MemoryRepository):
-    tags = dict()
-
+def read_article_rows(data_path: str, tags: dict):
     for data_row in read_csv_file(os.path.join(data_path, 'news_articles.csv')):
 
         article_key = int(data_row[0])
@@ -183,52 +388,56 @@ def load_articles_and_tags(data_path: str, repo: MemoryRepository):
                 tags[tag] = list()
             tags[tag].append(article_key)
 
-        del data_row[-number_of_tags:]
+        # Article row: id, date, title, first_para, hyperlink, image_hyperlink.
+        yield article_key, date.fromisoformat(data_row[1]), data_row[2], data_row[3], data_row[4], data_row[5]
 
-        # Create Article object.
-        article = Article(
-            date=date.fromisoformat(data_row[1]),
-            title=data_row[2],
-            first_para=data_row[3],
-            hyperlink=data_row[4],
-            image_hyperlink=data_row[5],
-            id=article_key
-        )
 
-        # Add the Article to the repository.
-        repo.add_article(article)
+def load_articles_and_tags(data_path: str, repo: MemoryRepository):
+    tags = dict()
 
-    # Create Tag objects, associate them with Articles and add them to the repository.
-    for tag_name in tags.keys():
-        tag = Tag(tag_name)
-        for article_id in tags[tag_name]:
-            article = repo.get_article(article_id)
-            make_tag_association(article, tag)
-        repo.add_tag(tag)
+    # Add the Articles to the repository in bulk.
+    repo.add_article_rows(read_article_rows(data_path, tags))
+
+    # Create Tags, associate them with Articles and add them to the repository.
+    for tag_name, article_ids in tags.items():
+        repo.add_tag_for_article_ids(tag_name, article_ids)
 
 
 def load_users(data_path: str, repo: MemoryRepository):
     users = dict()
 
-    for data_row in read_csv_file(os.path.join(data_path, 'users.csv')):
-        user = User(
+    # Credential files may hold plaintext passwords or already-hashed ones; only the plaintext ones are hashed.
+    data_rows = list(read_csv_file(os.path.join(data_path, 'users.csv')))
+    passwords = hash_passwords(
+        [data_row[2] for data_row in data_rows], hashed=[is_hashed(data_row) for data_row in data_rows]
+    )
+
+    for data_row, password in zip(data_rows, passwords):
+        user = CompactUser(
             username=data_row[1],
-            password=generate_password_hash(data_row[2])
+            password=password
         )
         repo.add_user(user)
         users[data_row[0]] = user
     return users
 
 
+def load_comment(repo: MemoryRepository, user: User, article: Article, comment_text: str, timestamp: datetime):
+    comment = CompactComment(user, article, comment_text, timestamp)
+    user.add_comment(comment)
+    article.add_comment(comment)
+    repo.add_comment(comment)
+
+
 def load_comments(data_path: str, repo: MemoryRepository, users):
     for data_row in read_csv_file(os.path.join(data_path, 'comments.csv')):
-        comment = make_comment(
-            comment_text=data_row[3],
+        load_comment(
+            repo,
             user=users[data_row[1]],
             article=repo.get_article(int(data_row[2])),
+            comment_text=data_row[3],
             timestamp=datetime.fromisoformat(data_row[4])
         )
-        repo.add_comment(comment)
 
 
 def populate(data_path: str, repo: MemoryRepository):
@@ -240,3 +449,84 @@ def populate(data_path: str, repo: MemoryRepository):
 
     # Load comments into the repository.
     load_comments(data_path, repo, users)
+
+
+# =======================================
+# Functions to save and load a snapshot
+# =======================================
+
+def save_snapshot(filename: str, repo: MemoryRepository):
+    # Flatten the repository's object graph into records, so that loading needs neither CSV parsing nor password
+    # hashing, and pickling never has to recurse through the links between Articles, Tags, Comments and Users.
+    records = {
+        'articles': [
+            (id, article_date.toordinal(), title, first_para, hyperlink, image_hyperlink)
+            for id, article_date, title, first_para, hyperlink, image_hyperlink in repo.article_rows()
+        ],
+        'tags': [(tag.tag_name, list(repo._sorted_article_ids(tag.tag_name))) for tag in repo._tags],
+        'users': [(user.username, user.password) for user in repo._users.values()],
+        'comments': [
+            (comment.user.username, comment.article.id, comment.comment, comment.timestamp)
+            for comment in repo.get_comments()
+        ]
+    }
+
+    # Write to a temporary file first, so that a concurrently starting worker never sees a partial snapshot.
+    temporary_filename = f'{filename}.{os.getpid()}.tmp'
+    with open(temporary_filename, 'wb') as outfile:
+        outfile.write(SNAPSHOT_MAGIC)
+        outfile.write(SNAPSHOT_HEADER.pack(SNAPSHOT_VERSION))
+        pickle.dump(records, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_filename, filename)
+
+
+def read_snapshot_version(infile):
+    if infile.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise SnapshotException(f'{infile.name} is not a repository snapshot')
+    return SNAPSHOT_HEADER.unpack(infile.read(SNAPSHOT_HEADER.size))[0]
+
+
+def load_snapshot(filename: str, repo: MemoryRepository):
+    with open(filename, 'rb') as infile:
+        version = read_snapshot_version(infile)
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotException(f'{filename} is a version {version} snapshot, expected version {SNAPSHOT_VERSION}')
+        records = pickle.load(infile)
+
+    # Every object built below stays alive, so cyclic garbage collection passes would only add work.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        repo.add_article_rows(
+            (id, date.fromordinal(ordinal), title, first_para, hyperlink, image_hyperlink)
+            for id, ordinal, title, first_para, hyperlink, image_hyperlink in records['articles']
+        )
+
+        for tag_name, article_ids in records['tags']:
+            repo.add_tag_for_article_ids(tag_name, article_ids)
+
+        users = dict()
+        for username, password in records['users']:
+            user = CompactUser(username, password)
+            repo.add_user(user)
+            users[username] = user
+
+        for username, article_id, comment_text, timestamp in records['comments']:
+            load_comment(repo, users[username], repo.get_article(article_id), comment_text, timestamp)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def snapshot_is_current(filename: str, data_path: str) -> bool:
+    """ Returns True if filename is a snapshot of the current version that is newer than the CSV files in data_path. """
+    try:
+        with open(filename, 'rb') as infile:
+            if read_snapshot_version(infile) != SNAPSHOT_VERSION:
+                return False
+        snapshot_time = os.path.getmtime(filename)
+    except (OSError, SnapshotException, struct.error):
+        return False
+
+    csv_files = ('news_articles.csv', 'users.csv', 'comments.csv')
+    return all(os.path.getmtime(os.path.join(data_path, csv_file)) < snapshot_time for csv_file in csv_files)
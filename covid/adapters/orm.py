@@ -1,6 +1,8 @@
+import copyreg
+
 from sqlalchemy import (
     Table, MetaData, Column, Integer, String, Date, DateTime,
-    ForeignKey
+    ForeignKey, Index, DDL, event, inspect
 )
 from sqlalchemy.orm import mapper, relationship
 
@@ -47,6 +49,98 @@ article_tags = Table(
     Column('tag_id', ForeignKey('tags.id'))
 )
 
+# Secondary indexes for the columns the repository filters, joins and sorts on.
+Index('articles_date', articles.c.date)
+Index('tags_name', tags.c.name)
+Index('comments_article_id', comments.c.article_id)
+Index('comments_user_id', comments.c.user_id)
+
+# Article ids for a tag, in id order, come straight from the (tag_id, article_id) index. The (article_id, tag_id)
+# index serves an article's tags, and lets incremental ingestion check for a known association.
+Index('article_tags_tag_id_article_id', article_tags.c.tag_id, article_tags.c.article_id)
+Index('article_tags_article_id_tag_id', article_tags.c.article_id, article_tags.c.tag_id)
+
+# Full-text index over the articles' titles and first paragraphs. It's an external content FTS5 table, holding only the
+# index and reading the text itself from articles; triggers keep it in step with every change to articles.
+articles_search_ddl = [
+    """
+    CREATE VIRTUAL TABLE articles_search USING fts5(
+    title, first_para, content='articles', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """
+    CREATE TRIGGER articles_search_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_search (rowid, title, first_para) VALUES (new.id, new.title, new.first_para);
+    END""",
+    """
+    CREATE TRIGGER articles_search_delete AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_search (articles_search, rowid, title, first_para)
+    VALUES ('delete', old.id, old.title, old.first_para);
+    END""",
+    """
+    CREATE TRIGGER articles_search_update AFTER UPDATE ON articles BEGIN
+    INSERT INTO articles_search (articles_search, rowid, title, first_para)
+    VALUES ('delete', old.id, old.title, old.first_para);
+    INSERT INTO articles_search (rowid, title, first_para) VALUES (new.id, new.title, new.first_para);
+    END"""
+]
+
+for statement in articles_search_ddl:
+    event.listen(articles, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(articles, 'before_drop', DDL('DROP TABLE IF EXISTS articles_search').execute_if(dialect='sqlite'))
+
+# How far into each CSV source file ingestion has got, so that a refresh only reads rows appended since.
+ingest_state = Table(
+    'ingest_state', metadata,
+    Column('source', String(255), primary_key=True),
+    Column('position', Integer, nullable=False),
+    Column('checksum', String(64), nullable=False),
+    Column('high_water_mark', Integer)
+)
+
+
+# Generation numbers (see AbstractRepository.get_generation), keyed by scope and id: the repository's own, and for each
+# article and tag, that of the write that last changed it. Writes that change every article, or every tag, record their
+# generation once, in a row of its own.
+generations = Table(
+    'generations', metadata,
+    Column('scope', String(16), primary_key=True),
+    Column('id', Integer, primary_key=True),
+    Column('generation', Integer, nullable=False)
+)
+
+
+def upgrade_schema(engine):
+    """ Creates any tables missing from the database, and any indexes missing from its existing tables.
+
+    A missing full-text index is created and then built from the articles already stored.
+    """
+    metadata.create_all(engine)
+
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(engine)
+
+    if engine.dialect.name == 'sqlite' and 'articles_search' not in inspector.get_table_names():
+        with engine.begin() as connection:
+            for statement in articles_search_ddl:
+                connection.execute(statement)
+            connection.execute("INSERT INTO articles_search (articles_search) VALUES ('rebuild')")
+
+
+def reduce_mapped_instance(instance):
+    # Mapped attributes shadow the domain classes' slots, so a mapped instance pickles just its dict, which holds the
+    # mapped state. Pickling the slots as well would restore each attribute through its instrumentation, marking the
+    # unpickled instance as changed.
+    if '_sa_instance_state' not in instance.__dict__:
+        return object.__reduce_ex__(instance, 2)
+    return copyreg.__newobj__, (type(instance),), instance.__dict__
+
+
+for mapped_class in (model.User, model.Comment, model.Article, model.Tag):
+    copyreg.pickle(mapped_class, reduce_mapped_instance)
+
 
 def map_model_to_tables():
     mapper(model.User, users, properties={
@@ -1,11 +1,94 @@
 import abc
-from typing import List
+from typing import Iterable, List, NamedTuple, Optional
 
 from sqlalchemy import desc, asc
 
 from covid.domain.model import User, Article, Tag, Comment
 
-from datetime import date
+from datetime import date, datetime
+
+
+# Loading profiles for the Article read methods. A profile tells the repository which of the returned Articles'
+# relationships the caller is about to use, so that a repository that loads relationships on demand can instead fetch
+# them up front, in a fixed number of queries.
+ARTICLE_FIELDS = 'fields'   # Only the Articles' own fields.
+ARTICLE_DETAIL = 'detail'   # Also the Articles' Comments (with their Users' names) and Tags (their names only).
+ARTICLE_SUMMARY = 'summary' # Only the Articles' dates, titles and image hyperlinks.
+
+
+class ArticlePage(NamedTuple):
+    articles: List[Article]
+    total: int                      # Number of Articles across all pages.
+    previous_cursor: Optional[int]  # before value for the previous page; None on the first page.
+    next_cursor: Optional[int]      # after value for the next page; None on the last page.
+    last_cursor: Optional[int]      # after value for the last page; None if there's only one page.
+
+
+class DatePage(NamedTuple):
+    articles: List[Article]
+    previous_date: Optional[date]   # Date of the Articles immediately preceding the page's; None if there are none.
+    next_date: Optional[date]       # Date of the Articles immediately following the page's; None if there are none.
+
+
+class SearchPage(NamedTuple):
+    articles: List[Article]         # Ordered from the best match down.
+    total: int                      # Number of Articles matching the query.
+    next_cursor: Optional[int]      # cursor value for the next page; None on the last page.
+
+
+class TimelineBounds(NamedTuple):
+    first_date: Optional[date]      # Date of the first Article; None if the repository is empty.
+    last_date: Optional[date]       # Date of the last Article; None if the repository is empty.
+
+
+class PageVersion(NamedTuple):
+    generation: int                         # Newest generation among the page's Articles (and Tag).
+    last_comment_time: Optional[datetime]   # Timestamp of the newest Comment on the page's Articles; None if none.
+    previous_date: Optional[date] = None    # For a date's page, the dates of the Articles either side of it.
+    next_date: Optional[date] = None
+
+
+# What a cached result can depend on. Adding Articles or Tags to a repository drops the results that depend on them.
+ARTICLES = 'articles'
+TAGS = 'tags'
+
+
+class RepositoryCache:
+    """ Results derived from a repository's Articles or Tags, kept across units of work until those change.
+
+    As with a ResultCache, the results are current at the cache's generation, and synchronizing the cache with a
+    repository whose generation has moved on without it (through writes made by another process, say) drops them all.
+    """
+
+    def __init__(self):
+        self._entries = {ARTICLES: dict(), TAGS: dict()}
+        self.generation = None
+
+    def get(self, dependency: str, key: str):
+        """ Returns the result cached under key, or None if there isn't one. """
+        return self._entries[dependency].get(key)
+
+    def put(self, dependency: str, key: str, value):
+        """ Caches value under key, until the repository's Articles or Tags (as given by dependency) change. """
+        self._entries[dependency][key] = value
+
+    def invalidate(self, dependency: str):
+        """ Drops every result that depends on the repository's Articles or Tags. """
+        self._entries[dependency].clear()
+
+    def synchronize(self, generation: int):
+        """ Drops every result unless the repository is still at the cache's generation, then records generation. """
+        if generation != self.generation:
+            for entries in self._entries.values():
+                entries.clear()
+            self.generation = generation
+
+    def advance(self, from_generation: int, to_generation: int):
+        """ Records that writes whose stale results have been dropped took the repository from from_generation to
+        to_generation, provided the cache was current at from_generation.
+        """
+        if self.generation == from_generation:
+            self.generation = to_generation
 
 
 class RepositoryException(Exception):
@@ -16,6 +99,71 @@ class RepositoryException(Exception):
 
 class AbstractRepository(abc.ABC):
 
+    def detach(self, result):
+        """ Returns a copy of result, as read from the repository, that can be kept beyond the unit of work.
+
+        By default, results are kept as they are.
+        """
+        return result
+
+    def attach(self, detached):
+        """ Returns a result kept by detach, ready to use in the current unit of work. """
+        return detached
+
+    def changes_committed(self):
+        """ Called by the unit of work once the changes made through the repository have been committed. """
+        pass
+
+    @abc.abstractmethod
+    def get_generation(self) -> int:
+        """ Returns the repository's generation: a number that increases with every write.
+
+        A result read at one generation is still current while the generation is unchanged.
+        """
+        raise NotImplementedError
+
+    def synchronize(self) -> int:
+        """ Synchronizes the repository's RepositoryCache with its generation, and returns the generation.
+
+        By default, every write to the repository is made through it and drops the cached results it changes, so the
+        cache is left as it is.
+        """
+        return self.get_generation()
+
+    @abc.abstractmethod
+    def get_article_generation(self, id: int) -> int:
+        """ Returns the generation of the write that last changed the Article with id, or its Comments or Tags.
+
+        Adding the Article changes it too, so a missing Article's generation also tells whether it's still missing.
+        Writes that change many Articles at once, such as adding a Tag, count as changing every Article.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_tag_generation(self, tag_name: str) -> int:
+        """ Returns the generation of the write that last changed the Tag named tag_name, or which Articles it tags.
+
+        As for Articles, writes that change many Tags at once count as changing every Tag.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_date_version(self, target_date: date) -> PageVersion:
+        """ Returns what a page of the Articles published on target_date depends on, without loading the Articles.
+
+        The version is unchanged for as long as those Articles, their Comments and Tags, and the dates either side of
+        target_date are.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_tag_version(self, tag_name: str) -> PageVersion:
+        """ Returns what pages of the Articles tagged by tag_name depend on, without loading the Articles.
+
+        The version is unchanged for as long as the Tag, the Articles it tags, and their Comments and Tags are.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_user(self, user: User):
         """" Adds a User to the repository. """
@@ -35,7 +183,16 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_article(self, id: int) -> Article:
+    def add_articles(self, articles: Iterable[Article]):
+        """ Adds many Articles to the repository.
+
+        This is equivalent to calling add_article for each Article, but lets a repository amortise the cost of
+        keeping its Articles ordered across the whole batch.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_article(self, id: int, profile: str = ARTICLE_FIELDS) -> Article:
         """ Returns Article with id from the repository.
 
         If there is no Article with the given id, this method returns None.
@@ -43,20 +200,30 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_articles_by_date(self, target_date: date) -> List[Article]:
+    def get_articles_by_date(self, target_date: date, profile: str = ARTICLE_FIELDS) -> List[Article]:
         """ Returns a list of Articles that were published on target_date.
 
         If there are no Articles on the given date, this method returns an empty list.
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_date_page(self, target_date: date, profile: str = ARTICLE_FIELDS) -> DatePage:
+        """ Returns the Articles published on target_date, together with the dates of the Articles either side.
+
+        This is equivalent to calling get_articles_by_date, then get_date_of_previous_article and
+        get_date_of_next_article for one of the Articles, but lets a repository answer all three at once. If there are
+        no Articles on target_date, the page is empty and has no previous or next date.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_number_of_articles(self):
         """ Returns the number of Articles in the repository. """
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_first_article(self) -> Article:
+    def get_first_article(self, profile: str = ARTICLE_FIELDS) -> Article:
         """ Returns the first Article, ordered by date, from the repository.
 
         Returns None if the repository is empty.
@@ -64,7 +231,7 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_last_article(self) -> Article:
+    def get_last_article(self, profile: str = ARTICLE_FIELDS) -> Article:
         """ Returns the last Article, ordered by date, from the repository.
 
         Returns None if the repository is empty.
@@ -72,13 +239,30 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_articles_by_id(self, id_list):
+    def get_timeline_bounds(self) -> TimelineBounds:
+        """ Returns the dates of the first and last Articles in the repository.
+
+        The bounds change only when Articles are added, so a repository may answer from a cache.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_articles_by_id(self, id_list, profile: str = ARTICLE_FIELDS):
         """ Returns a list of Articles, whose ids match those in id_list, from the repository.
 
         If there are no matches, this method returns an empty list.
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def sample_articles(self, k: int, profile: str = ARTICLE_FIELDS) -> List[Article]:
+        """ Returns k distinct Articles, chosen uniformly at random from the repository.
+
+        If the repository holds fewer than k Articles, this method returns all of them, in random order. Ids needn't be
+        contiguous.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_article_ids_for_tag(self, tag_name: str):
         """ Returns a list of ids representing Articles that are tagged by tag_name.
@@ -87,6 +271,28 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_articles_for_tag(
+            self, tag_name: str, page_size: int, after: int = None, before: int = None, profile: str = ARTICLE_FIELDS
+    ) -> ArticlePage:
+        """ Returns a page of at most page_size Articles tagged by tag_name, ordered by id.
+
+        The page holds the Articles with the lowest ids above after or, if before is given instead, the Articles with
+        the highest ids below before. With neither, it's the first page. Either way, the page costs the same to
+        retrieve however deep into the tag's Articles it is.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search_articles(self, query: str, limit: int, cursor: int = None, profile: str = ARTICLE_FIELDS) -> SearchPage:
+        """ Returns a page of at most limit Articles whose titles and first paragraphs contain every word in query.
+
+        Articles are ranked by relevance, a match in the title counting for more than one in the first paragraph.
+        cursor is the number of ranked Articles preceding the page; with no cursor, it's the first page. Words are
+        matched whole, ignoring case and diacritics.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_date_of_previous_article(self, article: Article):
         """ Returns the date of an Article that immediately precedes article.
@@ -0,0 +1,133 @@
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from heapq import nsmallest
+from typing import List, Tuple
+
+
+# Both backends rank Articles with BM25 as SQLite's FTS5 computes it, with a title match counting TITLE_WEIGHT times
+# as much as a match in the first paragraph. The weights are whole numbers, so that weighted frequencies are integers.
+TITLE_WEIGHT = 10.0
+FIRST_PARA_WEIGHT = 1.0
+K1 = 1.2
+B = 0.75
+
+# Each posting packs an Article's id (high bits), the token's weighted frequency and the Article's length in tokens
+# into one unsigned 64-bit integer. Frequencies and lengths beyond their bits are clamped.
+FREQUENCY_BITS = 16
+LENGTH_BITS = 16
+MAX_FREQUENCY = (1 << FREQUENCY_BITS) - 1
+MAX_LENGTH = (1 << LENGTH_BITS) - 1
+ID_SHIFT = FREQUENCY_BITS + LENGTH_BITS
+
+
+def pack_posting(id: int, frequency: float, length: int) -> int:
+    return (id << ID_SHIFT) | (min(int(frequency), MAX_FREQUENCY) << LENGTH_BITS) | min(length, MAX_LENGTH)
+
+
+TOKEN = re.compile(r'[^\W_]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """ Returns text's runs of letters and digits, case folded and without diacritics.
+
+    These are the tokens FTS5's unicode61 tokenizer (with remove_diacritics 2) produces, so that a query matches the
+    same Articles whichever backend answers it.
+    """
+    text = text.casefold()
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return TOKEN.findall(text)
+
+
+def query_tokens(query: str) -> List[str]:
+    """ Returns the distinct tokens of a search query, in order. An Article matches when it contains all of them. """
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def idf(number_of_articles: int, number_of_matches: int) -> float:
+    # FTS5 clamps the inverse document frequency of terms found in over half the Articles to a tiny positive value.
+    return max(math.log((number_of_articles - number_of_matches + 0.5) / (number_of_matches + 0.5)), 1e-6)
+
+
+class SearchIndex:
+    """ An inverted index over Articles' titles and first paragraphs.
+
+    Each token maps to a posting list: an array of packed postings (see pack_posting), in id order, for the Articles
+    that contain the token. Articles are appended to the lists as they're added; lists that fall out of id order are
+    sorted by sort_postings, or else before the next search.
+    """
+
+    def __init__(self):
+        self._postings = dict()
+        self._unsorted = set()
+        self._number_of_articles = 0
+        self._total_length = 0
+
+    def add(self, id: int, title: str, first_para: str):
+        """ Indexes an Article's title and first paragraph. Each Article should be added once. """
+        title_tokens = tokenize(title)
+        first_para_tokens = tokenize(first_para)
+        length = len(title_tokens) + len(first_para_tokens)
+
+        frequencies = dict()
+        for token in title_tokens:
+            frequencies[token] = frequencies.get(token, 0.0) + TITLE_WEIGHT
+        for token in first_para_tokens:
+            frequencies[token] = frequencies.get(token, 0.0) + FIRST_PARA_WEIGHT
+
+        for token, frequency in frequencies.items():
+            posting = pack_posting(id, frequency, length)
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array('Q')
+            elif postings[-1] > posting:
+                self._unsorted.add(token)
+            postings.append(posting)
+
+        self._number_of_articles += 1
+        self._total_length += length
+
+    def search(self, query: str, number_of_results: int) -> Tuple[List[int], int]:
+        """ Returns the ids of the best ranked number_of_results Articles matching query, and how many match in all.
+
+        Ties are broken by id.
+        """
+        tokens = query_tokens(query)
+        if len(tokens) == 0 or any(token not in self._postings for token in tokens):
+            return [], 0
+
+        self.sort_postings()
+
+        # Walk the shortest posting list, looking each of its Articles up in the others.
+        postings = sorted((self._postings[token] for token in tokens), key=len)
+        idfs = [idf(self._number_of_articles, len(token_postings)) for token_postings in postings]
+        average_length = self._total_length / self._number_of_articles
+
+        def score(frequency, normalization):
+            return frequency * (K1 + 1) / (frequency + normalization)
+
+        ranked = list()
+        for candidate in postings[0]:
+            id = candidate >> ID_SHIFT
+            normalization = K1 * (1 - B + B * (candidate & MAX_LENGTH) / average_length)
+            total_score = idfs[0] * score((candidate >> LENGTH_BITS) & MAX_FREQUENCY, normalization)
+
+            for token_postings, token_idf in zip(postings[1:], idfs[1:]):
+                position = bisect_left(token_postings, id << ID_SHIFT)
+                if position == len(token_postings) or token_postings[position] >> ID_SHIFT != id:
+                    break
+                frequency = (token_postings[position] >> LENGTH_BITS) & MAX_FREQUENCY
+                total_score += token_idf * score(frequency, normalization)
+            else:
+                ranked.append((-total_score, id))
+
+        return [id for _, id in nsmallest(number_of_results, ranked)], len(ranked)
+
+    def sort_postings(self):
+        """ Restores the id order of posting lists that Articles were added to out of order. """
+        for token in self._unsorted:
+            self._postings[token] = array('Q', sorted(self._postings[token]))
+        self._unsorted.clear()
@@ -3,9 +3,10 @@ import abc
 
 from sqlalchemy.orm import scoped_session
 
-from flask import _app_ctx_stack
+from flask import _app_ctx_stack, g, has_app_context
 
-from covid.adapters.repository import AbstractRepository
+from covid.adapters.repository import AbstractRepository, RepositoryCache, RepositoryException
+from covid.adapters.caching_repository import CachingRepository, ResultCache
 from covid.adapters.memory_repository import MemoryRepository
 from covid.adapters.database_repository import SqlAlchemyRepository
 
@@ -13,15 +14,42 @@ from covid.adapters.database_repository import SqlAlchemyRepository
 uow_instance = None
 
 
+def current_uow() -> AbstractUnitOfWork:
+    """ Returns the unit of work of the request being handled (see AbstractUnitOfWork.for_request), or else
+    uow_instance.
+    """
+    if has_app_context() and 'uow' in g:
+        return g.uow
+    return uow_instance
+
+
 class AbstractUnitOfWork(abc.ABC):
     repo: AbstractRepository
 
+    # Results derived from the repository, kept across units of work until the Articles or Tags they depend on change.
+    cache: RepositoryCache
+
     def __enter__(self) -> AbstractUnitOfWork:
         return self
 
     def __exit__(self, *args):
         self.rollback()
 
+    def read_only(self) -> AbstractUnitOfWork:
+        """ Returns a unit of work for reading from the repository alone.
+
+        It needn't isolate its reads in a transaction of their own, or roll them back afterwards, so may be cheaper to
+        enter and exit than this one. By default, it's this unit of work.
+        """
+        return self
+
+    def for_request(self) -> AbstractUnitOfWork:
+        """ Returns a unit of work for a single request, to be shared by every service call made while handling it.
+
+        It shares this unit of work's caches. By default, it's this unit of work.
+        """
+        return self
+
     @abc.abstractmethod
     def commit(self):
         raise NotImplementedError
@@ -33,36 +61,120 @@ class AbstractUnitOfWork(abc.ABC):
 
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
 
-    def __init__(self, session_factory):
+    def __init__(
+            self, session_factory, results: ResultCache = None, read_session_factory=None, cache: RepositoryCache = None
+    ):
         self.session_factory = session_factory
-        self.session = None
+        self.read_session_factory = read_session_factory
 
-    def __enter__(self):
+        # One session per thread, so that concurrent requests neither share a session nor leak one another's.
         self.session = scoped_session(self.session_factory, scopefunc=_app_ctx_stack.__ident_func__)
-        self.repo = SqlAlchemyRepository(self.session)
+
+        # Shared by the repositories of every session, and by the units of work made for requests.
+        self.cache = cache if cache is not None else RepositoryCache()
+        self.results = results
+
+        # The repository's generation, once the unit of work has synchronized the shared results with it.
+        self.generation = None
+
+        # Reads go through the thread's session, unless there's a factory for sessions on a read-only database.
+        self.read_session = self.session
+        if read_session_factory is not None:
+            self.read_session = scoped_session(read_session_factory, scopefunc=_app_ctx_stack.__ident_func__)
+
+    def __enter__(self):
+        self.repo = SqlAlchemyRepository(self.session, self.cache)
+        if self.results is not None:
+            # Answer repeated reads from the shared results, querying the database only on a miss.
+            self.repo = CachingRepository(self.repo, self.results, self.generation)
         return super().__enter__()
 
     def __exit__(self, *args):
         super().__exit__()
 
+    def read_only(self) -> SqlAlchemyReadOnlyUnitOfWork:
+        # A unit of work of its own for each caller, since entering one replaces its repo.
+        return SqlAlchemyReadOnlyUnitOfWork(self.read_session, self.cache, self.results, self.generation)
+
+    def for_request(self) -> SqlAlchemyUnitOfWork:
+        # The request's session lasts until close_current_session is called, at the end of the request, so Articles
+        # loaded by one service call are still loaded for the next.
+        request_uow = SqlAlchemyUnitOfWork(self.session_factory, self.results, self.read_session_factory, self.cache)
+
+        # Check once per request, rather than once per service call, that no other process has written to the database
+        # since the shared results were cached.
+        with request_uow.read_only() as reader:
+            request_uow.generation = reader.repo.synchronize()
+        return request_uow
+
     def commit(self):
         self.session.commit()
+        self.repo.changes_committed()
+        if self.read_session is not self.session:
+            # Let later reads see what was committed, rather than what the read-only session loaded before.
+            self.read_session.expire_all()
 
     def rollback(self):
         self.session.rollback()
 
     def close_current_session(self):
-        if self.session is not None:
-            self.session.close()
+        self.session.remove()
+        if self.read_session is not self.session:
+            self.read_session.remove()
+
+
+class SqlAlchemyReadOnlyUnitOfWork(AbstractUnitOfWork):
+    """ Reads through a thread's session without managing its transaction.
+
+    The transaction begun by the first read is left open, rather than rolled back, so that every read until the
+    session is closed (at the end of the request) shares it, and Articles already loaded needn't be loaded again.
+    Changes can't be committed.
+    """
+
+    def __init__(
+            self, session: scoped_session, cache: RepositoryCache, results: ResultCache = None, generation: int = None
+    ):
+        self.session = session
+        self.cache = cache
+        self.results = results
+        self.generation = generation
+
+    def __enter__(self):
+        self.repo = SqlAlchemyRepository(self.session, self.cache)
+        if self.results is not None:
+            self.repo = CachingRepository(self.repo, self.results, self.generation)
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def commit(self):
+        raise RepositoryException('A read-only unit of work cannot commit changes')
+
+    def rollback(self):
+        pass
 
 
 class InMemoryUnitOfWork(AbstractUnitOfWork):
 
-    def __init__(self, repo: MemoryRepository):
+    def __init__(self, repo: MemoryRepository, results: ResultCache = None):
         self.repo = repo
+        self.cache = repo.cache
+        self.results = results
         self.committed = False
 
+        self._memory_repo = repo
+
+    def __enter__(self):
+        if self.results is not None:
+            self.repo = CachingRepository(self._memory_repo, self.results)
+        return super().__enter__()
+
+    def for_request(self) -> InMemoryUnitOfWork:
+        return InMemoryUnitOfWork(self._memory_repo, self.results)
+
     def commit(self):
+        self.repo.changes_committed()
         self.committed = True
 
     def rollback(self):
@@ -26,7 +26,7 @@ def register():
         # Successful POST, i.e. the username and password have passed validation checking.
         # Use the service layer to attempt to add the new user.
         try:
-            services.add_user(form.username.data, form.password.data, uow.uow_instance)
+            services.add_user(form.username.data, form.password.data, uow.current_uow())
 
             # All is well, redirect the user to the login page.
             return redirect(url_for('authentication_bp.login'))
@@ -55,10 +55,10 @@ def login():
         # Successful POST, i.e. the username and password have passed validation checking.
         # Use the service layer to lookup the user.
         try:
-            user = services.get_user(form.username.data, uow.uow_instance)
+            user = services.get_user(form.username.data, uow.current_uow())
 
             # Authenticate user.
-            services.authenticate_user(user['username'], form.password.data, uow.uow_instance)
+            services.authenticate_user(user['username'], form.password.data, uow.current_uow())
 
             # Initialise session and redirect the user to the home page.
             session.clear()
@@ -33,8 +33,8 @@ def add_user(username: str, password: str, uow: unit_of_work.AbstractUnitOfWork)
 
 
 def get_user(username: str, uow: unit_of_work.AbstractUnitOfWork):
-    with uow:
-        user = uow.repo.get_user(username)
+    with uow.read_only() as reader:
+        user = reader.repo.get_user(username)
         if user is None:
             raise UnknownUserException
 
@@ -44,8 +44,8 @@ def get_user(username: str, uow: unit_of_work.AbstractUnitOfWork):
 def authenticate_user(username: str, password: str, uow: unit_of_work.AbstractUnitOfWork):
     authenticated = False
 
-    with uow:
-        user = uow.repo.get_user(username)
+    with uow.read_only() as reader:
+        user = reader.repo.get_user(username)
         if user is not None:
             authenticated = check_password_hash(user.password, password)
         if not authenticated:
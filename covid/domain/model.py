@@ -1,7 +1,13 @@
 from datetime import date, datetime
 
 
-class User:
+# Each entity is defined as a compact class that declares __slots__, so instances carry no per-instance __dict__. The
+# memory repository builds its object graph from these. SQLAlchemy's classical mappers store instance state in
+# __dict__, so the public User, Comment, Article and Tag classes are dict-backed subclasses that orm.py can map.
+
+class CompactUser:
+    __slots__ = ('_username', '_password', '_comments', '__weakref__')
+
     def __init__(
             self, username: str, password: str
     ):
@@ -21,14 +27,14 @@ class User:
     def comments(self) -> list:
         return self._comments
 
-    def add_comment(self, comment: 'Comment'):
+    def add_comment(self, comment: 'CompactComment'):
         self._comments.append(comment)
 
     def __repr__(self):
         return f'<User {self._username} {self._password}>'
 
     def __eq__(self, other):
-        if not isinstance(other, User):
+        if not isinstance(other, CompactUser):
             return False
         return other._username == self._username
 
@@ -36,9 +42,15 @@ class User:
         return hash(self._username)
 
 
-class Comment:
+class User(CompactUser):
+    pass
+
+
+class CompactComment:
+    __slots__ = ('_user', '_article', '_comment', '_timestamp', '__weakref__')
+
     def __init__(
-            self, user: User, article: 'Article', comment: str, timestamp: datetime
+            self, user: CompactUser, article: 'CompactArticle', comment: str, timestamp: datetime
     ):
         self._user = user
         self._article = article
@@ -46,11 +58,11 @@ class Comment:
         self._timestamp = timestamp
 
     @property
-    def user(self) -> User:
+    def user(self) -> CompactUser:
         return self._user
 
     @property
-    def article(self) -> 'Article':
+    def article(self) -> 'CompactArticle':
         return self._article
 
     @property
@@ -62,7 +74,7 @@ class Comment:
         return self._timestamp
 
     def __eq__(self, other):
-        if not isinstance(other, Comment):
+        if not isinstance(other, CompactComment):
             return False
         return other._user == self._user and other._article == self._article and other._comment == self._comment and other._timestamp == self._timestamp
 
@@ -70,7 +82,15 @@ class Comment:
         return hash(self._username)
 
 
-class Article:
+class Comment(CompactComment):
+    pass
+
+
+class CompactArticle:
+    __slots__ = (
+        '_id', '_date', '_title', '_first_para', '_hyperlink', '_image_hyperlink', '_comments', '_tags', '__weakref__'
+    )
+
     def __init__(
             self, date: date, title: str, first_para: str, hyperlink: str, image_hyperlink: str, id:int = None
     ):
@@ -115,23 +135,23 @@ class Article:
     def tags(self) -> list:
         return self._tags
 
-    def is_tagged_by(self, tag: 'Tag'):
+    def is_tagged_by(self, tag: 'CompactTag'):
         return tag in self._tags
 
     def is_tagged(self) -> bool:
         return len(self._tags) > 0
 
-    def add_comment(self, comment: Comment):
+    def add_comment(self, comment: CompactComment):
         self._comments.append(comment)
 
-    def add_tag(self, tag: 'Tag'):
+    def add_tag(self, tag: 'CompactTag'):
         self._tags.append(tag)
 
     def __repr__(self):
         return f'<Article {self._date.isoformat()} {self._title}>'
 
     def __eq__(self, other):
-        if not isinstance(other, Article):
+        if not isinstance(other, CompactArticle):
             return False
         return (
                 other._date == self._date and
@@ -148,7 +168,13 @@ class Article:
         return self._date < other._date
 
 
-class Tag:
+class Article(CompactArticle):
+    pass
+
+
+class CompactTag:
+    __slots__ = ('_tag_name', '_tagged_articles', '__weakref__')
+
     def __init__(
             self, tag_name: str
     ):
@@ -163,14 +189,14 @@ class Tag:
     def tagged_articles(self):
         return self._tagged_articles
 
-    def is_applied_to(self, article: Article):
+    def is_applied_to(self, article: CompactArticle):
         return article in self._tagged_articles
 
-    def add_article(self, article: Article):
+    def add_article(self, article: CompactArticle):
         self._tagged_articles.append(article)
 
     def __eq__(self, other):
-        if not isinstance(other, Tag):
+        if not isinstance(other, CompactTag):
             return False
         return other._tag_name == self._tag_name
 
@@ -178,7 +204,11 @@ class Tag:
         return hash(self._tag_name)
 
 
-def make_comment(comment_text: str, user: User, article: Article, timestamp: datetime = datetime.today()):
+class Tag(CompactTag):
+    pass
+
+
+def make_comment(comment_text: str, user: CompactUser, article: CompactArticle, timestamp: datetime = datetime.today()):
     comment = Comment(user, article, comment_text, timestamp)
     user.add_comment(comment)
     article.add_comment(comment)
@@ -186,7 +216,7 @@ def make_comment(comment_text: str, user: User, article: Article, timestamp: dat
     return comment
 
 
-def make_tag_association(article: Article, tag: Tag):
+def make_tag_association(article: CompactArticle, tag: CompactTag):
     article.add_tag(tag)
     tag.add_article(article)
 
@@ -1,7 +1,8 @@
 from datetime import date
+from hashlib import sha1
 
 from flask import Blueprint
-from flask import request, render_template, redirect, url_for, session
+from flask import request, render_template, redirect, url_for, session, make_response
 
 from better_profanity import profanity
 from flask_wtf import FlaskForm
@@ -26,13 +27,12 @@ def articles_by_date():
     target_date = request.args.get('date')
     article_to_show_comments = request.args.get('view_comments_for')
 
-    # Fetch the first and last articles in the series.
-    first_article = services.get_first_article(uow.uow_instance)
-    last_article = services.get_last_article(uow.uow_instance)
+    # Fetch the dates of the first and last articles in the series.
+    first_date, last_date = services.get_timeline_bounds(uow.current_uow())
 
     if target_date is None:
         # No date query parameter, so return articles from day 1 of the series.
-        target_date = first_article['date']
+        target_date = first_date
     else:
         # Convert target_date from string to date.
         target_date = date.fromisoformat(target_date)
@@ -44,9 +44,15 @@ def articles_by_date():
         # Convert article_to_show_comments from string to int.
         article_to_show_comments = int(article_to_show_comments)
 
+    # The page is unchanged while the date's version is, so a client holding its ETag needn't be sent it again.
+    version = services.get_date_version(target_date, uow.current_uow())
+    etag = page_etag(version, first_date, last_date)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag, version)
+
     # Fetch article(s) for the target date. This call also returns the previous and next dates for articles immediately
     # before and after the target date.
-    articles, previous_date, next_date = services.get_articles_by_date(target_date, uow.uow_instance)
+    articles, previous_date, next_date = services.get_articles_by_date(target_date, uow.current_uow())
 
     first_article_url = None
     last_article_url = None
@@ -58,12 +64,12 @@ def articles_by_date():
         if previous_date is not None:
             # There are articles on a previous date, so generate URLs for the 'previous' and 'first' navigation buttons.
             prev_article_url = url_for('news_bp.articles_by_date', date=previous_date.isoformat())
-            first_article_url = url_for('news_bp.articles_by_date', date=first_article['date'].isoformat())
+            first_article_url = url_for('news_bp.articles_by_date', date=first_date.isoformat())
 
         # There are articles on a subsequent date, so generate URLs for the 'next' and 'last' navigation buttons.
         if next_date is not None:
             next_article_url = url_for('news_bp.articles_by_date', date=next_date.isoformat())
-            last_article_url = url_for('news_bp.articles_by_date', date=last_article['date'].isoformat())
+            last_article_url = url_for('news_bp.articles_by_date', date=last_date.isoformat())
 
         # Construct urls for viewing article comments and adding comments.
         for article in articles:
@@ -71,7 +77,7 @@ def articles_by_date():
             article['add_comment_url'] = url_for('news_bp.comment_on_article', article=article['id'])
 
         # Generate the webpage to display the articles.
-        return render_template(
+        response = make_response(render_template(
             'news/articles.html',
             title='Articles',
             articles_title=target_date.strftime('%A %B %e %Y'),
@@ -83,7 +89,8 @@ def articles_by_date():
             prev_article_url=prev_article_url,
             next_article_url=next_article_url,
             show_comments_for_article=article_to_show_comments
-        )
+        ))
+        return with_validators(response, etag, version)
 
     # No articles to show, so return the homepage.
     return redirect(url_for('home_bp.home'))
@@ -95,7 +102,8 @@ def articles_by_tag():
 
     # Read query parameters.
     tag_name = request.args.get('tag')
-    cursor = request.args.get('cursor')
+    after = request.args.get('after')
+    before = request.args.get('before')
     article_to_show_comments = request.args.get('view_comments_for')
 
     if article_to_show_comments is None:
@@ -105,45 +113,48 @@ def articles_by_tag():
         # Convert article_to_show_comments from string to int.
         article_to_show_comments = int(article_to_show_comments)
 
-    if cursor is None:
-        # No cursor query parameter, so initialise cursor to start at the beginning.
-        cursor = 0
-    else:
-        # Convert cursor from string to int.
-        cursor = int(cursor)
-
-    # Retrieve article ids for articles that are tagged with tag_name.
-    article_ids = services.get_article_ids_for_tag(tag_name, uow.uow_instance)
-
-    # Retrieve the batch of articles to display on the Web page.
-    articles = services.get_articles_by_id(article_ids[cursor:cursor + articles_per_page], uow.uow_instance)
+    # The after and before query parameters are article ids: the page holds the articles following after, or preceding
+    # before. With neither, the page holds the first articles.
+    if after is not None:
+        after = int(after)
+    if before is not None:
+        before = int(before)
+
+    # Every page for the tag is unchanged while the tag's version is.
+    version = services.get_tag_version(tag_name, uow.current_uow())
+    etag = page_etag(version)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag, version)
+
+    # Retrieve the batch of articles to display on the Web page, along with the cursors for neighbouring pages.
+    articles, previous_cursor, next_cursor, last_cursor = services.get_articles_for_tag(
+        tag_name, articles_per_page, after, before, uow.current_uow()
+    )
 
     first_article_url = None
     last_article_url = None
     next_article_url = None
     prev_article_url = None
 
-    if cursor > 0:
+    if previous_cursor is not None:
         # There are preceding articles, so generate URLs for the 'previous' and 'first' navigation buttons.
-        prev_article_url = url_for('news_bp.articles_by_tag', tag=tag_name, cursor=cursor - articles_per_page)
+        prev_article_url = url_for('news_bp.articles_by_tag', tag=tag_name, before=previous_cursor)
         first_article_url = url_for('news_bp.articles_by_tag', tag=tag_name)
 
-    if cursor + articles_per_page < len(article_ids):
+    if next_cursor is not None:
         # There are further articles, so generate URLs for the 'next' and 'last' navigation buttons.
-        next_article_url = url_for('news_bp.articles_by_tag', tag=tag_name, cursor=cursor + articles_per_page)
-
-        last_cursor = articles_per_page * int(len(article_ids) / articles_per_page)
-        if len(article_ids) % articles_per_page == 0:
-            last_cursor -= articles_per_page
-        last_article_url = url_for('news_bp.articles_by_tag', tag=tag_name, cursor=last_cursor)
+        next_article_url = url_for('news_bp.articles_by_tag', tag=tag_name, after=next_cursor)
+        last_article_url = url_for('news_bp.articles_by_tag', tag=tag_name, after=last_cursor)
 
     # Construct urls for viewing article comments and adding comments.
     for article in articles:
-        article['view_comment_url'] = url_for('news_bp.articles_by_tag', tag=tag_name, cursor=cursor, view_comments_for=article['id'])
+        article['view_comment_url'] = url_for(
+            'news_bp.articles_by_tag', tag=tag_name, after=after, before=before, view_comments_for=article['id']
+        )
         article['add_comment_url'] = url_for('news_bp.comment_on_article', article=article['id'])
 
     # Generate the webpage to display the articles.
-    return render_template(
+    response = make_response(render_template(
         'news/articles.html',
         title='Articles',
         articles_title='Articles tagged by ' + tag_name,
@@ -155,6 +166,68 @@ def articles_by_tag():
         prev_article_url=prev_article_url,
         next_article_url=next_article_url,
         show_comments_for_article=article_to_show_comments
+    ))
+    return with_validators(response, etag, version)
+
+
+@news_blueprint.route('/search', methods=['GET'])
+def search():
+    articles_per_page = 3
+
+    # Read query parameters.
+    query = request.args.get('q', '')
+    cursor = request.args.get('cursor')
+    article_to_show_comments = request.args.get('view_comments_for')
+
+    if article_to_show_comments is None:
+        # No view-comments query parameter, so set to a non-existent article id.
+        article_to_show_comments = -1
+    else:
+        # Convert article_to_show_comments from string to int.
+        article_to_show_comments = int(article_to_show_comments)
+
+    # The cursor query parameter is the number of better matching articles, shown on earlier pages.
+    cursor = int(cursor) if cursor is not None else 0
+
+    # Retrieve the batch of articles to display on the Web page, along with the cursor for the next page.
+    articles, total, next_cursor = services.search_articles(query, articles_per_page, cursor, uow.current_uow())
+
+    first_article_url = None
+    last_article_url = None
+    next_article_url = None
+    prev_article_url = None
+
+    if cursor > 0:
+        # There are better matching articles, so generate URLs for the 'previous' and 'first' navigation buttons.
+        prev_article_url = url_for('news_bp.search', q=query, cursor=max(0, cursor - articles_per_page))
+        first_article_url = url_for('news_bp.search', q=query)
+
+    if next_cursor is not None:
+        # There are further matching articles, so generate URLs for the 'next' and 'last' navigation buttons.
+        next_article_url = url_for('news_bp.search', q=query, cursor=next_cursor)
+        last_cursor = (total - 1) // articles_per_page * articles_per_page
+        last_article_url = url_for('news_bp.search', q=query, cursor=last_cursor)
+
+    # Construct urls for viewing article comments and adding comments.
+    for article in articles:
+        article['view_comment_url'] = url_for(
+            'news_bp.search', q=query, cursor=cursor, view_comments_for=article['id']
+        )
+        article['add_comment_url'] = url_for('news_bp.comment_on_article', article=article['id'])
+
+    # Generate the webpage to display the articles.
+    return render_template(
+        'news/articles.html',
+        title='Search',
+        articles_title=f'{total} articles matching "{query}"',
+        articles=articles,
+        selected_articles=utilities.get_selected_articles(max(len(articles), 1) * 2),
+        tag_urls=utilities.get_tags_and_urls(),
+        first_article_url=first_article_url,
+        last_article_url=last_article_url,
+        prev_article_url=prev_article_url,
+        next_article_url=next_article_url,
+        show_comments_for_article=article_to_show_comments
     )
 
 
@@ -175,10 +248,10 @@ def comment_on_article():
         article_id = int(form.article_id.data)
 
         # Use the service layer to store the new comment.
-        services.add_comment(article_id, form.comment.data, username, uow.uow_instance)
+        services.add_comment(article_id, form.comment.data, username, uow.current_uow())
 
         # Retrieve the article in dict form.
-        article = services.get_article(article_id, uow.uow_instance)
+        article = services.get_article(article_id, uow.current_uow())
 
         # Cause the web browser to display the page of all articles that have the same date as the commented article,
         # and display all comments, including the new comment.
@@ -198,7 +271,7 @@ def comment_on_article():
 
     # For a GET or an unsuccessful POST, retrieve the article to comment in dict form, and return a Web page that allows
     # the user to enter a comment. The generated Web page includes a form object.
-    article = services.get_article(article_id, uow.uow_instance)
+    article = services.get_article(article_id, uow.current_uow())
     return render_template(
         'news/comment_on_article.html',
         title='Edit article',
@@ -210,6 +283,26 @@ def comment_on_article():
     )
 
 
+def page_etag(*version):
+    """ Returns a strong ETag for the page requested, given the version of the data it's generated from.
+
+    The page also varies with its query parameters and with who's logged in, so both go into the ETag too.
+    """
+    return sha1(repr((request.full_path, session.get('username')) + version).encode()).hexdigest()
+
+
+def with_validators(response, etag, version):
+    # Clients must revalidate the page before reusing it, so new comments show up straight away.
+    response.set_etag(etag)
+    response.last_modified = version.last_comment_time
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag, version):
+    return with_validators(make_response('', 304), etag, version)
+
+
 class ProfanityFree:
     def __init__(self, message=None):
         if not message:
@@ -1,6 +1,7 @@
 from typing import List
 
 from covid.adapters import unit_of_work
+from covid.adapters.repository import ARTICLE_DETAIL
 from covid.domain.model import make_comment, Article, Comment, Tag
 
 
@@ -33,58 +34,84 @@ def add_comment(article_id: int, comment_text: str, username: str, uow: unit_of_
 
 def get_article(article_id: int, uow: unit_of_work.AbstractUnitOfWork):
     article = None
-    with uow:
-        article = uow.repo.get_article(article_id)
+    with uow.read_only() as reader:
+        article = reader.repo.get_article(article_id, ARTICLE_DETAIL)
 
         if article is None:
             raise NonExistentArticleException
 
-    return article_to_dict(article)
+        return article_to_dict(article)
 
 
 def get_first_article(uow: unit_of_work.AbstractUnitOfWork):
     article = None
-    with uow:
-        article = uow.repo.get_first_article()
+    with uow.read_only() as reader:
+        article = reader.repo.get_first_article(ARTICLE_DETAIL)
 
-    return article_to_dict(article)
+        return article_to_dict(article)
 
 
 def get_last_article(uow: unit_of_work.AbstractUnitOfWork):
     article = None
-    with uow:
-        article = uow.repo.get_last_article()
-    return article_to_dict(article)
+    with uow.read_only() as reader:
+        article = reader.repo.get_last_article(ARTICLE_DETAIL)
+
+        return article_to_dict(article)
+
+
+def get_timeline_bounds(uow: unit_of_work.AbstractUnitOfWork):
+    # Returns the dates of the first and last articles (both null if there are no articles)
+    with uow.read_only() as reader:
+        return reader.repo.get_timeline_bounds()
 
 
 def get_articles_by_date(date, uow: unit_of_work.AbstractUnitOfWork):
     # Returns articles for the target date (empty if no matches), the date of the previous article (might be null), the date of the next article (might be null)
-    with uow:
-        articles = uow.repo.get_articles_by_date(target_date=date)
+    with uow.read_only() as reader:
+        page = reader.repo.get_date_page(date, ARTICLE_DETAIL)
+
+        # Convert Articles to dictionary form.
+        return articles_to_dict(page.articles), page.previous_date, page.next_date
 
-        articles_dto = list()
-        prev_date = next_date = None
 
-        if len(articles) > 0:
-            prev_date = uow.repo.get_date_of_previous_article(articles[0])
-            next_date = uow.repo.get_date_of_next_article(articles[0])
+def get_date_version(date, uow: unit_of_work.AbstractUnitOfWork):
+    # Returns the version of the page of articles for the target date, without loading the articles
+    with uow.read_only() as reader:
+        return reader.repo.get_date_version(date)
 
-            # Convert Articles to dictionary form.
-            articles_dto = articles_to_dict(articles)
 
-        return articles_dto, prev_date, next_date
+def get_tag_version(tag_name, uow: unit_of_work.AbstractUnitOfWork):
+    # Returns the version of the pages of articles tagged by tag_name, without loading the articles
+    with uow.read_only() as reader:
+        return reader.repo.get_tag_version(tag_name)
 
 
 def get_article_ids_for_tag(tag_name, uow: unit_of_work.AbstractUnitOfWork):
-    with uow:
-        article_ids = uow.repo.get_article_ids_for_tag(tag_name)
+    with uow.read_only() as reader:
+        article_ids = reader.repo.get_article_ids_for_tag(tag_name)
 
         return article_ids
 
 
+def get_articles_for_tag(tag_name, page_size, after, before, uow: unit_of_work.AbstractUnitOfWork):
+    # Returns a page of articles tagged by tag_name, and the cursors for the previous, next and last pages (each might be null)
+    with uow.read_only() as reader:
+        page = reader.repo.get_articles_for_tag(tag_name, page_size, after, before, ARTICLE_DETAIL)
+
+        return articles_to_dict(page.articles), page.previous_cursor, page.next_cursor, page.last_cursor
+
+
+def search_articles(query, page_size, cursor, uow: unit_of_work.AbstractUnitOfWork):
+    # Returns a page of articles matching query, best match first, the number of matching articles, and the cursor for the next page (might be null)
+    with uow.read_only() as reader:
+        page = reader.repo.search_articles(query, page_size, cursor, ARTICLE_DETAIL)
+
+        return articles_to_dict(page.articles), page.total, page.next_cursor
+
+
 def get_articles_by_id(id_list, uow: unit_of_work.AbstractUnitOfWork):
-    with uow:
-        articles = uow.repo.get_articles_by_id(id_list)
+    with uow.read_only() as reader:
+        articles = reader.repo.get_articles_by_id(id_list, ARTICLE_DETAIL)
 
         # Convert Articles to dictionary form.
         articles_as_dict = articles_to_dict(articles)
@@ -93,8 +120,8 @@ def get_articles_by_id(id_list, uow: unit_of_work.AbstractUnitOfWork):
 
 
 def get_comments_for_article(article_id, uow: unit_of_work.AbstractUnitOfWork):
-    with uow:
-        article = uow.repo.get_article(article_id)
+    with uow.read_only() as reader:
+        article = reader.repo.get_article(article_id)
 
         if article is None:
             raise NonExistentArticleException
@@ -139,9 +166,9 @@ def comments_to_dict(comments: List[Comment]):
 
 
 def tag_to_dict(tag: Tag):
+    # Pages only show a tag's name; its tagged articles are reached through the tag's own page.
     tag_dict = {
-        'name': tag.tag_name,
-        'tagged_articles': [article.id for article in tag.tagged_articles]
+        'name': tag.tag_name
     }
     return tag_dict
 
@@ -1,6 +1,9 @@
+import random
+
 from flask import Blueprint, request, render_template, redirect, url_for, session
 
 import covid.adapters.unit_of_work as uow
+from covid.adapters.repository import ARTICLES, TAGS
 import covid.utilities.services as services
 
 
@@ -9,18 +12,39 @@ utilities_blueprint = Blueprint(
     'utilities_bp', __name__)
 
 
+# Keys of the sidebar data in the unit of work's RepositoryCache.
+TAG_URLS = 'tag urls'
+SELECTED_ARTICLES = 'selected articles'
+
+# Number of random articles kept as candidates for each page's selected articles: twice the six that the tag and
+# search pages show, so that the selection still varies from page to page. Longer date pages show at most this many.
+SELECTED_ARTICLES_POOL_SIZE = 12
+
+
 def get_tags_and_urls():
-    tag_names = services.get_tag_names(uow.uow_instance)
-    tag_urls = dict()
-    for tag_name in tag_names:
-        tag_urls[tag_name] = url_for('news_bp.articles_by_tag', tag=tag_name)
+    # Every page shows the tags, so they're cached until tags are added.
+    request_uow = uow.current_uow()
+    tag_urls = request_uow.cache.get(TAGS, TAG_URLS)
+
+    if tag_urls is None:
+        tag_names = services.get_tag_names(request_uow)
+        tag_urls = dict()
+        for tag_name in tag_names:
+            tag_urls[tag_name] = url_for('news_bp.articles_by_tag', tag=tag_name)
+        request_uow.cache.put(TAGS, TAG_URLS, tag_urls)
 
     return tag_urls
 
 
 def get_selected_articles(quantity=3):
-    articles = services.get_random_articles(quantity, uow.uow_instance)
+    # Pages draw their selection from a pool of random articles, cached until articles are added.
+    request_uow = uow.current_uow()
+    articles = request_uow.cache.get(ARTICLES, SELECTED_ARTICLES)
+
+    if articles is None:
+        articles = services.get_random_articles(SELECTED_ARTICLES_POOL_SIZE, request_uow)
+        for article in articles:
+            article['hyperlink'] = url_for('news_bp.articles_by_date', date=article['date'].isoformat())
+        request_uow.cache.put(ARTICLES, SELECTED_ARTICLES, articles)
 
-    for article in articles:
-        article['hyperlink'] = url_for('news_bp.articles_by_date', date=article['date'].isoformat())
-    return articles
+    return random.sample(articles, min(quantity, len(articles)))
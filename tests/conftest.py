@@ -8,6 +8,7 @@ from covid import create_app
 from covid.adapters import memory_repository, database_repository
 from covid.adapters.orm import metadata, map_model_to_tables
 from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.columnar_repository import ColumnarMemoryRepository
 from covid.adapters.unit_of_work import InMemoryUnitOfWork
 
 
@@ -22,6 +23,13 @@ def in_memory_repo():
     return repo
 
 
+@pytest.fixture
+def in_columnar_repo():
+    repo = ColumnarMemoryRepository()
+    memory_repository.populate(TEST_DATA_PATH, repo)
+    return repo
+
+
 @pytest.fixture
 def in_memory_uow():
     repo = MemoryRepository()
@@ -79,6 +87,20 @@ def client():
     return my_app.test_client()
 
 
+@pytest.fixture
+def caching_client():
+    my_app = create_app({
+        'TESTING': True,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URI,
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'WTF_CSRF_ENABLED': False,
+        'RESULT_CACHE_SIZE': 1000                       # Answer repeated reads from a result cache.
+    })
+
+    return my_app.test_client()
+
+
 class AuthenticationManager:
     def __init__(self, client):
         self._client = client
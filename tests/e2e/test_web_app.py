@@ -1,6 +1,13 @@
+from datetime import datetime
+
 import pytest
 
-from flask import session
+from flask import g, session
+from sqlalchemy import event
+
+import covid.adapters.unit_of_work as uow
+import covid.news.services as services
+from covid.domain.model import Tag
 
 
 def test_register(client):
@@ -142,3 +149,161 @@ def test_articles_with_tag(client):
     assert b'Articles tagged by Health' in response.data
     assert b'Coronavirus: First case of virus in New Zealand' in response.data
     assert b'Covid 19 coronavirus: US deaths double in two days, Trump says quarantine not necessary' in response.data
+
+
+def test_articles_with_tag_are_paginated_by_cursor(client):
+    # Check that the page following article 1 links back to the page preceding article 3, and to the first page.
+    response = client.get('/articles_by_tag?tag=New+Zealand&after=1')
+    assert response.status_code == 200
+    assert b'href=/articles_by_tag?tag=New+Zealand&amp;before=3 class="previous"' in response.data
+    assert b'href=/articles_by_tag?tag=New+Zealand class="first"' in response.data
+
+    # Check that there are no links to further pages from the last page.
+    assert b'/articles_by_tag?tag=New+Zealand&amp;after=' not in response.data
+
+
+def test_search(client):
+    # Check that the best matches for the query come first, with links onwards to the rest.
+    response = client.get('/search?q=coronavirus')
+    assert response.status_code == 200
+    assert b'6 articles matching &#34;coronavirus&#34;' in response.data
+    assert b'Rest homes and retirement villages plead for national aged care response plan' in response.data
+    assert b'href=/search?q=coronavirus&amp;cursor=3 class="next"' in response.data
+    assert b'class="previous"' not in response.data
+
+    response = client.get('/search?q=new+zealand')
+    assert b'1 articles matching &#34;new zealand&#34;' in response.data
+    assert b'Coronavirus: First case of virus in New Zealand' in response.data
+
+
+@pytest.mark.parametrize('url', ['/articles_by_date?date=2020-02-28', '/articles_by_tag?tag=New+Zealand'])
+def test_article_pages_are_revalidated_by_etag(client, auth, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag, _ = response.get_etag()
+    assert response.last_modified == datetime.fromisoformat('2020-02-28 14:39:51')
+
+    # A client holding the current page is told it's unchanged, without the page being generated again.
+    response = client.get(url, headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.get_etag() == (etag, False)
+
+    # Commenting on one of the page's articles changes the page.
+    auth.login()
+    client.post('/comment', data={'comment': 'Who needs quarantine?', 'article_id': 1})
+    auth.logout()
+    response = client.get(url, headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def count_statements(client, url):
+    # Returns the number of SQL statements executed while serving a GET request for url.
+    statements = list()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = uow.uow_instance.session_factory.kw['bind']
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    return len(statements)
+
+
+def test_article_pages_load_in_a_fixed_number_of_statements(client):
+    # Fill the application's caches.
+    client.get('/articles_by_date')
+
+    # One article, one article with two comments, and three articles sharing tags: the number of statements doesn't
+    # depend on how many articles, comments and tags a page shows.
+    counts = {
+        count_statements(client, '/articles_by_date?date=2020-02-29'),
+        count_statements(client, '/articles_by_date?date=2020-02-28&view_comments_for=1'),
+        count_statements(client, '/articles_by_date?date=2020-03-01'),
+    }
+    assert len(counts) == 1
+
+    counts = {
+        count_statements(client, '/articles_by_tag?tag=Politics'),
+        count_statements(client, '/articles_by_tag?tag=World'),
+    }
+    assert len(counts) == 1
+
+
+@pytest.mark.parametrize('url', ['/articles_by_date?date=2020-02-28', '/articles_by_tag?tag=New+Zealand'])
+def test_repeated_article_pages_are_served_from_the_result_cache(caching_client, url):
+    # Served again, the page reads just the database's generation, to check that the cached results are current.
+    caching_client.get(url)
+    hits = uow.uow_instance.results.statistics().hits
+    assert count_statements(caching_client, url) == 1
+    assert uow.uow_instance.results.statistics().hits > hits
+
+    # Commenting on one of the page's articles drops the cached page.
+    caching_client.post('authentication/login', data={'username': 'thorke', 'password': 'cLQ^C#oFXloS'})
+    caching_client.post('/comment', data={'comment': 'Who needs quarantine?', 'article_id': 1})
+    assert b'Who needs quarantine?' in caching_client.get(url + '&view_comments_for=1').data
+
+
+@pytest.mark.parametrize('url', ['/', '/articles_by_date?date=2020-02-28', '/articles_by_tag?tag=Health'])
+def test_pages_are_read_in_a_single_transaction(client, url):
+    transactions = list()
+
+    def capture(session, transaction, connection):
+        transactions.append(transaction)
+
+    session_factory = uow.uow_instance.session_factory
+    event.listen(session_factory, 'after_begin', capture)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(session_factory, 'after_begin', capture)
+
+    assert len(transactions) == 1
+
+
+def test_sidebar_is_cached_until_tags_are_added(client):
+    # Once the sidebar is cached, rendering the home page only reads the database's generation, to check that the
+    # sidebar is current.
+    client.get('/')
+    assert count_statements(client, '/') == 1
+
+    with uow.uow_instance:
+        uow.uow_instance.repo.add_tag(Tag('Vaccines'))
+        uow.uow_instance.commit()
+
+    response = client.get('/')
+    assert b'/articles_by_tag?tag=Vaccines' in response.data
+
+
+def test_service_calls_share_the_request_unit_of_work(client):
+    app = client.application
+    engine = uow.uow_instance.session_factory.kw['bind']
+
+    with app.test_request_context('/articles_by_date'):
+        app.preprocess_request()
+        request_uow = uow.current_uow()
+        assert request_uow is g.uow and request_uow is not uow.uow_instance
+
+        # A later service call finds the article the first one loaded in the request's session.
+        article = services.get_article(1, request_uow)
+        statements = list()
+
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            assert services.get_article(1, uow.current_uow()) == article
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        assert statements == []
+
+    # The request's unit of work went with it.
+    with app.test_request_context('/articles_by_date'):
+        app.preprocess_request()
+        assert uow.current_uow() is not request_uow
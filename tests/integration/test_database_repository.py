@@ -1,10 +1,21 @@
+import os
+import shutil
 from datetime import date, datetime
 
 import pytest
 
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.schema import CreateTable
+from werkzeug.security import check_password_hash
+
+from covid.adapters import database_repository
 from covid.adapters.database_repository import SqlAlchemyRepository
-from covid.domain.model import User, Article, Tag, Comment, make_comment
-from covid.adapters.repository import RepositoryException
+from covid.adapters.orm import metadata, upgrade_schema
+from covid.domain.model import User, Article, Tag, Comment, make_comment, make_tag_association
+from covid.adapters.repository import RepositoryException, ARTICLE_DETAIL, ARTICLE_SUMMARY
+
+from tests.conftest import TEST_DATABASE_URI, TEST_DATA_PATH
 
 
 def test_repository_can_add_a_user(session):
@@ -57,6 +68,21 @@ def test_repository_can_add_article(session):
     assert repo.get_article(7) is article
 
 
+def test_repository_can_add_articles_in_bulk(session):
+    repo = SqlAlchemyRepository(session)
+
+    articles = [
+        Article(date(2020, 3, 9), 'Title 8', 'First paragraph', 'hyperlink', 'image hyperlink', 8),
+        Article(date(2020, 3, 9), 'Title 7', 'First paragraph', 'hyperlink', 'image hyperlink', 7)
+    ]
+    repo.add_articles(articles)
+    session.commit()
+
+    assert repo.get_number_of_articles() == 8
+    assert repo.get_article(7) is articles[1]
+    assert repo.get_article(8) is articles[0]
+
+
 def test_repository_can_retrieve_article(session):
     repo = SqlAlchemyRepository(session)
 
@@ -133,6 +159,81 @@ def test_repository_can_get_last_article(session):
     assert article.title == 'Coronavirus: Death confirmed as six more test positive in NSW'
 
 
+def test_repository_orders_first_and_last_articles_by_date(session):
+    repo = SqlAlchemyRepository(session)
+
+    # A late-arriving article about an earlier day.
+    repo.add_article(Article(date(2020, 2, 27), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7))
+
+    assert repo.get_first_article().id == 7
+    assert repo.get_last_article().id == 6
+
+
+def test_repository_returns_timeline_bounds(session):
+    repo = SqlAlchemyRepository(session)
+
+    assert repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 5))
+
+    repo.add_article(Article(date(2020, 3, 15), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7))
+    assert repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 15))
+
+
+def test_repository_samples_distinct_articles_across_gaps_in_ids(session):
+    repo = SqlAlchemyRepository(session)
+
+    # An id well beyond the others leaves most of the id range empty.
+    repo.add_article(Article(date(2020, 3, 15), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 100))
+
+    for _ in range(20):
+        articles = repo.sample_articles(3)
+        assert len(articles) == 3
+        assert len({article.id for article in articles}) == 3
+
+    articles = repo.sample_articles(10)
+    assert sorted(article.id for article in articles) == [1, 2, 3, 4, 5, 6, 100]
+
+
+def test_repository_samples_articles_with_sparse_ids(empty_session):
+    repo = SqlAlchemyRepository(empty_session)
+    repo.add_articles(
+        Article(date(2020, 3, 1), f'Title {id}', 'First paragraph', 'hyperlink', 'image hyperlink', id)
+        for id in range(10000, 10000 * 1001, 10000)
+    )
+    empty_session.commit()
+
+    for k in (50, 1000, 2000):
+        samples = list()
+
+        # However sparse the ids, a sample takes a bounded number of statements, each within SQLite's parameter limit.
+        assert len(query_plans(empty_session, lambda: samples.append(repo.sample_articles(k)))) < 20
+        assert len(samples[0]) == min(k, 1000)
+        assert len({article.id for article in samples[0]}) == len(samples[0])
+
+
+def test_repository_samples_articles_uniformly_across_gaps_in_ids(empty_session):
+    # An Article following a wide gap in the ids is picked no more often than any other.
+    repo = SqlAlchemyRepository(empty_session)
+    repo.add_articles(
+        Article(date(2020, 3, 1), f'Title {id}', 'First paragraph', 'hyperlink', 'image hyperlink', id)
+        for id in list(range(1, 100)) + [1000]
+    )
+    empty_session.commit()
+
+    picks = [repo.sample_articles(1)[0].id for _ in range(2000)]
+    assert picks.count(1000) < 60
+    assert len(set(picks)) == 100
+
+    # Each random id is looked up through the primary key.
+    plans = query_plans(empty_session, lambda: repo.sample_articles(1))
+    assert any('SEARCH articles USING INTEGER PRIMARY KEY (rowid=?)' in plan for plan in plans)
+
+
+def test_repository_samples_no_articles_from_an_empty_repository(empty_session):
+    repo = SqlAlchemyRepository(empty_session)
+
+    assert repo.sample_articles(3) == []
+
+
 def test_repository_can_get_articles_by_ids(session):
     repo = SqlAlchemyRepository(session)
 
@@ -179,6 +280,31 @@ def test_repository_returns_an_empty_list_for_non_existent_tag(session):
     assert len(article_ids) == 0
 
 
+def test_repository_pages_through_articles_for_tag(session):
+    repo = SqlAlchemyRepository(session)
+
+    page = repo.get_articles_for_tag('World', 2)
+    assert [article.id for article in page.articles] == [2, 5]
+    assert (page.total, page.previous_cursor, page.next_cursor, page.last_cursor) == (3, None, 5, 2)
+
+    page = repo.get_articles_for_tag('World', 2, after=page.next_cursor)
+    assert [article.id for article in page.articles] == [6]
+    assert (page.total, page.previous_cursor, page.next_cursor, page.last_cursor) == (3, 6, None, 2)
+
+    page = repo.get_articles_for_tag('World', 2, before=page.previous_cursor)
+    assert [article.id for article in page.articles] == [2, 5]
+    assert (page.previous_cursor, page.next_cursor) == (None, 5)
+
+
+def test_repository_returns_an_empty_page_for_non_existent_tag(session):
+    repo = SqlAlchemyRepository(session)
+
+    page = repo.get_articles_for_tag('United States', 2)
+
+    assert page.articles == []
+    assert (page.total, page.previous_cursor, page.next_cursor, page.last_cursor) == (0, None, None, None)
+
+
 def test_repository_returns_date_of_previous_article(session):
     repo = SqlAlchemyRepository(session)
 
@@ -215,6 +341,29 @@ def test_repository_returns_none_when_there_are_no_subsequent_articles(session):
     assert next_date is None
 
 
+def test_repository_returns_date_page_with_neighbouring_dates(session):
+    repo = SqlAlchemyRepository(session)
+
+    page = repo.get_date_page(date(2020, 3, 1))
+    assert [article.id for article in page.articles] == [3, 4, 5]
+    assert (page.previous_date, page.next_date) == (date(2020, 2, 29), date(2020, 3, 5))
+
+    page = repo.get_date_page(date(2020, 2, 28))
+    assert (page.previous_date, page.next_date) == (None, date(2020, 2, 29))
+
+
+def test_repository_returns_date_page_in_one_statement(session):
+    repo = SqlAlchemyRepository(session)
+
+    assert len(query_plans(session, lambda: repo.get_date_page(date(2020, 3, 1)))) == 1
+
+
+def test_repository_returns_an_empty_date_page_for_a_date_without_articles(session):
+    repo = SqlAlchemyRepository(session)
+
+    assert repo.get_date_page(date(2020, 3, 3)) == ([], None, None)
+
+
 def test_repository_can_add_a_tag(session):
     repo = SqlAlchemyRepository(session)
 
@@ -254,4 +403,325 @@ def test_repository_can_retrieve_comments(session):
     assert len(repo.get_comments()) == 2
 
 
+def test_populate_commits_and_reports_each_batch():
+    engine = create_engine(TEST_DATABASE_URI)
+    metadata.create_all(engine)
+
+    reports = list()
+    database_repository.populate(engine, TEST_DATA_PATH, batch_size=4, progress=reports.append)
+
+    assert [(report.table, report.rows) for report in reports] == [
+        ('articles', 4), ('articles', 6), ('users', 2), ('comments', 2)
+    ]
 
+    # Tags first seen in either batch are associated with their articles.
+    rows = engine.execute(
+        'SELECT tags.name, article_tags.article_id FROM tags JOIN article_tags ON tags.id = article_tags.tag_id '
+        'ORDER BY tags.name, article_tags.article_id'
+    ).fetchall()
+    assert [tuple(row) for row in rows if row[0] in ('New Zealand', 'World')] == [
+        ('New Zealand', 1), ('New Zealand', 3), ('New Zealand', 4), ('World', 2), ('World', 5), ('World', 6)
+    ]
+
+
+def test_incremental_populate_upserts_only_the_rows_appended_since_the_last_ingest(tmp_path):
+    for filename in ('news_articles.csv', 'users.csv', 'comments.csv'):
+        shutil.copy(os.path.join(TEST_DATA_PATH, filename), tmp_path)
+
+    engine = create_engine(f'sqlite:///{tmp_path / "covid-19.db"}')
+    metadata.create_all(engine)
+    database_repository.populate(engine, str(tmp_path))
+
+    with open(tmp_path / 'news_articles.csv', 'a') as outfile:
+        # A correction to article 1 with an extra tag, and a new article.
+        outfile.write('1,2020-02-28,Corrected title,First paragraph,https://a.nz,https://a.nz/1.jpg,New Zealand,Vaccines\n')
+        outfile.write('7,2020-03-05,New article,First paragraph,https://a.nz,https://a.nz/7.jpg,World\n')
+    with open(tmp_path / 'comments.csv', 'a') as outfile:
+        outfile.write('3,1,7,"Good news, at last",2020-03-05 09:12:00\n')
+
+    reports = list()
+    database_repository.populate(engine, str(tmp_path), progress=reports.append, incremental=True)
+
+    # Only the appended rows are read.
+    assert [(report.table, report.rows) for report in reports] == [('articles', 2), ('comments', 1)]
+
+    assert engine.execute('SELECT COUNT(*) FROM articles').scalar() == 7
+    assert engine.execute('SELECT title FROM articles WHERE id = 1').scalar() == 'Corrected title'
+    assert engine.execute('SELECT COUNT(*) FROM comments').scalar() == 3
+
+    rows = engine.execute(
+        'SELECT tags.name FROM tags JOIN article_tags ON tags.id = article_tags.tag_id '
+        'WHERE article_tags.article_id = 1 ORDER BY tags.name'
+    ).fetchall()
+    assert [row[0] for row in rows] == ['Health', 'New Zealand', 'Vaccines']
+
+    rows = engine.execute('SELECT source, high_water_mark FROM ingest_state ORDER BY source').fetchall()
+    assert [tuple(row) for row in rows] == [('comments.csv', 3), ('news_articles.csv', 7), ('users.csv', 2)]
+
+    # With nothing appended since, a refresh reads nothing.
+    reports = list()
+    database_repository.populate(engine, str(tmp_path), progress=reports.append, incremental=True)
+    assert reports == []
+
+
+def test_incremental_populate_rereads_a_rewritten_file(tmp_path):
+    for filename in ('news_articles.csv', 'users.csv', 'comments.csv'):
+        shutil.copy(os.path.join(TEST_DATA_PATH, filename), tmp_path)
+
+    engine = create_engine(f'sqlite:///{tmp_path / "covid-19.db"}')
+    metadata.create_all(engine)
+    database_repository.populate(engine, str(tmp_path))
+
+    with open(tmp_path / 'users.csv', 'w') as outfile:
+        # Change user 1's password, rather than just appending a row.
+        outfile.write('id,username,password\n1,thorke,jG7#pLw2Qzx\n2,fmercury,mvNNbc1eLA$i\n3,mjackson,eTfsyPkJ3T\n')
+
+    reports = list()
+    database_repository.populate(engine, str(tmp_path), progress=reports.append, incremental=True)
+
+    assert [(report.table, report.rows) for report in reports] == [('users', 3)]
+    assert engine.execute('SELECT COUNT(*) FROM users').scalar() == 3
+    password = engine.execute("SELECT password FROM users WHERE username = 'thorke'").scalar()
+    assert check_password_hash(password, 'jG7#pLw2Qzx')
+
+
+def query_plans(session, query):
+    # Returns the EXPLAIN QUERY PLAN steps of each statement that query() sends to the database.
+    statements = list()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = session.get_bind()
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        query()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    cursor = session.connection().connection.cursor()
+    return [
+        [row[3] for row in cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()]
+        for statement, parameters in statements
+    ]
+
+
+@pytest.mark.parametrize('query', [
+    lambda repo: repo.get_user('thorke'),
+    lambda repo: repo.get_article(1),
+    lambda repo: repo.get_articles_by_date(date(2020, 3, 1)),
+    lambda repo: repo.get_date_page(date(2020, 3, 1)),
+    lambda repo: repo.get_articles_by_id([2, 5, 6]),
+    lambda repo: repo.get_article_ids_for_tag('New Zealand'),
+    lambda repo: repo.get_articles_for_tag('New Zealand', 2, after=1),
+    lambda repo: repo.get_date_of_previous_article(repo.get_article(3)),
+    lambda repo: repo.get_date_of_next_article(repo.get_article(3)),
+    lambda repo: list(repo.get_article(1).comments),
+    lambda repo: list(repo.get_user('thorke').comments),
+    lambda repo: list(repo.get_article(1).tags),
+    lambda repo: repo.get_date_version(date(2020, 2, 28)),
+    lambda repo: repo.get_tag_version('New Zealand'),
+], ids=[
+    'user', 'article', 'articles by date', 'date page', 'articles by id', 'article ids for tag', 'tag page',
+    'previous date', 'next date', 'article comments', 'user comments', 'article tags', 'date version', 'tag version'
+])
+def test_repository_queries_use_indexes(session, query):
+    repo = SqlAlchemyRepository(session)
+
+    for plan in query_plans(session, lambda: query(repo)):
+        # Every table is searched through an index (or the primary key) rather than scanned. A statement made only of
+        # subqueries scans a single constant row.
+        table_steps = [step for step in plan if step.startswith(('SCAN', 'SEARCH')) and step != 'SCAN CONSTANT ROW']
+        assert len(table_steps) > 0
+        assert all('USING' in step for step in table_steps), plan
+
+
+def test_upgrade_schema_adds_indexes_to_an_existing_database():
+    engine = create_engine(TEST_DATABASE_URI)
+    for table in metadata.sorted_tables:
+        # Create the tables as an earlier version of the application did, without secondary indexes.
+        engine.execute(CreateTable(table))
+
+    upgrade_schema(engine)
+
+    inspector = inspect(engine)
+    assert {index['name'] for index in inspector.get_indexes('article_tags')} == {
+        'article_tags_tag_id_article_id', 'article_tags_article_id_tag_id'
+    }
+    assert [index['column_names'] for index in inspector.get_indexes('articles')] == [['date']]
+
+    # Upgrading an up-to-date database does nothing.
+    upgrade_schema(engine)
+
+
+def test_repository_loads_article_detail_up_front(session):
+    repo = SqlAlchemyRepository(session)
+    articles = repo.get_articles_by_id([1, 2, 3], ARTICLE_DETAIL)
+
+    # Everything article_to_dict touches is already loaded.
+    assert query_plans(session, lambda: [
+        comment.user.username for article in articles for comment in article.comments
+    ]) == []
+    assert query_plans(session, lambda: [tag.tag_name for article in articles for tag in article.tags]) == []
+
+
+def test_repository_selects_only_the_columns_a_profile_needs(session):
+    repo = SqlAlchemyRepository(session)
+    statements = list()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(session.get_bind(), 'before_cursor_execute', capture)
+    repo.get_articles_by_id([1, 2, 3], ARTICLE_DETAIL)
+    repo.get_articles_by_id([1, 2, 3], ARTICLE_SUMMARY)
+    event.remove(session.get_bind(), 'before_cursor_execute', capture)
+
+    articles_detail, comments, tags, articles_summary = statements
+
+    # Neither Users' passwords nor the articles Tags are tagged on are loaded.
+    assert 'users.password' not in comments
+    assert 'tagged' not in tags and tags.count('articles.') == 0
+    assert 'articles.first_para' in articles_detail
+    assert 'articles.first_para' not in articles_summary
+
+
+def test_repository_searches_articles_as_the_memory_repository_does(session, in_memory_repo):
+    repo = SqlAlchemyRepository(session)
+
+    for query in ('Coronavirus', 'first', 'new ZEALAND', 'the', 'AND', 'new delhi', ''):
+        page = repo.search_articles(query, 3)
+        expected = in_memory_repo.search_articles(query, 3)
+
+        assert [article.id for article in page.articles] == [article.id for article in expected.articles]
+        assert (page.total, page.next_cursor) == (expected.total, expected.next_cursor)
+
+    page = repo.search_articles('coronavirus', 3, 3)
+    assert [article.id for article in page.articles] == [
+        article.id for article in in_memory_repo.search_articles('coronavirus', 3, 3).articles
+    ]
+    assert page.next_cursor is None
+
+
+def test_search_index_follows_changes_to_articles(session):
+    repo = SqlAlchemyRepository(session)
+
+    article = Article(date(2020, 3, 15), 'Lockdown looms', 'Cafés shut their doors', 'hyperlink', 'image hyperlink')
+    repo.add_article(article)
+    session.commit()
+    assert repo.search_articles('cafes lockdown', 3).articles == [article]
+
+    article._title = 'Restrictions ease'
+    session.commit()
+    assert repo.search_articles('lockdown', 3).total == 0
+    assert repo.search_articles('restrictions', 3).articles == [article]
+
+
+def test_upgrade_schema_builds_a_missing_search_index(session):
+    engine = session.get_bind()
+    engine.execute('DROP TABLE articles_search')
+    engine.execute('DROP TRIGGER articles_search_insert')
+    engine.execute('DROP TRIGGER articles_search_delete')
+    engine.execute('DROP TRIGGER articles_search_update')
+
+    upgrade_schema(engine)
+
+    assert SqlAlchemyRepository(session).search_articles('coronavirus', 3).total == 6
+
+
+def test_repository_generations_follow_committed_writes(session_factory):
+    session = session_factory()
+    repo = SqlAlchemyRepository(session)
+    generation = repo.get_generation()
+    assert generation > 0
+    assert repo.get_article_generation(1) == generation
+    assert repo.get_tag_generation('Health') == generation
+
+    article = Article(date(2020, 3, 15), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink')
+    make_tag_association(article, session.query(Tag).filter(Tag._tag_name == 'Health').one())
+    repo.add_article(article)
+    assert repo.get_generation() == generation + 1
+
+    session.commit()
+    other_repo = SqlAlchemyRepository(session_factory())
+    assert other_repo.get_generation() == generation + 1
+    assert other_repo.get_article_generation(article.id) == generation + 1
+    assert other_repo.get_article_generation(1) == generation
+    assert other_repo.get_tag_generation('Health') == generation + 1
+    assert other_repo.get_tag_generation('World') == generation
+
+    repo.add_comment(make_comment('Worrying news', repo.get_user('thorke'), repo.get_article(2)))
+    session.commit()
+    assert other_repo.get_article_generation(2) == generation + 2
+
+
+def test_repository_page_versions_follow_committed_writes(session_factory):
+    session = session_factory()
+    repo = SqlAlchemyRepository(session)
+
+    # Each version is read in a single statement, and without loading any Articles.
+    assert len(query_plans(session, lambda: repo.get_date_version(date(2020, 2, 28)))) == 1
+    assert len(query_plans(session, lambda: repo.get_tag_version('New Zealand'))) == 1
+    assert len(session.identity_map) == 0
+
+    date_version = repo.get_date_version(date(2020, 2, 28))
+    assert date_version.last_comment_time == datetime.fromisoformat('2020-02-28 14:39:51')
+    assert date_version.previous_date is None
+    assert date_version.next_date == date(2020, 2, 29)
+    tag_version = repo.get_tag_version('New Zealand')
+    assert repo.get_tag_version('Unknown').last_comment_time is None
+
+    comment = make_comment('Worrying news', repo.get_user('thorke'), repo.get_article(1))
+    repo.add_comment(comment)
+    session.commit()
+
+    other_repo = SqlAlchemyRepository(session_factory())
+    assert other_repo.get_date_version(date(2020, 2, 28)).last_comment_time == comment.timestamp
+    assert other_repo.get_date_version(date(2020, 2, 28)).generation > date_version.generation
+    assert other_repo.get_tag_version('New Zealand').generation > tag_version.generation
+    assert other_repo.get_date_version(date(2020, 2, 29)).last_comment_time is None
+
+    repo.add_article(Article(date(2020, 2, 27), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink'))
+    session.commit()
+    assert other_repo.get_date_version(date(2020, 2, 28)).previous_date == date(2020, 2, 27)
+
+
+def test_file_database_connections_are_pooled_and_tuned(tmp_path):
+    engine = database_repository.create_database_engine(
+        f'sqlite:///{tmp_path / "covid.db"}', pool='queue', pool_size=2,
+        pragmas={'journal_mode': 'wal', 'synchronous': 'normal', 'cache_size': -2048, 'busy_timeout': 1000}
+    )
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 2
+
+    # Each pragma is set on every connection, including those opened once the pool is full.
+    connections = [engine.connect() for _ in range(3)]
+    for connection in connections:
+        assert connection.execute('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.execute('PRAGMA synchronous').scalar() == 1
+        assert connection.execute('PRAGMA cache_size').scalar() == -2048
+        assert connection.execute('PRAGMA busy_timeout').scalar() == 1000
+        connection.close()
+    engine.dispose()
+
+    # An in-memory database shares its only connection, and keeps SQLite's defaults.
+    engine = database_repository.create_database_engine(TEST_DATABASE_URI, pragmas={'cache_size': -2048})
+    assert isinstance(engine.pool, StaticPool)
+    assert engine.execute('PRAGMA cache_size').scalar() != -2048
+
+
+def test_repository_answers_repeated_article_lookups_from_the_session(session):
+    repo = SqlAlchemyRepository(session)
+    article = repo.get_article(1, ARTICLE_SUMMARY)
+
+    # Looking the Article up again needs no query, unless the profile loads more than was loaded before.
+    assert query_plans(session, lambda: repo.get_article(1, ARTICLE_SUMMARY)) == []
+    assert len(query_plans(session, lambda: repo.get_article(1, ARTICLE_DETAIL))) > 0
+    assert query_plans(session, lambda: repo.get_article(1, ARTICLE_DETAIL)) == []
+    assert query_plans(session, lambda: repo.get_article(1)) == []
+    assert repo.get_article(1) is article
+
+    # Once the session's transaction ends, the Article may have changed, so is queried again.
+    session.commit()
+    assert len(query_plans(session, lambda: repo.get_article(1))) > 0
+    assert repo.get_article(99) is None
@@ -2,8 +2,14 @@ import pytest
 
 from datetime import date
 
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
 from covid.domain.model import Article
 from covid.adapters import unit_of_work
+from covid.adapters.caching_repository import ResultCache
+from covid.adapters.database_repository import TIMELINE_BOUNDS, select_generation
+from covid.adapters.repository import RepositoryException, ARTICLES, ARTICLE_DETAIL, TAGS
 from covid.domain import model
 
 
@@ -84,3 +90,193 @@ def test_uow_rolls_back_on_error(session_factory):
 
 
 
+
+
+def test_uow_caches_timeline_bounds_until_articles_are_added(session_factory):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    with uow:
+        assert uow.repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 5))
+
+    # The bounds are shared with later units of work.
+    assert uow.cache.get(ARTICLES, TIMELINE_BOUNDS) == (date(2020, 2, 28), date(2020, 3, 5))
+
+    with uow:
+        uow.repo.add_article(make_article(date(2020, 3, 15)))
+
+        # The bounds seen by this unit of work include its uncommitted Article, but aren't shared.
+        assert uow.repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 15))
+        assert uow.cache.get(ARTICLES, TIMELINE_BOUNDS) is None
+
+    # The Article was rolled back.
+    with uow:
+        assert uow.repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 5))
+
+    with uow:
+        uow.repo.add_article(make_article(date(2020, 3, 15)))
+        uow.commit()
+
+    with uow:
+        assert uow.repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 15))
+
+
+def test_uow_answers_repeated_reads_from_shared_results(session_factory):
+    results = ResultCache(100, ttl=60)
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, results)
+    with uow:
+        assert len(uow.repo.get_article(1, ARTICLE_DETAIL).comments) == 2
+
+    # A later unit of work gets the article, with its comments and tags, querying the database for its generation
+    # alone.
+    statements = list()
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = session_factory.kw['bind']
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        with uow:
+            article = uow.repo.get_article(1, ARTICLE_DETAIL)
+            assert [comment.user.username for comment in article.comments] == ['fmercury', 'thorke']
+            assert [tag.tag_name for tag in article.tags] == ['New Zealand', 'Health']
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert statements == [select_generation]
+
+    # A committed comment drops the cached article.
+    with uow:
+        article = uow.repo.get_article(1)
+        uow.repo.add_comment(model.make_comment('Stay safe', uow.repo.get_user('thorke'), article))
+        uow.commit()
+
+    with uow:
+        assert len(uow.repo.get_article(1, ARTICLE_DETAIL).comments) == 3
+    assert results.statistics().hits == 1
+
+
+def test_uow_keeps_cached_date_pages_that_a_write_elsewhere_leaves_unchanged(session_factory):
+    results = ResultCache(100, ttl=60)
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, results)
+    with uow:
+        assert uow.repo.get_date_page(date(2020, 2, 28), ARTICLE_DETAIL).next_date == date(2020, 2, 29)
+        assert uow.repo.get_date_page(date(2020, 3, 5), ARTICLE_DETAIL).previous_date == date(2020, 3, 1)
+
+    # A comment on an Article dated between them.
+    with uow:
+        user = uow.repo.get_user('thorke')
+        uow.repo.add_comment(model.make_comment('Stay safe', user, uow.repo.get_article(3)))
+        uow.commit()
+
+    with uow:
+        page = uow.repo.get_date_page(date(2020, 3, 5), ARTICLE_DETAIL)
+        assert [article.id for article in page.articles] == [6]
+        assert page.previous_date == date(2020, 3, 1)
+        assert len(uow.repo.get_date_page(date(2020, 3, 1), ARTICLE_DETAIL).articles[0].comments) == 1
+    assert results.statistics().hits == 1
+
+
+def test_uow_drops_shared_results_written_by_another_process(session_factory):
+    # Each process has results of its own.
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, ResultCache(100, ttl=60))
+    other_uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, ResultCache(100, ttl=60))
+    with uow:
+        assert len(uow.repo.get_article(1, ARTICLE_DETAIL).comments) == 2
+        assert uow.repo.get_timeline_bounds().last_date == date(2020, 3, 5)
+
+    with other_uow:
+        other_uow.repo.add_article(make_article(date(2020, 3, 15)))
+        user = other_uow.repo.get_user('thorke')
+        other_uow.repo.add_comment(model.make_comment('Stay safe', user, other_uow.repo.get_article(1)))
+        other_uow.commit()
+
+    with uow:
+        assert len(uow.repo.get_article(1, ARTICLE_DETAIL).comments) == 3
+        assert uow.repo.get_timeline_bounds().last_date == date(2020, 3, 15)
+    assert uow.results.statistics().hits == 0
+
+
+def test_request_uow_drops_repository_results_written_by_another_process(session_factory):
+    # Each process has a RepositoryCache of its own, and no results.
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    other_uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+
+    request_uow = uow.for_request()
+    with request_uow.read_only() as reader:
+        assert reader.repo.get_timeline_bounds().last_date == date(2020, 3, 5)
+    uow.cache.put(TAGS, 'sidebar', ['New Zealand'])
+    request_uow.close_current_session()
+
+    # The process's own writes drop just the results they change.
+    with uow:
+        user = uow.repo.get_user('thorke')
+        uow.repo.add_comment(model.make_comment('Stay safe', user, uow.repo.get_article(1)))
+        uow.commit()
+    request_uow = uow.for_request()
+    assert uow.cache.get(TAGS, 'sidebar') == ['New Zealand']
+    request_uow.close_current_session()
+
+    with other_uow:
+        other_uow.repo.add_article(make_article(date(2020, 3, 15)))
+        other_uow.commit()
+
+    request_uow = uow.for_request()
+    with request_uow.read_only() as reader:
+        assert reader.repo.get_timeline_bounds().last_date == date(2020, 3, 15)
+    assert uow.cache.get(TAGS, 'sidebar') is None
+    request_uow.close_current_session()
+    uow.close_current_session()
+
+
+def test_read_only_uow_shares_one_transaction_between_reads(session_factory):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    transactions = list()
+
+    def capture(session, transaction, connection):
+        transactions.append(transaction)
+
+    event.listen(session_factory, 'after_begin', capture)
+    try:
+        with uow.read_only() as reader:
+            article = reader.repo.get_article(1)
+            # Nested reads get units of work of their own, leaving this one's repo in place.
+            with uow.read_only() as nested_reader:
+                assert nested_reader is not reader
+                nested_repo = nested_reader.repo
+            assert reader.repo is not nested_repo
+        with uow.read_only() as reader:
+            # Articles loaded by earlier reads are still loaded.
+            assert reader.repo.get_articles_by_id([1, 2])[0] is article
+            assert reader.repo.get_user('thorke') is not None
+        assert len(transactions) == 1
+
+        with pytest.raises(RepositoryException):
+            with uow.read_only() as reader:
+                reader.commit()
+
+        # A write joins the open transaction, and rolls it back unless committed.
+        with uow:
+            uow.repo.add_article(make_article(date(2020, 3, 15)))
+        with uow.read_only() as reader:
+            assert reader.repo.get_articles_by_date(date(2020, 3, 15)) == []
+        assert len(transactions) == 2
+        uow.close_current_session()
+    finally:
+        event.remove(session_factory, 'after_begin', capture)
+
+
+def test_read_only_uow_reads_committed_changes_from_a_read_only_session(session_factory):
+    read_session_factory = sessionmaker(bind=session_factory.kw['bind'])
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, read_session_factory=read_session_factory)
+
+    with uow.read_only() as reader:
+        article = reader.repo.get_article(1)
+        assert reader.session() is not uow.session()
+        assert len(article.comments) == 2
+
+    with uow:
+        uow.repo.add_comment(model.make_comment('Stay safe', uow.repo.get_user('thorke'), uow.repo.get_article(1)))
+        uow.commit()
+
+    with uow.read_only() as reader:
+        assert len(reader.repo.get_article(1).comments) == 3
+    uow.close_current_session()
@@ -0,0 +1,153 @@
+from datetime import date
+
+from covid.adapters.caching_repository import CachingRepository, ResultCache, MISSING
+from covid.domain.model import Article, Tag, User, make_comment, make_tag_association
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_caching_repo(repo, max_entries=100):
+    results = ResultCache(max_entries, ttl=60)
+    return CachingRepository(repo, results), results
+
+
+def test_result_cache_evicts_the_least_recently_used_entry():
+    results = ResultCache(2, ttl=60)
+    results.put('a', 1)
+    results.put('b', 2)
+    assert results.get('a') == 1
+
+    results.put('c', 3)
+    assert results.get('b') is MISSING
+    assert results.get('a') == 1 and results.get('c') == 3
+
+    statistics = results.statistics()
+    assert (statistics.hits, statistics.misses, statistics.evictions, statistics.entries) == (3, 1, 1, 2)
+
+
+def test_result_cache_expires_entries_after_their_time_to_live():
+    clock = FakeClock()
+    results = ResultCache(10, ttl=60, clock=clock)
+    results.put('a', None)
+
+    clock.now = 59
+    assert results.get('a') is None
+
+    clock.now = 60
+    assert results.get('a') is MISSING
+    assert results.statistics().expirations == 1
+
+
+def test_repository_answers_repeated_reads_from_the_cache(in_memory_repo):
+    repo, results = make_caching_repo(in_memory_repo)
+
+    article = repo.get_article(1)
+    assert repo.get_article(1) is article
+    assert repo.get_article_ids_for_tag('New Zealand') == [1, 3, 4]
+    assert repo.get_article_ids_for_tag('New Zealand') == [1, 3, 4]
+    assert repo.get_date_of_next_article(article) == date(2020, 2, 29)
+    assert repo.get_date_of_next_article(article) == date(2020, 2, 29)
+
+    statistics = results.statistics()
+    assert (statistics.hits, statistics.misses) == (3, 3)
+
+
+def test_repository_drops_only_the_results_a_write_changes(in_memory_repo):
+    repo, results = make_caching_repo(in_memory_repo)
+    first_article = repo.get_article(1)
+    assert repo.get_article(7) is None
+    assert len(repo.get_articles_by_date(date(2020, 3, 1))) == 3
+    assert repo.get_date_of_next_article(first_article) == date(2020, 2, 29)
+    assert repo.get_date_of_previous_article(repo.get_article(6)) == date(2020, 3, 1)
+
+    article = Article(date(2020, 3, 3), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7)
+    repo.add_article(article)
+    repo.changes_committed()
+
+    assert repo.get_article(7) is article
+    assert repo.get_date_of_previous_article(repo.get_article(6)) == date(2020, 3, 3)
+    assert results.statistics().invalidations == 2
+
+    # Results for other articles and dates were kept.
+    hits = results.statistics().hits
+    assert repo.get_article(1) is first_article
+    assert len(repo.get_articles_by_date(date(2020, 3, 1))) == 3
+    assert repo.get_date_of_next_article(first_article) == date(2020, 2, 29)
+    assert results.statistics().hits == hits + 3
+
+
+def test_repository_drops_cached_articles_when_commented_on_or_tagged(in_memory_repo):
+    repo, results = make_caching_repo(in_memory_repo)
+    assert len(repo.get_article(2).comments) == 0
+    assert [tag.tag_name for tag in repo.get_tags()] == ['New Zealand', 'Health', 'World', 'Politics']
+
+    user = User('Dave', '123456789')
+    repo.add_user(user)
+    repo.add_comment(make_comment('Worrying news', user, in_memory_repo.get_article(2)))
+    assert len(repo.get_article(2).comments) == 1
+
+    tag = Tag('Motoring')
+    make_tag_association(in_memory_repo.get_article(2), tag)
+    repo.add_tag(tag)
+    assert 'Motoring' in [tag.tag_name for tag in repo.get_tags()]
+    assert repo.get_article_ids_for_tag('Motoring') == [2]
+
+
+def test_repository_drops_the_pages_a_new_article_changes(in_memory_repo):
+    repo, results = make_caching_repo(in_memory_repo)
+    assert repo.get_date_page(date(2020, 3, 5)).next_date is None
+    assert repo.get_date_page(date(2020, 2, 28)).next_date == date(2020, 2, 29)
+    assert repo.get_timeline_bounds().last_date == date(2020, 3, 5)
+    health_page = repo.get_articles_for_tag('Health', 3)
+    health_version = repo.get_tag_version('Health')
+    politics_version = repo.get_tag_version('Politics')
+
+    article = Article(date(2020, 3, 6), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7)
+    make_tag_association(article, in_memory_repo._tags_index['Health'])
+    repo.add_article(article)
+    repo.changes_committed()
+
+    # The page and timeline the Article extends, and its Tag's page and version, are read again.
+    assert repo.get_date_page(date(2020, 3, 5)).next_date == date(2020, 3, 6)
+    assert repo.get_timeline_bounds().last_date == date(2020, 3, 6)
+    assert repo.get_articles_for_tag('Health', 3) != health_page
+    assert repo.get_tag_version('Health') != health_version
+
+    # Pages and versions it doesn't change are still cached.
+    hits = results.statistics().hits
+    assert repo.get_date_page(date(2020, 2, 28)).next_date == date(2020, 2, 29)
+    assert repo.get_tag_version('Politics') is politics_version
+    assert results.statistics().hits == hits + 2
+
+
+def test_repository_drops_every_result_after_writes_it_did_not_make(in_memory_repo):
+    repo, results = make_caching_repo(in_memory_repo)
+    repo.get_article(1)
+    repo.get_tags()
+
+    # A write made around the caching repository, as another process would make one.
+    in_memory_repo.add_user(User('Dave', '123456789'))
+
+    repo = CachingRepository(in_memory_repo, results)
+    repo.get_article(1)
+    statistics = results.statistics()
+    assert (statistics.hits, statistics.invalidations, statistics.entries) == (0, 2, 1)
+    assert results.generation == in_memory_repo.get_generation()
+
+
+def test_repository_caches_nothing_while_it_has_uncommitted_changes(in_memory_repo):
+    repo, results = make_caching_repo(in_memory_repo)
+    repo.add_article(Article(date(2020, 3, 3), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7))
+
+    repo.get_article(1)
+    assert results.statistics().entries == 0
+
+    repo.changes_committed()
+    repo.get_article(1)
+    assert results.statistics().entries == 1
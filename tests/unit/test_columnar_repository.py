@@ -0,0 +1,143 @@
+import tracemalloc
+from datetime import date, timedelta
+
+from covid.adapters.columnar_repository import ColumnarMemoryRepository
+from covid.domain.model import Article, Tag, make_comment
+
+
+def test_repository_can_retrieve_article_count(in_columnar_repo):
+    assert in_columnar_repo.get_number_of_articles() == 6
+
+
+def test_repository_can_add_article(in_columnar_repo):
+    article = Article(date(2020, 3, 9), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7)
+    in_columnar_repo.add_article(article)
+
+    assert in_columnar_repo.get_article(7) is article
+    assert in_columnar_repo.get_last_article() is article
+
+
+def test_repository_can_retrieve_article(in_columnar_repo):
+    article = in_columnar_repo.get_article(1)
+
+    # Check that the Article is materialized from the columns with its text, comments and tags.
+    assert article.title == 'Coronavirus: First case of virus in New Zealand'
+    assert article.date == date(2020, 2, 28)
+    assert [comment.user.username for comment in article.comments] == ['fmercury', 'thorke']
+    assert article.is_tagged_by(Tag('Health'))
+    assert article.is_tagged_by(Tag('New Zealand'))
+
+
+def test_repository_materializes_an_article_once_while_it_is_referenced(in_columnar_repo):
+    article = in_columnar_repo.get_article(2)
+
+    assert in_columnar_repo.get_article(2) is article
+    assert in_columnar_repo.get_articles_by_id([2]) == [article]
+
+
+def test_repository_keeps_comments_on_rematerialized_articles(in_columnar_repo):
+    user = in_columnar_repo.get_user('thorke')
+    comment = make_comment("Trump's onto it!", user, in_columnar_repo.get_article(2))
+    in_columnar_repo.add_comment(comment)
+
+    assert comment in in_columnar_repo.get_article(2).comments
+
+
+def test_repository_does_not_retrieve_a_non_existent_article(in_columnar_repo):
+    assert in_columnar_repo.get_article(101) is None
+    assert in_columnar_repo.get_articles_by_id([0, 9]) == []
+
+
+def test_repository_can_retrieve_articles_by_date(in_columnar_repo):
+    articles = in_columnar_repo.get_articles_by_date(date(2020, 3, 1))
+
+    assert [article.id for article in articles] == [3, 4, 5]
+    assert in_columnar_repo.get_articles_by_date(date(2020, 3, 8)) == []
+
+
+def test_repository_can_get_first_and_last_articles(in_columnar_repo):
+    assert in_columnar_repo.get_first_article().id == 1
+    assert in_columnar_repo.get_last_article().id == 6
+
+
+def test_repository_returns_article_ids_for_tags(in_columnar_repo):
+    assert list(in_columnar_repo.get_article_ids_for_tag('New Zealand')) == [1, 3, 4]
+    assert len(in_columnar_repo.get_article_ids_for_tag('United States')) == 0
+
+
+def test_repository_pages_through_articles_for_tag(in_columnar_repo):
+    page = in_columnar_repo.get_articles_for_tag('New Zealand', 2, after=1)
+
+    assert [article.id for article in page.articles] == [3, 4]
+    assert (page.total, page.previous_cursor, page.next_cursor, page.last_cursor) == (3, 3, None, 1)
+
+
+def test_repository_returns_dates_of_previous_and_next_articles(in_columnar_repo):
+    assert in_columnar_repo.get_date_of_previous_article(in_columnar_repo.get_article(6)) == date(2020, 3, 1)
+    assert in_columnar_repo.get_date_of_previous_article(in_columnar_repo.get_article(1)) is None
+    assert in_columnar_repo.get_date_of_next_article(in_columnar_repo.get_article(3)) == date(2020, 3, 5)
+    assert in_columnar_repo.get_date_of_next_article(in_columnar_repo.get_article(6)) is None
+
+
+def test_repository_returns_date_pages(in_columnar_repo):
+    page = in_columnar_repo.get_date_page(date(2020, 3, 1))
+    assert [article.id for article in page.articles] == [3, 4, 5]
+    assert (page.previous_date, page.next_date) == (date(2020, 2, 29), date(2020, 3, 5))
+
+    assert in_columnar_repo.get_date_page(date(2020, 3, 5)).previous_date == date(2020, 3, 1)
+    assert in_columnar_repo.get_date_page(date(2020, 3, 3)) == ([], None, None)
+
+
+def test_repository_returns_timeline_bounds(in_columnar_repo):
+    assert in_columnar_repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 5))
+    assert ColumnarMemoryRepository().get_timeline_bounds() == (None, None)
+
+
+def test_repository_samples_distinct_articles(in_columnar_repo):
+    articles = in_columnar_repo.sample_articles(4)
+    assert len({article.id for article in articles}) == 4
+
+    assert sorted(article.id for article in in_columnar_repo.sample_articles(10)) == [1, 2, 3, 4, 5, 6]
+
+
+def test_repository_can_retrieve_tags(in_columnar_repo):
+    tag_names = [tag.tag_name for tag in in_columnar_repo.get_tags()]
+
+    assert sorted(tag_names) == ['Health', 'New Zealand', 'Politics', 'World']
+
+
+def test_repository_searches_articles(in_columnar_repo):
+    article = Article(date(2020, 3, 9), 'Lockdown looms', 'Coronavirus cases climb', 'hyperlink', 'image hyperlink', 7)
+    in_columnar_repo.add_article(article)
+
+    page = in_columnar_repo.search_articles('coronavirus', 3)
+    assert [article.id for article in page.articles] == [4, 5, 1]
+    assert page.total == 7
+
+    assert in_columnar_repo.search_articles('lockdown', 3).articles == [article]
+
+
+def test_repository_builds_its_search_index_on_the_first_search():
+    number_of_articles = 5000
+    rows = [
+        (
+            id, date(2020, 1, 1) + timedelta(days=id // 20), f'Synthetic article {id}',
+            'A synthetic first paragraph, long enough to resemble the real news feed.',
+            f'https://example.com/articles/{id}', f'https://example.com/images/{id}.jpg'
+        )
+        for id in range(1, number_of_articles + 1)
+    ]
+    repo = ColumnarMemoryRepository()
+
+    # Populating the repository allocates its columns alone, and the first search adds a compact index.
+    tracemalloc.start()
+    try:
+        repo.add_article_rows(rows)
+        populated, _ = tracemalloc.get_traced_memory()
+        assert repo.search_articles('synthetic article 42', 3).total == 1
+        searched, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert populated / number_of_articles < 300
+    assert (searched - populated) / number_of_articles < 400
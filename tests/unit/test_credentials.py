@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from covid.adapters import credentials, memory_repository
+from covid.adapters.memory_repository import MemoryRepository
+
+from tests.conftest import TEST_DATA_PATH
+
+
+def test_recognises_password_hashes():
+    assert credentials.is_password_hash(generate_password_hash('cLQ^C#oFXloS'))
+    assert credentials.is_password_hash('pbkdf2:sha256:150000$salt$0123abcd')
+    assert credentials.is_password_hash('scrypt:32768:8:1$salt$0123abcd')
+
+    assert not credentials.is_password_hash('cLQ^C#oFXloS')
+    assert not credentials.is_password_hash('mvNNbc1eLA$i')
+    assert not credentials.is_password_hash('not$a$hash')
+    assert not credentials.is_password_hash('sha256$salt$hash')
+
+
+def test_hash_passwords_follows_hashed_flags():
+    password_hash = generate_password_hash('mvNNbc1eLA$i')
+
+    # A password flagged as plaintext is hashed even if it looks like a hash.
+    hashed = credentials.hash_passwords([password_hash, password_hash], hashed=[False, True])
+    assert check_password_hash(hashed[0], password_hash)
+    assert hashed[1] == password_hash
+
+    with pytest.raises(ValueError):
+        credentials.hash_passwords(['cLQ^C#oFXloS'], hashed=[True])
+
+
+def test_hash_passwords_only_hashes_plaintext_passwords():
+    password_hash = generate_password_hash('mvNNbc1eLA$i')
+
+    hashed = credentials.hash_passwords(['cLQ^C#oFXloS', password_hash])
+
+    assert check_password_hash(hashed[0], 'cLQ^C#oFXloS')
+    assert hashed[1] == password_hash
+
+
+def test_hash_passwords_with_a_process_pool():
+    passwords = [f'password{index}' for index in range(4)]
+
+    hashed = credentials.hash_passwords(passwords, processes=2, pool_threshold=1)
+
+    assert all(check_password_hash(password_hash, password) for password_hash, password in zip(hashed, passwords))
+
+
+def test_password_hasher_reuses_its_pool_across_batches():
+    with credentials.PasswordHasher(processes=2, pool_threshold=1) as hasher:
+        hasher.hash(['password0', 'password1'])
+        pool = hasher._pool
+        hashed = hasher.hash(['password2'])
+        assert hasher._pool is pool
+
+    assert hasher._pool is None
+    assert check_password_hash(hashed[0], 'password2')
+
+
+def test_users_are_loaded_from_a_hashed_credentials_file(tmp_path):
+    credentials.hash_credentials_file(os.path.join(TEST_DATA_PATH, 'users.csv'), str(tmp_path / 'users.csv'))
+    header, hashed_row = [line.split(',') for line in (tmp_path / 'users.csv').read_text().splitlines()[:2]]
+    assert header == ['id', 'username', 'password', 'hashed']
+    assert hashed_row[3] == credentials.HASHED
+
+    repo = MemoryRepository()
+    memory_repository.load_users(str(tmp_path), repo)
+
+    # The stored hash is used as is, rather than being hashed again.
+    user = repo.get_user('thorke')
+    assert user.password == hashed_row[2]
+    assert check_password_hash(user.password, 'cLQ^C#oFXloS')
@@ -1,6 +1,8 @@
 from datetime import date
 
-from covid.domain.model import User, Article, Tag, make_comment, make_tag_association
+from covid.domain.model import (
+    User, Article, Tag, CompactUser, CompactArticle, CompactTag, make_comment, make_tag_association
+)
 
 
 def test_user_construction():
@@ -100,3 +102,18 @@ def test_make_tag_associations():
     assert tag.is_applied_to(article)
     assert article in tag.tagged_articles
 
+
+
+def test_compact_entities_have_no_instance_dict():
+    user = CompactUser('dbowie', '1234567890')
+    article = CompactArticle(date.fromisoformat('2020-03-15'), 'Title', 'First paragraph', 'hyperlink', 'image', 1)
+    tag = CompactTag('New Zealand')
+
+    make_tag_association(article, tag)
+
+    assert not any(hasattr(entity, '__dict__') for entity in (user, article, tag))
+
+    # Compact entities compare equal to their dict-backed counterparts.
+    assert user == User('dbowie', '1234567890')
+    assert article.is_tagged_by(Tag('New Zealand'))
+    assert tag.is_applied_to(Article(date.fromisoformat('2020-03-15'), 'Title', 'First paragraph', 'hyperlink', 'image'))
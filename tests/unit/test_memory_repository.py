@@ -1,9 +1,15 @@
+import os
 from datetime import date, datetime
 
 import pytest
 
-from covid.domain.model import User, Article, Tag, Comment, make_comment
-from covid.adapters.repository import RepositoryException
+from covid.adapters import memory_repository
+from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.columnar_repository import ColumnarMemoryRepository
+from covid.domain.model import User, Article, Tag, Comment, make_comment, make_tag_association
+from covid.adapters.repository import RepositoryException, ARTICLES, TAGS
+
+from tests.conftest import TEST_DATA_PATH
 
 
 def test_repository_can_add_a_user(in_memory_repo):
@@ -23,6 +29,15 @@ def test_repository_does_not_retrieve_a_non_existent_user(in_memory_repo):
     assert user is None
 
 
+def test_repository_retrieves_users_added_after_population(in_memory_repo):
+    users = [User(f'user{index}', '123456789') for index in range(100)]
+    for user in users:
+        in_memory_repo.add_user(user)
+
+    assert in_memory_repo.get_user('user99') is users[99]
+    assert in_memory_repo.get_user('fmercury') == User('fmercury', '8734gfe2058v')
+
+
 def test_repository_can_retrieve_article_count(in_memory_repo):
     number_of_articles = in_memory_repo.get_number_of_articles()
 
@@ -44,6 +59,56 @@ def test_repository_can_add_article(in_memory_repo):
     assert in_memory_repo.get_article(7) is article
 
 
+def test_repository_can_add_articles_in_bulk(in_memory_repo):
+    articles = [
+        Article(date(2020, 3, 9), 'Title 9', 'First paragraph', 'hyperlink', 'image hyperlink', 9),
+        Article(date(2020, 2, 27), 'Title 8', 'First paragraph', 'hyperlink', 'image hyperlink', 8),
+        Article(date(2020, 3, 9), 'Title 7', 'First paragraph', 'hyperlink', 'image hyperlink', 7)
+    ]
+    in_memory_repo.add_articles(iter(articles))
+
+    assert in_memory_repo.get_number_of_articles() == 9
+    assert in_memory_repo.get_first_article() is articles[1]
+    assert in_memory_repo.get_last_article() is articles[0]
+    assert in_memory_repo.get_articles_by_date(date(2020, 3, 9)) == [articles[2], articles[0]]
+    assert in_memory_repo.get_date_of_next_article(in_memory_repo.get_article(6)) == date(2020, 3, 9)
+
+
+def test_repository_replaces_articles_added_again(in_memory_repo, in_columnar_repo):
+    for repo in (in_memory_repo, in_columnar_repo):
+        # Re-adding article 3 on its own date, and moving article 2 (the only article on its date) to a later date.
+        moved = Article(date(2020, 3, 9), 'Title 2', 'First paragraph', 'hyperlink', 'image hyperlink', 2)
+        replaced = Article(date(2020, 3, 1), 'Title 3', 'First paragraph', 'hyperlink', 'image hyperlink', 3)
+        repo.add_articles([moved, replaced])
+
+        assert repo.get_number_of_articles() == 6
+        assert repo.get_articles_by_date(date(2020, 2, 29)) == []
+        assert repo.get_articles_by_date(date(2020, 3, 9)) == [moved]
+        assert [article.id for article in repo.get_articles_by_date(date(2020, 3, 1))] == [3, 4, 5]
+        assert repo.get_article(3).title == 'Title 3'
+        assert repo.get_date_of_next_article(repo.get_article(1)) == date(2020, 3, 1)
+
+        again = Article(date(2020, 2, 29), 'Title 2', 'First paragraph', 'hyperlink', 'image hyperlink', 2)
+        repo.add_article(again)
+        assert repo.get_number_of_articles() == 6
+        assert repo.get_articles_by_date(date(2020, 3, 9)) == []
+        assert repo.get_articles_by_date(date(2020, 2, 29))[0] is again
+        assert repo.get_article(2) is again
+
+
+def test_repository_searches_the_text_of_articles_added_again(in_memory_repo, in_columnar_repo):
+    for repo in (in_memory_repo, in_columnar_repo):
+        assert repo.search_articles('quarantine', 3).total == 1
+
+        repo.add_article(Article(date(2020, 2, 29), 'Travel resumes', 'Borders reopen', 'hyperlink', 'image', 2))
+        assert repo.search_articles('quarantine', 3).total == 0
+        assert [article.id for article in repo.search_articles('borders', 3).articles] == [2]
+
+        repo.add_articles([Article(date(2020, 2, 29), 'Quarantine', 'Borders close', 'hyperlink', 'image', 2)])
+        assert [article.id for article in repo.search_articles('quarantine', 3).articles] == [2]
+        assert repo.search_articles('reopen', 3).total == 0
+
+
 def test_repository_can_retrieve_article(in_memory_repo):
     article = in_memory_repo.get_article(1)
 
@@ -136,12 +201,55 @@ def test_repository_returns_article_ids_for_existing_tag(in_memory_repo):
     assert article_ids == [1, 3, 4]
 
 
+def test_repository_article_ids_for_tag_are_a_copy(in_memory_repo, in_columnar_repo):
+    for repo in (in_memory_repo, in_columnar_repo):
+        article_ids = repo.get_article_ids_for_tag('New Zealand')
+        article_ids.append(2)
+
+        assert list(repo.get_article_ids_for_tag('New Zealand')) == [1, 3, 4]
+        assert repo.get_articles_for_tag('New Zealand', 3).total == 3
+
+
+def test_repository_returns_sorted_article_ids_for_tag_associated_after_it_was_added(in_memory_repo, in_columnar_repo):
+    for repo in (in_memory_repo, in_columnar_repo):
+        tag = Tag('Motoring')
+        repo.add_tag(tag)
+
+        make_tag_association(repo.get_article(5), tag)
+        assert list(repo.get_article_ids_for_tag('Motoring')) == [5]
+
+        make_tag_association(repo.get_article(2), tag)
+        assert list(repo.get_article_ids_for_tag('Motoring')) == [2, 5]
+        assert [article.id for article in repo.get_articles_for_tag('Motoring', 3).articles] == [2, 5]
+
+
 def test_repository_returns_an_empty_list_for_non_existent_tag(in_memory_repo):
     article_ids = in_memory_repo.get_article_ids_for_tag('United States')
 
     assert len(article_ids) == 0
 
 
+def test_repository_pages_through_articles_for_tag(in_memory_repo):
+    page = in_memory_repo.get_articles_for_tag('World', 2)
+    assert [article.id for article in page.articles] == [2, 5]
+    assert (page.total, page.previous_cursor, page.next_cursor, page.last_cursor) == (3, None, 5, 2)
+
+    page = in_memory_repo.get_articles_for_tag('World', 2, after=page.next_cursor)
+    assert [article.id for article in page.articles] == [6]
+    assert (page.total, page.previous_cursor, page.next_cursor, page.last_cursor) == (3, 6, None, 2)
+
+    page = in_memory_repo.get_articles_for_tag('World', 2, before=page.previous_cursor)
+    assert [article.id for article in page.articles] == [2, 5]
+    assert (page.previous_cursor, page.next_cursor) == (None, 5)
+
+
+def test_repository_returns_an_empty_page_for_non_existent_tag(in_memory_repo):
+    page = in_memory_repo.get_articles_for_tag('United States', 2)
+
+    assert page.articles == []
+    assert (page.total, page.previous_cursor, page.next_cursor, page.last_cursor) == (0, None, None, None)
+
+
 def test_repository_returns_date_of_previous_article(in_memory_repo):
     article = in_memory_repo.get_article(6)
     previous_date = in_memory_repo.get_date_of_previous_article(article)
@@ -170,6 +278,50 @@ def test_repository_returns_none_when_there_are_no_subsequent_articles(in_memory
     assert next_date is None
 
 
+def test_repository_returns_date_page_with_neighbouring_dates(in_memory_repo):
+    page = in_memory_repo.get_date_page(date(2020, 3, 1))
+    assert [article.id for article in page.articles] == [3, 4, 5]
+    assert (page.previous_date, page.next_date) == (date(2020, 2, 29), date(2020, 3, 5))
+
+    page = in_memory_repo.get_date_page(date(2020, 2, 28))
+    assert (page.previous_date, page.next_date) == (None, date(2020, 2, 29))
+
+
+def test_repository_returns_an_empty_date_page_for_a_date_without_articles(in_memory_repo):
+    assert in_memory_repo.get_date_page(date(2020, 3, 3)) == ([], None, None)
+
+
+def test_repository_returns_timeline_bounds(in_memory_repo):
+    assert in_memory_repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 5))
+
+    in_memory_repo.add_article(Article(date(2020, 3, 15), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7))
+    assert in_memory_repo.get_timeline_bounds() == (date(2020, 2, 28), date(2020, 3, 15))
+
+    assert MemoryRepository().get_timeline_bounds() == (None, None)
+
+
+def test_repository_samples_distinct_articles(in_memory_repo):
+    # An id well beyond the others.
+    in_memory_repo.add_article(Article(date(2020, 3, 15), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 100))
+
+    articles = in_memory_repo.sample_articles(3)
+    assert len(articles) == 3
+    assert len({article.id for article in articles}) == 3
+
+    articles = in_memory_repo.sample_articles(10)
+    assert sorted(article.id for article in articles) == [1, 2, 3, 4, 5, 6, 100]
+
+
+def test_repository_navigates_around_an_article_on_a_new_date(in_memory_repo):
+    article = Article(date(2020, 3, 3), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7)
+    in_memory_repo.add_article(article)
+
+    assert in_memory_repo.get_articles_by_date(date(2020, 3, 3)) == [article]
+    assert in_memory_repo.get_date_of_previous_article(article) == date(2020, 3, 1)
+    assert in_memory_repo.get_date_of_next_article(article) == date(2020, 3, 5)
+    assert in_memory_repo.get_date_of_next_article(in_memory_repo.get_article(3)) == date(2020, 3, 3)
+
+
 def test_repository_can_add_a_tag(in_memory_repo):
     tag = Tag('Motoring')
     in_memory_repo.add_tag(tag)
@@ -211,4 +363,139 @@ def test_repository_can_retrieve_comments(in_memory_repo):
     assert len(in_memory_repo.get_comments()) == 2
 
 
+def test_repository_can_be_restored_from_a_snapshot(in_memory_repo, tmp_path):
+    snapshot = str(tmp_path / 'repository.snapshot')
+    memory_repository.save_snapshot(snapshot, in_memory_repo)
+
+    repo = MemoryRepository()
+    memory_repository.load_snapshot(snapshot, repo)
+
+    assert repo.get_number_of_articles() == 6
+    assert [article.id for article in repo.get_articles_by_date(date(2020, 3, 1))] == [3, 4, 5]
+    assert repo.get_article_ids_for_tag('New Zealand') == [1, 3, 4]
+    assert repo.get_user('thorke').password == in_memory_repo.get_user('thorke').password
+    assert len(repo.get_comments()) == 2
+    assert [comment.user.username for comment in repo.get_article(1).comments] == ['fmercury', 'thorke']
+
+
+def test_columnar_repository_can_be_restored_from_a_snapshot(in_memory_repo, tmp_path):
+    snapshot = str(tmp_path / 'repository.snapshot')
+    memory_repository.save_snapshot(snapshot, in_memory_repo)
+
+    repo = ColumnarMemoryRepository()
+    memory_repository.load_snapshot(snapshot, repo)
+
+    assert repo.get_article(1).title == 'Coronavirus: First case of virus in New Zealand'
+    assert list(repo.get_article_ids_for_tag('World')) == [2, 5, 6]
+    assert len(repo.get_article(1).comments) == 2
+
+
+def test_snapshot_is_current_only_when_newer_than_the_data(in_memory_repo, tmp_path):
+    snapshot = str(tmp_path / 'repository.snapshot')
+    assert not memory_repository.snapshot_is_current(snapshot, TEST_DATA_PATH)
+
+    memory_repository.save_snapshot(snapshot, in_memory_repo)
+    assert memory_repository.snapshot_is_current(snapshot, TEST_DATA_PATH)
+
+    # A snapshot older than the CSV files is stale.
+    os.utime(snapshot, (0, 0))
+    assert not memory_repository.snapshot_is_current(snapshot, TEST_DATA_PATH)
+
+
+def test_snapshot_of_another_version_is_rejected(in_memory_repo, tmp_path):
+    snapshot = tmp_path / 'repository.snapshot'
+    memory_repository.save_snapshot(str(snapshot), in_memory_repo)
+
+    data = snapshot.read_bytes()
+    header = len(memory_repository.SNAPSHOT_MAGIC)
+    snapshot.write_bytes(data[:header] + memory_repository.SNAPSHOT_HEADER.pack(0) + data[header + 4:])
+
+    assert not memory_repository.snapshot_is_current(str(snapshot), TEST_DATA_PATH)
+    with pytest.raises(memory_repository.SnapshotException):
+        memory_repository.load_snapshot(str(snapshot), MemoryRepository())
+
+
+def test_repository_drops_cached_results_when_articles_or_tags_are_added(in_memory_repo):
+    in_memory_repo.cache.put(ARTICLES, 'article result', 1)
+    in_memory_repo.cache.put(TAGS, 'tag result', 2)
+
+    in_memory_repo.add_tag(Tag('Motoring'))
+    assert in_memory_repo.cache.get(TAGS, 'tag result') is None
+    assert in_memory_repo.cache.get(ARTICLES, 'article result') == 1
+
+    in_memory_repo.add_article(Article(date(2020, 3, 15), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7))
+    assert in_memory_repo.cache.get(ARTICLES, 'article result') is None
+
 
+def test_repository_searches_articles_by_relevance(in_memory_repo):
+    # Every article mentions coronavirus; those mentioning it in both title and first paragraph rank first.
+    page = in_memory_repo.search_articles('Coronavirus', 3)
+    assert [article.id for article in page.articles] == [4, 5, 1]
+    assert page.total == 6
+    assert page.next_cursor == 3
+
+    page = in_memory_repo.search_articles('coronavirus', 3, page.next_cursor)
+    assert len(page.articles) == 3
+    assert page.next_cursor is None
+
+    # All of a query's words must match.
+    assert [article.id for article in in_memory_repo.search_articles('new ZEALAND', 3).articles] == [1]
+    assert in_memory_repo.search_articles('new delhi', 3).total == 0
+    assert in_memory_repo.search_articles('', 3).articles == []
+
+
+def test_repository_searches_added_articles(in_memory_repo):
+    article = Article(date(2020, 3, 15), 'Café closures', 'Cafés shut their doors', 'hyperlink', 'image hyperlink', 7)
+    in_memory_repo.add_article(article)
+
+    assert in_memory_repo.search_articles('cafe', 3).articles == [article]
+
+
+def test_repository_generations_follow_writes(in_memory_repo):
+    generation = in_memory_repo.get_generation()
+    assert in_memory_repo.get_article_generation(1) <= generation
+    assert in_memory_repo.get_tag_generation('Health') <= generation
+
+    article = in_memory_repo.get_article(2)
+    user = User('Dave', '123456789')
+    in_memory_repo.add_user(user)
+    in_memory_repo.add_comment(make_comment('Worrying news', user, article))
+    assert in_memory_repo.get_generation() == generation + 2
+    assert in_memory_repo.get_article_generation(2) == generation + 2
+    assert in_memory_repo.get_article_generation(1) < generation + 2
+
+    article = Article(date(2020, 3, 15), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7)
+    make_tag_association(article, in_memory_repo._tags_index['Health'])
+    in_memory_repo.add_article(article)
+    assert in_memory_repo.get_article_generation(7) == generation + 3
+    assert in_memory_repo.get_tag_generation('Health') == generation + 3
+    assert in_memory_repo.get_tag_generation('World') < generation + 3
+
+    # Adding a Tag changes the Articles it's applied to.
+    in_memory_repo.add_tag(Tag('Motoring'))
+    assert in_memory_repo.get_article_generation(1) == generation + 4
+    assert in_memory_repo.get_tag_generation('Motoring') == generation + 4
+
+
+def test_repository_page_versions_follow_writes(in_memory_repo):
+    date_version = in_memory_repo.get_date_version(date(2020, 2, 28))
+    assert date_version.last_comment_time == datetime.fromisoformat('2020-02-28 14:39:51')
+    assert date_version.previous_date is None
+    assert date_version.next_date == date(2020, 2, 29)
+    assert in_memory_repo.get_date_version(date(2020, 2, 28)) == date_version
+
+    tag_version = in_memory_repo.get_tag_version('New Zealand')
+    assert in_memory_repo.get_tag_version('Unknown').last_comment_time is None
+
+    # Commenting on an Article changes the versions of pages showing it, but no others.
+    user = in_memory_repo.get_user('thorke')
+    comment = make_comment('Worrying news', user, in_memory_repo.get_article(1))
+    in_memory_repo.add_comment(comment)
+    assert in_memory_repo.get_date_version(date(2020, 2, 28)).last_comment_time == comment.timestamp
+    assert in_memory_repo.get_date_version(date(2020, 2, 28)).generation > date_version.generation
+    assert in_memory_repo.get_tag_version('New Zealand').generation > tag_version.generation
+    assert in_memory_repo.get_date_version(date(2020, 2, 29)).last_comment_time is None
+
+    # Adding an Article on a new date changes its neighbours' versions.
+    in_memory_repo.add_article(Article(date(2020, 2, 27), 'Title', 'First paragraph', 'hyperlink', 'image hyperlink', 7))
+    assert in_memory_repo.get_date_version(date(2020, 2, 28)).previous_date == date(2020, 2, 27)
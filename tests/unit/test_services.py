@@ -6,6 +6,7 @@ from covid import InMemoryUnitOfWork
 from covid.authentication.services import AuthenticationException
 from covid.news import services as news_services
 from covid.authentication import services as auth_services
+from covid.utilities import services as utilities_services
 from covid.news.services import NonExistentArticleException
 
 
@@ -131,6 +132,13 @@ def test_get_last_article(in_memory_uow):
     assert article_as_dict['id'] == 6
 
 
+def test_get_timeline_bounds(in_memory_uow):
+    first_date, last_date = news_services.get_timeline_bounds(in_memory_uow)
+
+    assert first_date.isoformat() == '2020-02-28'
+    assert last_date.isoformat() == '2020-03-05'
+
+
 def test_get_articles_by_date_with_one_date(in_memory_uow):
     target_date = date.fromisoformat('2020-02-28')
 
@@ -202,3 +210,11 @@ def test_get_comments_for_article_without_comments(in_memory_uow):
     comments_as_dict = news_services.get_comments_for_article(2, in_memory_uow)
     assert len(comments_as_dict) == 0
 
+
+def test_get_random_articles(in_memory_uow):
+    articles_as_dict = utilities_services.get_random_articles(3, in_memory_uow)
+    assert len(articles_as_dict) == 3
+
+    # There are only six articles to pick from, and each is picked once.
+    articles_as_dict = utilities_services.get_random_articles(10, in_memory_uow)
+    assert len({article['title'] for article in articles_as_dict}) == 6